@@ -0,0 +1,175 @@
+import logging
+
+from dotenv import load_dotenv
+
+load_dotenv()
+import os
+import asyncio
+import argparse
+import signal
+
+logger = logging.getLogger(__name__)
+
+from browser_use.browser.browser import BrowserConfig
+from browser_use.browser.context import (
+    BrowserContextConfig,
+    BrowserContextWindowSize,
+)
+
+from src.agent.action_cache import ActionCache
+from src.agent.screenshot_policy import ScreenshotPolicy
+from src.browser.storage_state import StorageStateCache
+from src.utils import utils
+from src.utils.llm_cache import LLMResponseCache
+from src.runner.batch_runner import BatchRunner, load_tasks
+from src.runner.gherkin_runner import GherkinRunner, load_scenarios
+
+
+def _split_tags(value: str) -> list[str]:
+    return [tag if tag.startswith("@") else f"@{tag}" for tag in value.replace(",", " ").split()]
+
+
+def is_gherkin_input(path: str) -> bool:
+    return os.path.isdir(path) or path.endswith(".feature")
+
+
+async def run_batch(args):
+    if is_gherkin_input(args.tasks):
+        scenarios = load_scenarios(args.tasks, _split_tags(args.tags), _split_tags(args.exclude_tags))
+        logger.info(f"Loaded {len(scenarios)} scenarios from {args.tasks}")
+    else:
+        tasks = load_tasks(args.tasks)
+        logger.info(f"Loaded {len(tasks)} tasks from {args.tasks}")
+
+    llm = utils.get_llm_model(
+        provider=args.llm_provider,
+        model_name=args.llm_model_name,
+        temperature=args.llm_temperature,
+        base_url=args.llm_base_url,
+        api_key=args.llm_api_key,
+    )
+    runner = BatchRunner(
+        llm=llm,
+        output_dir=args.output_dir,
+        concurrency=args.concurrency,
+        browser_config=BrowserConfig(
+            headless=not args.headful,
+            disable_security=args.disable_security,
+            extra_chromium_args=[f"--window-size={args.window_w},{args.window_h}"],
+        ),
+        context_config=BrowserContextConfig(
+            no_viewport=False,
+            browser_window_size=BrowserContextWindowSize(
+                width=args.window_w, height=args.window_h
+            ),
+        ),
+        max_steps=args.max_steps,
+        use_vision=not args.no_vision,
+        max_actions_per_step=args.max_actions_per_step,
+        tool_calling_method=args.tool_calling_method,
+        action_cache=ActionCache(args.action_cache) if args.action_cache else None,
+        use_element_diff=args.element_diff,
+        max_elements_tokens=args.max_elements_tokens,
+        screenshot_policy=ScreenshotPolicy(
+            max_width=args.screenshot_max_width or None,
+            image_format=args.screenshot_format,
+            quality=args.screenshot_quality,
+            crop_to_focus=args.crop_screenshots,
+        ) if args.adaptive_screenshots else None,
+        stream_actions=args.stream_actions,
+        prompt_caching=args.prompt_caching,
+        max_memory_tokens=args.max_memory_tokens,
+        warm_contexts=args.warm_contexts,
+        recycle_after_contexts=args.recycle_browser_after,
+        storage_states=StorageStateCache(args.storage_state_dir, ttl=args.storage_state_ttl or None)
+        if args.storage_state_dir else None,
+        history_compression=args.history_compression,
+        llm_cache=LLMResponseCache.from_path(args.llm_cache, ttl=args.llm_cache_ttl) if args.llm_cache else None,
+    )
+
+    # First Ctrl+C stops all agents at their next safe point and skips the pending tasks, a second one cancels them
+    loop = asyncio.get_running_loop()
+    main_task = asyncio.current_task()
+
+    def on_sigint():
+        if runner.stop_requested:
+            logger.info("Cancelling the running tasks")
+            main_task.cancel()
+            return
+        logger.info("Stopping: running agents halt at their next step, pending tasks are skipped. "
+                    "Press Ctrl+C again to cancel them.")
+        runner.request_stop()
+
+    try:
+        loop.add_signal_handler(signal.SIGINT, on_sigint)
+    except NotImplementedError:
+        pass
+
+    try:
+        if is_gherkin_input(args.tasks):
+            await GherkinRunner(runner).run(scenarios, junit_path=args.junit_xml, cucumber_json_path=args.cucumber_json)
+            return
+        stats = await runner.run(tasks)
+    finally:
+        try:
+            loop.remove_signal_handler(signal.SIGINT)
+        except NotImplementedError:
+            pass
+
+    logger.info(
+        f"🏁 {stats.succeeded}/{stats.total} tasks succeeded in {stats.elapsed:.1f}s - "
+        f"{stats.tasks_per_minute:.2f} tasks/min, {stats.steps_per_second:.2f} steps/s. "
+        f"Results in {runner.results_path}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many browser agent tasks concurrently")
+    parser.add_argument("tasks", type=str, help="JSONL or YAML file with the tasks to run, or a .feature file / directory of .feature files")
+    parser.add_argument("--output-dir", type=str, default="./tmp/batch", help="Directory for results.jsonl, summary.json and histories")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of tasks running at once")
+    parser.add_argument("--llm-provider", type=str, default="openai", choices=utils.model_names.keys(), help="LLM provider")
+    parser.add_argument("--llm-model-name", type=str, default="gpt-4o", help="LLM model name")
+    parser.add_argument("--llm-temperature", type=float, default=1.0, help="LLM temperature")
+    parser.add_argument("--llm-base-url", type=str, default="", help="LLM API endpoint (leave empty to use .env)")
+    parser.add_argument("--llm-api-key", type=str, default="", help="LLM API key (leave empty to use .env)")
+    parser.add_argument("--max-steps", type=int, default=100, help="Default maximum number of steps per task")
+    parser.add_argument("--max-actions-per-step", type=int, default=10, help="Default maximum number of actions per step")
+    parser.add_argument("--tool-calling-method", type=str, default="auto", help="Tool calling method")
+    parser.add_argument("--no-vision", action="store_true", help="Disable screenshots in the agent prompt")
+    parser.add_argument("--headful", action="store_true", help="Show the browser windows")
+    parser.add_argument("--disable-security", action="store_true", help="Disable browser security features")
+    parser.add_argument("--window-w", type=int, default=1280, help="Browser window width")
+    parser.add_argument("--window-h", type=int, default=1100, help="Browser window height")
+    parser.add_argument("--action-cache", type=str, default="", help="JSON file to learn and replay successful action sequences, e.g. ./tmp/action_cache.json")
+    parser.add_argument("--llm-cache", type=str, default="", help="SQLite file caching llm responses for identical prompts, e.g. ./tmp/llm_cache.sqlite")
+    parser.add_argument("--llm-cache-ttl", type=float, default=None, help="Seconds before a cached llm response expires (default: never)")
+    parser.add_argument("--element-diff", action="store_true", help="After a full element list, only send the element changes while the agent stays on the same page")
+    parser.add_argument("--max-elements-tokens", type=int, default=None, help="Token budget of the element list per step; larger pages are pruned to the elements most relevant to the task (default: a quarter of the context)")
+    parser.add_argument("--adaptive-screenshots", action="store_true", help="Downscale and re-encode screenshots, and leave them out while the page looks unchanged")
+    parser.add_argument("--screenshot-format", type=str, default="jpeg", choices=["jpeg", "webp", "png"], help="Encoding of adaptive screenshots")
+    parser.add_argument("--screenshot-quality", type=int, default=70, help="JPEG/WebP quality of adaptive screenshots")
+    parser.add_argument("--screenshot-max-width", type=int, default=1024, help="Width adaptive screenshots are downscaled to, 0 keeps the viewport width")
+    parser.add_argument("--crop-screenshots", action="store_true", help="With --adaptive-screenshots, crop to the area around the elements used in the last step")
+    parser.add_argument("--stream-actions", action="store_true", help="Stream llm responses and start each action as soon as it is complete")
+    parser.add_argument("--prompt-caching", action="store_true", help="Keep the prompt prefix byte-stable so the provider can cache it, and mark cache breakpoints for Anthropic")
+    parser.add_argument("--max-memory-tokens", type=int, default=2000, help="Token budget of the agent memory in each prompt; older notes are condensed beyond it")
+    parser.add_argument("--warm-contexts", type=int, default=0, help="Browser contexts kept open in the background so the next task starts without waiting for one")
+    parser.add_argument("--recycle-browser-after", type=int, default=0, help="Replace a pooled browser after it created this many contexts (default: never)")
+    parser.add_argument("--storage-state-dir", type=str, default="", help="Directory to save the cookies and local storage of each task fixture, e.g. ./tmp/storage_state")
+    parser.add_argument("--storage-state-ttl", type=float, default=3600, help="Seconds a saved fixture storage state stays valid, 0 keeps it until removed")
+    parser.add_argument("--history-compression", choices=["zstd"], default=None, help="Compress the saved history screenshots (requires zstandard)")
+    parser.add_argument("--tags", type=str, default="", help="Only run scenarios with one of these tags, e.g. '@smoke,@login'")
+    parser.add_argument("--exclude-tags", type=str, default="", help="Skip scenarios with one of these tags, e.g. '@wip'")
+    parser.add_argument("--junit-xml", type=str, default=None, help="JUnit XML report path for .feature runs (default: <output-dir>/junit.xml)")
+    parser.add_argument("--cucumber-json", type=str, default=None, help="Cucumber JSON report path for .feature runs (default: <output-dir>/cucumber.json)")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run_batch(args))
+    except asyncio.CancelledError:
+        logger.info("Batch cancelled")
+
+
+if __name__ == '__main__':
+    main()
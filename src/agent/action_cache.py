@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from browser_use.dom.views import DOMElementNode
+
+logger = logging.getLogger(__name__)
+
+_NUMBER_SEGMENT = re.compile(r"^\d+$")
+_ID_SEGMENT = re.compile(r"^(?:[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|[0-9a-f]{16,})$", re.I)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so formatting changes of a task do not miss the cache"""
+    return " ".join(text.lower().split())
+
+
+def url_pattern(url: str) -> str:
+    """
+    Reduce a url to its pattern: ids in the path are replaced by placeholders, query values and fragment are dropped.
+    https://shop.com/item/123?ref=x#top -> https://shop.com/item/:num?ref
+    """
+    parts = urlsplit(url)
+    segments = []
+    for segment in parts.path.split("/"):
+        if _NUMBER_SEGMENT.match(segment):
+            segment = ":num"
+        elif _ID_SEGMENT.match(segment):
+            segment = ":id"
+        segments.append(segment)
+    pattern = f"{parts.scheme}://{parts.netloc.lower()}{'/'.join(segments)}"
+    query_keys = sorted({key for key, _ in parse_qsl(parts.query, keep_blank_values=True)})
+    if query_keys:
+        pattern += "?" + "&".join(query_keys)
+    return pattern
+
+
+def dom_fingerprint(selector_map: dict[int, DOMElementNode]) -> str:
+    """
+    Hash the highlight indices together with the position of each element in the tree.
+    Cached actions address elements by index, so they only replay on a page where the same index
+    points to the same element. Attribute values (e.g. typed text) are left out on purpose.
+    """
+    digest = hashlib.sha256()
+    for index in sorted(selector_map):
+        element = selector_map[index]
+        digest.update(f"{index}:{element.tag_name}:{element.hash.branch_path_hash};".encode())
+    return digest.hexdigest()
+
+
+def make_cache_key(task: str, url: str, selector_map: dict[int, DOMElementNode]) -> str:
+    key_source = f"{normalize_text(task)}\n{url_pattern(url)}\n{dom_fingerprint(selector_map)}"
+    return hashlib.sha256(key_source.encode()).hexdigest()
+
+
+@dataclass
+class ActionCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ActionCache:
+    """
+    Persistent cache of action lists that completed a step, keyed on (task, url pattern, DOM fingerprint).
+    The agent replays a hit through controller.multi_act instead of calling the llm.
+    Entries are stored as JSON, including any text the actions typed, so keep the file private.
+    Inside an event loop, changes are written at most every save_delay seconds from a worker thread.
+    """
+
+    def __init__(self, path: Optional[str] = "./tmp/action_cache.json", max_entries: int = 2000,
+                 save_delay: float = 1.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.save_delay = save_delay
+        self.stats = ActionCacheStats()
+        self._entries: dict[str, dict[str, Any]] = {}
+        # version of the entries changed last and written last, an older snapshot never overwrites a newer one
+        self._version = 0
+        self._written_version = 0
+        self._write_lock = threading.Lock()
+        self._save_task: Optional[asyncio.Task] = None
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load action cache {self.path}, starting empty: {e}")
+            self._entries = {}
+
+    def _write(self, entries: dict[str, dict[str, Any]], version: int) -> None:
+        with self._write_lock:
+            if version <= self._written_version:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # a temp file per process and thread, concurrent writers never share one
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._written_version = version
+
+    def _save(self) -> None:
+        """Schedule a write of the changed entries, or write them now outside of an event loop"""
+        if not self.path:
+            return
+        self._version += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(self._entries, self._version)
+            return
+        if self._save_task is None or self._save_task.done():
+            self._save_task = loop.create_task(self._save_later())
+
+    async def _save_later(self) -> None:
+        await asyncio.sleep(self.save_delay)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write pending changes now, off the event loop"""
+        if not self.path or self._version <= self._written_version:
+            return
+        await asyncio.to_thread(self._write, dict(self._entries), self._version)
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        """Return the cached entry ({'actions': [...], 'result_url': ...}) or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        entry["hits"] = entry.get("hits", 0) + 1
+        entry["last_used"] = time.time()
+        return entry
+
+    def put(self, key: str, actions: list[dict[str, Any]], url: str, result_url: str) -> None:
+        """Store the actions of a step that the llm evaluated as successful"""
+        now = time.time()
+        self._entries[key] = {
+            "actions": actions,
+            "url": url_pattern(url),
+            "result_url": url_pattern(result_url),
+            "hits": 0,
+            "created_at": now,
+            "last_used": now,
+        }
+        self.stats.stores += 1
+        if len(self._entries) > self.max_entries:
+            # drop the least recently used entries
+            for old_key, _ in sorted(self._entries.items(), key=lambda item: item[1]["last_used"])[
+                             : len(self._entries) - self.max_entries]:
+                del self._entries[old_key]
+        self._save()
+
+    def invalidate(self, key: str) -> None:
+        """Forget an entry whose replay could not be verified"""
+        if self._entries.pop(key, None) is not None:
+            self.stats.invalidations += 1
+            self._save()
+
+    def clear(self) -> None:
+        self._entries = {}
+        self._save()
+
+    def stats_dict(self) -> dict[str, Any]:
+        data = asdict(self.stats)
+        data["hit_rate"] = round(self.stats.hit_rate, 3)
+        data["entries"] = len(self._entries)
+        return data
@@ -0,0 +1,103 @@
+import hashlib
+import math
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Optional
+
+_WHITESPACE = re.compile(r"\s+")
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s")
+
+
+@dataclass
+class MemoryEntry:
+    step: int
+    text: str
+    tokens: int
+
+
+class AgentMemory:
+    """
+    The important contents the agent collected, as entries deduplicated by the hash of their normalized text.
+    When the entries exceed max_tokens, the oldest are condensed to their first sentence into a digest of at
+    most summary_ratio of the budget; the oldest digest lines are dropped when the digest is full.
+    """
+
+    def __init__(
+            self,
+            max_tokens: int = 2000,
+            characters_per_token: int = 3,
+            summary_ratio: float = 0.25,
+            summary_chars: int = 120,
+    ):
+        self.max_tokens = max_tokens
+        self.characters_per_token = characters_per_token
+        self.summary_ratio = summary_ratio
+        self.summary_chars = summary_chars
+        self.entries: Deque[MemoryEntry] = deque()
+        self.summary: Deque[MemoryEntry] = deque()
+        self.tokens = 0
+        self.summary_tokens = 0
+        self.evicted = 0
+        self._hashes: set[bytes] = set()
+        self._rendered: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.entries) + len(self.summary)
+
+    def __str__(self) -> str:
+        return self.render()
+
+    @staticmethod
+    def _hash(text: str) -> bytes:
+        normalized = _WHITESPACE.sub(" ", text).strip().lower()
+        return hashlib.blake2b(normalized.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def _count_tokens(self, text: str) -> int:
+        return math.ceil(len(text) / self.characters_per_token)
+
+    def add(self, text: str, step: int = 0) -> bool:
+        """Add text, return False if the same content is already in the memory"""
+        text = text.strip()
+        if not text:
+            return False
+        key = self._hash(text)
+        if key in self._hashes:
+            return False
+        self._hashes.add(key)
+        entry = MemoryEntry(step=step, text=text, tokens=self._count_tokens(text) + 1)
+        self.entries.append(entry)
+        self.tokens += entry.tokens
+        self._rendered = None
+        self._compact()
+        return True
+
+    def _compact(self) -> None:
+        summary_budget = int(self.max_tokens * self.summary_ratio)
+        # the newest entry always stays, even if it alone is over the budget
+        while self.tokens + self.summary_tokens > self.max_tokens and len(self.entries) > 1:
+            entry = self.entries.popleft()
+            self.tokens -= entry.tokens
+            self._hashes.discard(self._hash(entry.text))
+            self.evicted += 1
+
+            sentence = _SENTENCE_END.split(entry.text, maxsplit=1)[0]
+            if len(sentence) > self.summary_chars:
+                sentence = sentence[:self.summary_chars - 3].rstrip() + "..."
+            line = f"- (step {entry.step}) {sentence}"
+            condensed = MemoryEntry(step=entry.step, text=line, tokens=self._count_tokens(line) + 1)
+            self.summary.append(condensed)
+            self.summary_tokens += condensed.tokens
+            while self.summary_tokens > summary_budget and self.summary:
+                self.summary_tokens -= self.summary.popleft().tokens
+
+    def render(self) -> str:
+        """The memory as it goes into the prompt, rebuilt only after a change"""
+        if self._rendered is None:
+            parts = []
+            if self.summary:
+                parts.append("Earlier notes (condensed):")
+                parts.extend(entry.text for entry in self.summary)
+            parts.extend(entry.text for entry in self.entries)
+            self._rendered = "\n".join(parts) + "\n" if parts else ""
+        return self._rendered
@@ -1,6 +1,8 @@
+import asyncio
 import json
 import logging
 import pdb
+import time
 import traceback
 from typing import Optional, Type, List, Dict, Any, Callable
 from PIL import Image, ImageDraw, ImageFont
@@ -19,8 +21,9 @@ from browser_use.agent.views import (
 )
 from browser_use.browser.browser import Browser
 from browser_use.browser.context import BrowserContext
-from browser_use.browser.views import BrowserStateHistory
+from browser_use.browser.views import BrowserState, BrowserStateHistory
 from browser_use.controller.service import Controller
+from browser_use.dom.views import DOMElementNode
 from browser_use.telemetry.views import (
 	AgentEndTelemetryEvent,
 	AgentRunTelemetryEvent,
@@ -29,17 +32,44 @@ from browser_use.telemetry.views import (
 from browser_use.utils import time_execution_async
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.messages import (
+    AIMessage,
     BaseMessage,
 )
-from json_repair import repair_json
-from src.utils.agent_state import AgentState
-
+from pydantic import ValidationError
+from src.utils.agent_state import AgentState, AgentStoppedError
+from src.utils.json_parser import JSONParseStats, StreamingJSONObjectParser, parse_json_object
+from src.utils.llm_cache import LLMResponseCache, llm_cache_namespace, make_cache_key as make_llm_cache_key
+from src.utils.prompt_cache import PromptCacheStats
+from src.controller.custom_controller import multi_act_iter
+
+from .action_cache import ActionCache, make_cache_key, url_pattern
+from .agent_memory import AgentMemory
+from .history_gif import FrameJob, FrameStyle, HistoryAnimationJob, default_workers, write_history_animation
+from .history_store import is_compact_history, save_compact_history
 from .custom_massage_manager import CustomMassageManager
-from .custom_views import CustomAgentOutput, CustomAgentStepInfo
+from .custom_views import CustomAgentBrain, CustomAgentOutput, CustomAgentStepInfo
+from .screenshot_policy import ScreenshotPolicy
 
 logger = logging.getLogger(__name__)
 
 
+async def _queued_actions(queue: asyncio.Queue):
+    """The actions put on queue, until None ends the list"""
+    while (action := await queue.get()) is not None:
+        yield action
+
+
+def _chunk_text(chunk: BaseMessage) -> str:
+    """Text of a streamed message chunk, providers send either a string or a list of content blocks"""
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(
+        part if isinstance(part, str) else part.get("text", "")
+        for part in chunk.content
+        if isinstance(part, str) or part.get("type") == "text"
+    )
+
+
 class CustomAgent(Agent):
     def __init__(
             self,
@@ -78,6 +108,19 @@ class CustomAgent(Agent):
             register_new_step_callback: Callable[['BrowserState', 'AgentOutput', int], None] | None = None,
             register_done_callback: Callable[['AgentHistoryList'], None] | None = None,
             tool_calling_method: Optional[str] = 'auto',
+            generate_gif: bool | str = True,
+            action_cache: Optional[ActionCache] = None,
+            llm_cache: Optional[LLMResponseCache] = None,
+            use_element_diff: bool = False,
+            element_diff_resync_steps: int = 5,
+            max_elements_tokens: Optional[int] = None,
+            screenshot_policy: Optional[ScreenshotPolicy] = None,
+            stream_actions: bool = False,
+            prompt_caching: bool = False,
+            max_memory_tokens: int = 2000,
+            gif_workers: Optional[int] = None,
+            background_gif: bool = False,
+            history_compression: Optional[str] = None,
     ):
         super().__init__(
             task=task,
@@ -99,7 +142,8 @@ class CustomAgent(Agent):
             initial_actions=initial_actions,
             register_new_step_callback=register_new_step_callback,
             register_done_callback=register_done_callback,
-            tool_calling_method=tool_calling_method
+            tool_calling_method=tool_calling_method,
+            generate_gif=generate_gif
         )
         if self.model_name in ["deepseek-reasoner"] or "deepseek-r1" in self.model_name:
             # deepseek-reasoner does not support function calling
@@ -111,8 +155,34 @@ class CustomAgent(Agent):
         
         # record last actions
         self._last_actions = None
+        # elements the last actions targeted, the screenshot policy may crop around them
+        self._last_action_elements: list[DOMElementNode] = []
+        # browser state of the current step, captured once and dropped when an action runs
+        self._state_snapshot: Optional[BrowserState] = None
+        # stream the llm response and start each action as soon as it is complete
+        self.stream_actions = stream_actions
+        # replay action lists learned in earlier runs instead of calling the llm
+        self.action_cache = action_cache
+        # (key, url, actions, result url) of the last llm step, stored once the next step evaluates it as a success
+        self._pending_cache_entry: Optional[tuple[str, str, list[dict], str]] = None
+        self._skip_action_cache = False
+        # responses for message lists that were already sent to this model
+        self.llm_cache = llm_cache
+        self._llm_cache_namespace = llm_cache_namespace(self.llm) if llm_cache else ""
+        # which parsing tier decoded the model outputs of this agent
+        self.json_parse_stats = JSONParseStats()
+        # input tokens the provider served from its prompt cache
+        self.prompt_cache_stats = PromptCacheStats()
         # custom new info
         self.add_infos = add_infos
+        # token budget of the memory in the state message, older entries are condensed beyond it
+        self.max_memory_tokens = max_memory_tokens
+        # processes drawing the history gif (default: one per 4 frames, up to the cpu count), and whether run()
+        # returns before the gif is written
+        self.gif_workers = gif_workers
+        self.background_gif = background_gif
+        self.history_compression = history_compression
+        self.gif_job: Optional[HistoryAnimationJob] = None
         # agent_state for Stop
         self.agent_state = agent_state
         self.agent_prompt_class = agent_prompt_class
@@ -125,7 +195,13 @@ class CustomAgent(Agent):
             max_input_tokens=self.max_input_tokens,
             include_attributes=self.include_attributes,
             max_error_length=self.max_error_length,
-            max_actions_per_step=self.max_actions_per_step
+            max_actions_per_step=self.max_actions_per_step,
+            use_element_diff=use_element_diff,
+            element_diff_resync_steps=element_diff_resync_steps,
+            max_elements_tokens=max_elements_tokens,
+            screenshot_policy=screenshot_policy,
+            prompt_caching=prompt_caching,
+            add_infos=add_infos,
         )
 
     def _setup_action_models(self) -> None:
@@ -137,23 +213,27 @@ class CustomAgent(Agent):
 
     def _log_response(self, response: CustomAgentOutput) -> None:
         """Log the model's response"""
-        if "Success" in response.current_state.prev_action_evaluation:
+        self._log_brain(response.current_state)
+        for i, action in enumerate(response.action):
+            logger.info(
+                f"🛠️  Action {i + 1}/{len(response.action)}: {action.model_dump_json(exclude_unset=True)}"
+            )
+
+    @staticmethod
+    def _log_brain(current_state: CustomAgentBrain) -> None:
+        if "Success" in current_state.prev_action_evaluation:
             emoji = "✅"
-        elif "Failed" in response.current_state.prev_action_evaluation:
+        elif "Failed" in current_state.prev_action_evaluation:
             emoji = "❌"
         else:
             emoji = "🤷"
 
-        logger.info(f"{emoji} Eval: {response.current_state.prev_action_evaluation}")
-        logger.info(f"🧠 New Memory: {response.current_state.important_contents}")
-        logger.info(f"⏳ Task Progress: \n{response.current_state.task_progress}")
-        logger.info(f"📋 Future Plans: \n{response.current_state.future_plans}")
-        logger.info(f"🤔 Thought: {response.current_state.thought}")
-        logger.info(f"🎯 Summary: {response.current_state.summary}")
-        for i, action in enumerate(response.action):
-            logger.info(
-                f"🛠️  Action {i + 1}/{len(response.action)}: {action.model_dump_json(exclude_unset=True)}"
-            )
+        logger.info(f"{emoji} Eval: {current_state.prev_action_evaluation}")
+        logger.info(f"🧠 New Memory: {current_state.important_contents}")
+        logger.info(f"⏳ Task Progress: \n{current_state.task_progress}")
+        logger.info(f"📋 Future Plans: \n{current_state.future_plans}")
+        logger.info(f"🤔 Thought: {current_state.thought}")
+        logger.info(f"🎯 Summary: {current_state.summary}")
 
     def update_step_info(
             self, model_output: CustomAgentOutput, step_info: CustomAgentStepInfo = None
@@ -166,12 +246,11 @@ class CustomAgent(Agent):
 
         step_info.step_number += 1
         important_contents = model_output.current_state.important_contents
-        if (
-                important_contents
-                and "None" not in important_contents
-                and important_contents not in step_info.memory
-        ):
-            step_info.memory += important_contents + "\n"
+        if important_contents and "None" not in important_contents:
+            if isinstance(step_info.memory, AgentMemory):
+                step_info.memory.add(important_contents, step=step_info.step_number - 1)
+            elif important_contents not in step_info.memory:
+                step_info.memory += important_contents + "\n"
 
         task_progress = model_output.current_state.task_progress
         if task_progress and "None" not in task_progress:
@@ -181,16 +260,165 @@ class CustomAgent(Agent):
         if future_plans and "None" not in future_plans:
             step_info.future_plans = future_plans
 
-    @time_execution_async("--get_next_action")
-    async def get_next_action(self, input_messages: list[BaseMessage]) -> AgentOutput:
-        """Get next action from LLM based on current state"""
-        messages_to_process = (
-            self.message_manager.merge_successive_human_messages(input_messages)
-            if self.use_deepseek_r1
-            else input_messages
+    async def _get_state_snapshot(self) -> BrowserState:
+        """Get the browser state for the current step, only extracting it if no action ran since the last capture"""
+        if self._state_snapshot is None:
+            self._state_snapshot = await self.browser_context.get_state(use_vision=self.use_vision)
+            if self.agent_state:
+                self.agent_state.set_last_valid_state(self._state_snapshot)
+        return self._state_snapshot
+
+    def _invalidate_state_snapshot(self) -> None:
+        """Drop the captured browser state, the page may have changed"""
+        self._state_snapshot = None
+
+    async def _get_focus_boxes(self) -> tuple[Optional[list[dict]], Optional[int]]:
+        """Viewport boxes of the elements the last actions used and the viewport width, for screenshot cropping"""
+        policy = self.message_manager.screenshot_policy
+        if policy is None or not policy.crop_to_focus or not self._last_action_elements:
+            return None, None
+        boxes = []
+        try:
+            for element in self._last_action_elements:
+                handle = await self.browser_context.get_locate_element(element)
+                box = await handle.bounding_box() if handle else None
+                if box:
+                    boxes.append(box)
+            page = await self.browser_context.get_current_page()
+            viewport_width = await page.evaluate("() => window.innerWidth")
+        except Exception as e:
+            logger.debug(f"Could not locate the elements of the last step, sending the full screenshot: {e}")
+            return None, None
+        return boxes, viewport_width
+
+    def _get_action_cache_key(self, state: BrowserState) -> Optional[str]:
+        if self.action_cache is None:
+            return None
+        if self._skip_action_cache:
+            # the last replay failed verification, let the llm look at this page
+            self._skip_action_cache = False
+            return None
+        return make_cache_key(self.task, state.url, state.selector_map)
+
+    def _commit_pending_cache_entry(self, model_output: CustomAgentOutput) -> None:
+        """Store the previous step's actions once the llm evaluated them as successful"""
+        pending, self._pending_cache_entry = self._pending_cache_entry, None
+        if pending and "Success" in model_output.current_state.prev_action_evaluation:
+            key, url, actions, result_url = pending
+            self.action_cache.put(key, actions, url=url, result_url=result_url)
+
+    @staticmethod
+    def _is_cacheable(actions: list[ActionModel], result: list[ActionResult]) -> bool:
+        # the final answer needs the llm's judgement, so done steps are never cached
+        return (
+                len(actions) > 0
+                and len(result) == len(actions)
+                and not any(r.error or r.is_done for r in result)
+                and not any("done" in action.model_dump(exclude_unset=True) for action in actions)
         )
 
-        ai_message = self.llm.invoke(messages_to_process)
+    @staticmethod
+    def _fill_missing_results(actions: list[ActionModel], result: list[ActionResult]) -> list[ActionResult]:
+        if len(result) != len(actions):
+            # I think something changes, such information should let LLM know
+            for ri in range(len(result), len(actions)):
+                result.append(ActionResult(extracted_content=None,
+                                            include_in_memory=True,
+                                            error=f"{actions[ri].model_dump_json(exclude_unset=True)} is Failed to execute. \
+                                                Something new appeared after action {actions[len(result) - 1].model_dump_json(exclude_unset=True)}",
+                                            is_done=False))
+        return result
+
+    async def _replay_cached_actions(
+            self, cache_key: str, entry: dict[str, Any], step_info: Optional[CustomAgentStepInfo]
+    ) -> tuple[CustomAgentOutput, list[ActionResult]]:
+        """
+        Run a cached action list and verify it: every action must succeed and the page must end on the same url pattern
+        as when the entry was recorded. Otherwise the entry is dropped and the next step falls back to the llm.
+        """
+        actions: list[ActionModel] = [self.ActionModel(**action) for action in entry["actions"]]
+        logger.info(f"♻️ Replaying {len(actions)} cached actions")
+        self._invalidate_state_snapshot()
+        try:
+            result = await self.controller.multi_act(actions, self.browser_context)
+            page = await self.browser_context.get_current_page()
+        except Exception:
+            self.action_cache.invalidate(cache_key)
+            self._skip_action_cache = True
+            raise
+
+        verified = (
+                len(result) == len(actions)
+                and not any(r.error for r in result)
+                and url_pattern(page.url) == entry["result_url"]
+        )
+        if not verified:
+            logger.info("♻️ Cached actions could not be verified, falling back to the llm")
+            self.action_cache.invalidate(cache_key)
+            self._skip_action_cache = True
+
+        model_output = self.AgentOutput(
+            current_state=CustomAgentBrain(
+                prev_action_evaluation="Unknown - replayed from the action cache",
+                important_contents="",
+                task_progress="",
+                future_plans="",
+                thought="These actions completed this step on the same page before, replaying them.",
+                summary=f"Replayed {len(actions)} cached actions",
+            ),
+            action=actions,
+        )
+        self.n_steps += 1
+        self.update_step_info(model_output, step_info)
+        return model_output, self._fill_missing_results(actions, result)
+
+    async def _unless_stopped(self, awaitable):
+        """
+        Await awaitable, if agent_state is set a stop request cancels it and raises AgentStoppedError.
+        """
+        task = asyncio.ensure_future(awaitable)
+        if self.agent_state is None:
+            return await task
+
+        stop_task = asyncio.create_task(self.agent_state.wait_for_stop())
+        try:
+            done, _ = await asyncio.wait(
+                {task, stop_task}, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            for pending in (task, stop_task):
+                if not pending.done():
+                    pending.cancel()
+
+        if task in done:
+            return task.result()
+        logger.info("🛑 Stop requested, cancelled in-flight LLM call")
+        raise AgentStoppedError
+
+    async def _ainvoke_llm(self, input_messages: list[BaseMessage]) -> BaseMessage:
+        """
+        Call the llm without blocking the event loop.
+        If agent_state is set, a stop request cancels the in-flight call and raises AgentStoppedError.
+        """
+        return await self._unless_stopped(self.llm.ainvoke(input_messages))
+
+    async def _lookup_llm_cache(self, messages: list[BaseMessage]) -> tuple[Optional[str], Optional[BaseMessage]]:
+        """(key to store the response under, cached response), the key is None on a hit or without a cache"""
+        if not self.llm_cache:
+            return None, None
+        cache_key = make_llm_cache_key(messages, self._llm_cache_namespace)
+        ai_message = await self.llm_cache.alookup(cache_key)
+        if ai_message is None:
+            return cache_key, None
+        logger.info("♻️ LLM cache hit")
+        # a cached response is already stored, no need to write it back
+        return None, ai_message
+
+    async def _parse_ai_message(
+            self, ai_message: BaseMessage, cache_key: Optional[str], log_response: bool = True
+    ) -> AgentOutput:
+        """Add the response to the history and parse it into the agent output"""
+        self.prompt_cache_stats.record(ai_message)
         self.message_manager._add_message_with_tokens(ai_message)
 
         if self.use_deepseek_r1:
@@ -203,22 +431,130 @@ class CustomAgent(Agent):
         else:
             ai_content = ai_message.content
 
-        ai_content = ai_content.replace("```json", "").replace("```", "")
-        ai_content = repair_json(ai_content)
-        parsed_json = json.loads(ai_content)
+        parsed_json, tier = parse_json_object(ai_content, self.json_parse_stats)
+        if tier == "repaired":
+            logger.debug(f"Repaired the json of the model output: {ai_content}")
         parsed: AgentOutput = self.AgentOutput(**parsed_json)
         
         if parsed is None:
             logger.debug(ai_message.content)
             raise ValueError('Could not parse response.')
 
+        if cache_key:
+            # only responses that parsed are cached, a broken one would fail every rerun
+            await self.llm_cache.aupdate(cache_key, ai_message)
+
         # Limit actions to maximum allowed per step
         parsed.action = parsed.action[: self.max_actions_per_step]
-        self._log_response(parsed)
+        if log_response:
+            self._log_response(parsed)
         self.n_steps += 1
         
         return parsed
 
+    @time_execution_async("--get_next_action")
+    async def get_next_action(self, input_messages: list[BaseMessage]) -> AgentOutput:
+        """Get next action from LLM based on current state"""
+        messages_to_process = (
+            self.message_manager.merge_successive_human_messages(input_messages)
+            if self.use_deepseek_r1
+            else input_messages
+        )
+
+        cache_key, ai_message = await self._lookup_llm_cache(messages_to_process)
+        if ai_message is None:
+            ai_message = await self._ainvoke_llm(messages_to_process)
+        return await self._parse_ai_message(ai_message, cache_key)
+
+    @time_execution_async("--stream_next_action")
+    async def _stream_next_action(
+            self, input_messages: list[BaseMessage], state: BrowserState
+    ) -> tuple[AgentOutput, Optional[list[ActionResult]]]:
+        """
+        Stream the llm response and run every entry of its action list as soon as the entry is complete,
+        while the model is still generating the rest. Returns the parsed output and the action results,
+        which are None if the response came from the llm cache and its actions still have to run.
+        """
+        cache_key, ai_message = await self._lookup_llm_cache(input_messages)
+        if ai_message is not None:
+            return await self._parse_ai_message(ai_message, cache_key), None
+
+        parser = StreamingJSONObjectParser(stream_key="action")
+        queue: asyncio.Queue[Optional[ActionModel]] = asyncio.Queue()
+        executor = asyncio.create_task(multi_act_iter(self.controller, _queued_actions(queue), self.browser_context))
+        self._last_action_elements = []
+        dispatched: list[ActionModel] = []
+        brain: Optional[CustomAgentBrain] = None
+        dispatch_stopped = False
+        started = time.perf_counter()
+        response = None
+        try:
+            stream = self.llm.astream(input_messages).__aiter__()
+            while True:
+                # a stop request must not wait for the next chunk, the model may take long to send it
+                try:
+                    chunk = await self._unless_stopped(stream.__anext__())
+                except StopAsyncIteration:
+                    break
+                # merged chunks carry the usage metadata of the response
+                response = chunk if response is None else response + chunk
+                for kind, key, value in parser.feed(_chunk_text(chunk)):
+                    if kind == "field" and key == "current_state" and isinstance(value, dict):
+                        try:
+                            brain = CustomAgentBrain(**value)
+                        except ValidationError:
+                            continue
+                        self._log_brain(brain)
+                    elif kind == "item" and not dispatch_stopped:
+                        try:
+                            action = self.ActionModel(**value)
+                        except Exception:
+                            # the final parse reports the invalid entry, later entries must not run out of order
+                            dispatch_stopped = True
+                            continue
+                        if len(dispatched) >= self.max_actions_per_step:
+                            dispatch_stopped = True
+                            continue
+                        if not dispatched:
+                            logger.info(f"⚡ First action ready after {time.perf_counter() - started:.2f}s")
+                            self._invalidate_state_snapshot()
+                        index = action.get_index()
+                        if index in state.selector_map:
+                            self._last_action_elements.append(state.selector_map[index])
+                        dispatched.append(action)
+                        logger.info(f"🛠️  Action {len(dispatched)}: {action.model_dump_json(exclude_unset=True)}")
+                        queue.put_nowait(action)
+        except BaseException:
+            executor.cancel()
+            raise
+        queue.put_nowait(None)
+        result = await executor
+
+        ai_message = AIMessage(content=parser.text, usage_metadata=getattr(response, "usage_metadata", None))
+        try:
+            model_output = await self._parse_ai_message(ai_message, cache_key, log_response=False)
+        except ValueError as e:
+            if not dispatched:
+                raise
+            # retrying the step would run the actions a second time, they are the step's result instead
+            logger.warning(f"Could not parse the full response, keeping the {len(dispatched)} actions that ran: {e}")
+            model_output = self.AgentOutput(
+                current_state=brain or CustomAgentBrain(
+                    prev_action_evaluation="Unknown - the response could not be parsed",
+                    important_contents="",
+                    task_progress="",
+                    future_plans="",
+                    thought="",
+                    summary=f"Ran {len(dispatched)} streamed actions",
+                ),
+                action=dispatched,
+            )
+            self.n_steps += 1
+        if not dispatched:
+            # nothing could be dispatched while streaming, run the actions the usual way
+            return model_output, None
+        return model_output, result
+
     @time_execution_async("--step")
     async def step(self, step_info: Optional[CustomAgentStepInfo] = None) -> None:
         """Execute one step of the task"""
@@ -228,15 +564,43 @@ class CustomAgent(Agent):
         result: list[ActionResult] = []
 
         try:
-            state = await self.browser_context.get_state(use_vision=self.use_vision)
-            self.message_manager.add_state_message(state, self._last_actions, self._last_result, step_info)
+            state = await self._get_state_snapshot()
+            cache_key = self._get_action_cache_key(state)
+            cached_entry = self.action_cache.get(cache_key) if cache_key else None
+            if cached_entry is not None:
+                self._pending_cache_entry = None
+                model_output, result = await self._replay_cached_actions(cache_key, cached_entry, step_info)
+                if self.register_new_step_callback:
+                    self.register_new_step_callback(state, model_output, self.n_steps)
+                self._last_result = result
+                self._last_actions = model_output.action
+                self._last_action_elements = []
+                self.consecutive_failures = 0
+                return
+
+            focus_boxes, viewport_width = await self._get_focus_boxes()
+            self.message_manager.add_state_message(state, self._last_actions, self._last_result, step_info,
+                                                   focus_boxes=focus_boxes, viewport_width=viewport_width)
             input_messages = self.message_manager.get_messages()
+            streamed_result = None
             try:
-                model_output = await self.get_next_action(input_messages)
+                if self.stream_actions and not self.use_deepseek_r1:
+                    # the deepseek-r1 wrappers only post-process complete responses
+                    model_output, streamed_result = await self._stream_next_action(input_messages, state)
+                else:
+                    model_output = await self.get_next_action(input_messages)
                 if self.register_new_step_callback:
                     self.register_new_step_callback(state, model_output, self.n_steps)
                 self.update_step_info(model_output, step_info)
-                logger.info(f"🧠 All Memory: \n{step_info.memory}")
+                if self.action_cache:
+                    self._commit_pending_cache_entry(model_output)
+                if isinstance(step_info.memory, AgentMemory):
+                    logger.debug(
+                        f"🧠 Memory: {len(step_info.memory)} entries, ~{step_info.memory.tokens} tokens, "
+                        f"{step_info.memory.evicted} condensed"
+                    )
+                else:
+                    logger.info(f"🧠 All Memory: \n{step_info.memory}")
                 self._save_conversation(input_messages, model_output)
                 if self.model_name != "deepseek-reasoner":
                     # remove prev message
@@ -247,20 +611,26 @@ class CustomAgent(Agent):
                 raise e
 
             actions: list[ActionModel] = model_output.action
-            result: list[ActionResult] = await self.controller.multi_act(
-                actions, self.browser_context
-            )
-            if len(result) != len(actions):
-                # I think something changes, such information should let LLM know
-                for ri in range(len(result), len(actions)):
-                    result.append(ActionResult(extracted_content=None,
-                                                include_in_memory=True,
-                                                error=f"{actions[ri].model_dump_json(exclude_unset=True)} is Failed to execute. \
-                                                    Something new appeared after action {actions[len(result) - 1].model_dump_json(exclude_unset=True)}",
-                                                is_done=False))
+            if streamed_result is not None:
+                result = streamed_result
+            else:
+                self._last_action_elements = [
+                    state.selector_map[action.get_index()] for action in actions
+                    if action.get_index() in state.selector_map
+                ]
+                self._invalidate_state_snapshot()
+                result: list[ActionResult] = await self.controller.multi_act(
+                    actions, self.browser_context
+                )
+            if cache_key and self._is_cacheable(actions, result):
+                page = await self.browser_context.get_current_page()
+                self._pending_cache_entry = (
+                    cache_key, state.url, [a.model_dump(exclude_unset=True) for a in actions], page.url
+                )
+            result = self._fill_missing_results(actions, result)
             if len(actions) == 0:
                 # TODO: fix no action case
-                result = [ActionResult(is_done=True, extracted_content=step_info.memory, include_in_memory=True)]
+                result = [ActionResult(is_done=True, extracted_content=str(step_info.memory), include_in_memory=True)]
             self._last_result = result
             self._last_actions = actions
             if len(result) > 0 and result[-1].is_done:
@@ -268,7 +638,14 @@ class CustomAgent(Agent):
 
             self.consecutive_failures = 0
 
+        except AgentStoppedError:
+            logger.debug("Agent stopped during step")
+            self._invalidate_state_snapshot()
+            return
+
         except Exception as e:
+            # the step may have failed after actions ran, the next step must look at the page again
+            self._invalidate_state_snapshot()
             result = await self._handle_step_error(e)
             self._last_result = result
 
@@ -298,13 +675,14 @@ class CustomAgent(Agent):
             if self.initial_actions:
                 result = await self.controller.multi_act(self.initial_actions, self.browser_context, check_for_new_elements=False)
                 self._last_result = result
+                self._invalidate_state_snapshot()
 
             step_info = CustomAgentStepInfo(
                 task=self.task,
                 add_infos=self.add_infos,
                 step_number=1,
                 max_steps=max_steps,
-                memory="",
+                memory=AgentMemory(max_tokens=self.max_memory_tokens),
                 task_progress="",
                 future_plans=""
             )
@@ -316,15 +694,10 @@ class CustomAgent(Agent):
                     self._create_stop_history_item()
                     break
 
-                # 2) Store last valid state before step
-                if self.browser_context and self.agent_state:
-                    state = await self.browser_context.get_state(use_vision=self.use_vision)
-                    self.agent_state.set_last_valid_state(state)
-
                 if self._too_many_failures():
                     break
 
-                # 3) Do the step
+                # 2) Do the step, the state it captures is stored as last valid state
                 await self.step(step_info)
 
                 if self.history.is_done():
@@ -342,6 +715,17 @@ class CustomAgent(Agent):
             return self.history
 
         finally:
+            self._invalidate_state_snapshot()
+            if self.action_cache:
+                await self.action_cache.flush()
+                logger.info(f"♻️ Action cache: {self.action_cache.stats_dict()}")
+            if self.llm_cache:
+                logger.info(f"♻️ LLM cache: {self.llm_cache.stats_dict()}")
+            logger.debug(f"JSON parsing tiers: {self.json_parse_stats.stats_dict()}")
+            if self.prompt_cache_stats.requests:
+                logger.info(f"♻️ Prompt cache: {self.prompt_cache_stats.stats_dict()}")
+            if self.message_manager.screenshot_policy:
+                logger.info(f"🖼️ Screenshots: {self.message_manager.screenshot_policy.stats_dict()}")
             self.telemetry.capture(
                 AgentEndTelemetryEvent(
                     agent_id=self.agent_id,
@@ -363,7 +747,9 @@ class CustomAgent(Agent):
                 if isinstance(self.generate_gif, str):
                     output_path = self.generate_gif
 
-                self.create_history_gif(output_path=output_path)
+                self.gif_job = self.create_history_gif_job(output_path=output_path)
+                if self.gif_job is not None and not self.background_gif:
+                    await self.gif_job.wait()
 
     def _create_stop_history_item(self):
         """Create a history item for when the agent is stopped."""
@@ -423,6 +809,13 @@ class CustomAgent(Agent):
             screenshot=None
         )
 
+    def save_history(self, file_path: Optional[str] = None) -> None:
+        """Save the history, as compact JSON Lines with the screenshots stored apart for a .jsonl path"""
+        if file_path and is_compact_history(file_path):
+            save_compact_history(self.history, file_path, compression=self.history_compression)
+        else:
+            super().save_history(file_path)
+
     def create_history_gif(
         self,
         output_path: str = 'agent_history.gif',
@@ -435,103 +828,53 @@ class CustomAgent(Agent):
         goal_font_size: int = 44,
         margin: int = 40,
         line_spacing: float = 1.5,
+        workers: Optional[int] = None,
     ) -> None:
-        """Create a GIF from the agent's history with overlaid task and goal text."""
-        if not self.history.history:
-            logger.warning('No history to create GIF from')
+        """
+        Create a GIF from the agent's history with overlaid task and goal text, or an MP4/WebM video when
+        output_path ends with .mp4 or .webm. Up to workers frames are drawn at once on the shared frame
+        process pool and written in order one at a time.
+        """
+        jobs = self._history_frame_jobs(show_task, show_goals)
+        if not jobs:
             return
+        style = FrameStyle(
+            font_size=font_size,
+            title_font_size=title_font_size,
+            goal_font_size=goal_font_size,
+            margin=margin,
+            line_spacing=line_spacing,
+            show_logo=show_logo,
+        )
+        workers = workers or self.gif_workers or default_workers(len(jobs))
+        frames = write_history_animation(jobs, style, output_path, duration=duration, workers=workers)
+        logger.info(f'Created {output_path} with {frames} frames')
 
-        images = []
+    def create_history_gif_job(
+        self,
+        output_path: str = 'agent_history.gif',
+        duration: int = 3000,
+        show_goals: bool = True,
+        show_task: bool = True,
+        style: FrameStyle = FrameStyle(),
+    ) -> Optional[HistoryAnimationJob]:
+        """Start writing the history gif or video in the background, None if there is nothing to draw"""
+        jobs = self._history_frame_jobs(show_task, show_goals)
+        if not jobs:
+            return None
+        return HistoryAnimationJob(jobs, style, output_path, duration=duration, workers=self.gif_workers).start()
+
+    def _history_frame_jobs(self, show_task: bool = True, show_goals: bool = True) -> list[FrameJob]:
         # if history is empty or first screenshot is None, we can't create a gif
         if not self.history.history or not self.history.history[0].state.screenshot:
             logger.warning('No history or first screenshot to create GIF from')
-            return
-
-        # Try to load nicer fonts
-        try:
-            # Try different font options in order of preference
-            font_options = ['Helvetica', 'Arial', 'DejaVuSans', 'Verdana']
-            font_loaded = False
-
-            for font_name in font_options:
-                try:
-                    if platform.system() == 'Windows':
-                        # Need to specify the abs font path on Windows
-                        font_name = os.path.join(os.getenv('WIN_FONT_DIR', 'C:\\Windows\\Fonts'), font_name + '.ttf')
-                    regular_font = ImageFont.truetype(font_name, font_size)
-                    title_font = ImageFont.truetype(font_name, title_font_size)
-                    goal_font = ImageFont.truetype(font_name, goal_font_size)
-                    font_loaded = True
-                    break
-                except OSError:
-                    continue
-
-            if not font_loaded:
-                raise OSError('No preferred fonts found')
-
-        except OSError:
-            regular_font = ImageFont.load_default()
-            title_font = ImageFont.load_default()
-
-            goal_font = regular_font
-
-        # Load logo if requested
-        logo = None
-        if show_logo:
-            try:
-                logo = Image.open('./static/browser-use.png')
-                # Resize logo to be small (e.g., 40px height)
-                logo_height = 150
-                aspect_ratio = logo.width / logo.height
-                logo_width = int(logo_height * aspect_ratio)
-                logo = logo.resize((logo_width, logo_height), Image.Resampling.LANCZOS)
-            except Exception as e:
-                logger.warning(f'Could not load logo: {e}')
-
-        # Create task frame if requested
+            return []
+        jobs = []
         if show_task and self.task:
-            task_frame = self._create_task_frame(
-                self.task,
-                self.history.history[0].state.screenshot,
-                title_font,
-                regular_font,
-                logo,
-                line_spacing,
-            )
-            images.append(task_frame)
-
-        # Process each history item
+            jobs.append(FrameJob(screenshot=self.history.history[0].state.screenshot, task=self.task))
         for i, item in enumerate(self.history.history, 1):
             if not item.state.screenshot:
                 continue
-
-            # Convert base64 screenshot to PIL Image
-            img_data = base64.b64decode(item.state.screenshot)
-            image = Image.open(io.BytesIO(img_data))
-
-            if show_goals and item.model_output:
-                image = self._add_overlay_to_image(
-                    image=image,
-                    step_number=i,
-                    goal_text=item.model_output.current_state.thought,
-                    regular_font=regular_font,
-                    title_font=title_font,
-                    margin=margin,
-                    logo=logo,
-                )
-
-            images.append(image)
-
-        if images:
-            # Save the GIF
-            images[0].save(
-                output_path,
-                save_all=True,
-                append_images=images[1:],
-                duration=duration,
-                loop=0,
-                optimize=False,
-            )
-            logger.info(f'Created GIF at {output_path}')
-        else:
-            logger.warning('No images found in history to create GIF')
\ No newline at end of file
+            goal_text = item.model_output.current_state.thought if show_goals and item.model_output else None
+            jobs.append(FrameJob(screenshot=item.state.screenshot, step_number=i, goal_text=goal_text))
+        return jobs
\ No newline at end of file
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
+import dataclasses
 import logging
+from datetime import datetime
 from typing import List, Optional, Type
 
 from browser_use.agent.message_manager.service import MessageManager
-from browser_use.agent.message_manager.views import MessageHistory
+from browser_use.agent.message_manager.views import ManagedMessage, MessageMetadata
 from browser_use.agent.prompts import SystemPrompt, AgentMessagePrompt
 from browser_use.agent.views import ActionResult, AgentStepInfo, ActionModel
 from browser_use.browser.views import BrowserState
@@ -17,13 +19,29 @@ from langchain_core.messages import (
 	HumanMessage,
     ToolMessage
 )
-from langchain_openai import ChatOpenAI
+from langchain_openai import AzureChatOpenAI, ChatOpenAI
 from ..utils.llm import DeepSeekR1ChatOpenAI
-from .custom_prompts import CustomAgentMessagePrompt
+from ..utils.prompt_cache import with_cache_breakpoint
+from ..utils.token_counter import count_text_tokens
+from .custom_prompts import CustomAgentMessagePrompt, CustomSystemPrompt
+from .custom_views import CustomMessageHistory
+from .element_diff import ElementDiffTracker, ElementSnapshot, snapshot_elements
+from .element_pruning import prune_elements, query_terms
+from .screenshot_policy import ScreenshotPolicy, estimate_image_tokens, image_size_from_data_url
 
 logger = logging.getLogger(__name__)
 
 
+def _concat_content(first: str | list, second: str | list) -> str | list:
+    if isinstance(first, str) and isinstance(second, str):
+        return first + second
+
+    def as_list(content: str | list) -> list:
+        return [{"type": "text", "text": content}] if isinstance(content, str) else list(content)
+
+    return as_list(first) + as_list(second)
+
+
 class CustomMassageManager(MessageManager):
     def __init__(
             self,
@@ -38,7 +56,13 @@ class CustomMassageManager(MessageManager):
             include_attributes: list[str] = [],
             max_error_length: int = 400,
             max_actions_per_step: int = 10,
-            message_context: Optional[str] = None
+            message_context: Optional[str] = None,
+            use_element_diff: bool = False,
+            element_diff_resync_steps: int = 5,
+            max_elements_tokens: Optional[int] = None,
+            screenshot_policy: Optional[ScreenshotPolicy] = None,
+            prompt_caching: bool = False,
+            add_infos: str = "",
     ):
         super().__init__(
             llm=llm,
@@ -54,21 +78,50 @@ class CustomMassageManager(MessageManager):
             message_context=message_context
         )
         self.agent_prompt_class = agent_prompt_class
+        # token budget of the element list in one state message, a quarter of the context by default
+        self.max_elements_tokens = max_elements_tokens if max_elements_tokens is not None else max_input_tokens // 4
+        # skip, downscale, re-encode or crop screenshots before they are sent
+        self.screenshot_policy = screenshot_policy
+        # delta mode: after a full element list, only send the changes against it while on the same page
+        self.element_diff = ElementDiffTracker(resync_steps=element_diff_resync_steps) if use_element_diff else None
+        # the message carrying the last full element list and the reference text it is reduced to
+        self._element_list_message: Optional[ManagedMessage] = None
+        self._element_list_reference = ""
+        self._previous_element_list_message: Optional[ManagedMessage] = None
+        # cacheable layout: a byte-stable prefix of system prompt, context, task and hints, volatile data last
+        self.prompt_caching = prompt_caching
+        if prompt_caching and issubclass(system_prompt_class, CustomSystemPrompt):
+            self.system_prompt = system_prompt_class(
+                self.action_descriptions,
+                current_date=datetime.now(),
+                max_actions_per_step=max_actions_per_step,
+                include_current_time=False,
+            ).get_system_message()
         # Custom: Move Task info to state_message
-        self.history = MessageHistory()
+        self.history = CustomMessageHistory()
         self._add_message_with_tokens(self.system_prompt)
         
         if self.message_context:
             context_message = HumanMessage(content=self.message_context)
             self._add_message_with_tokens(context_message)
 
+        if self.prompt_caching:
+            if issubclass(agent_prompt_class, CustomAgentMessagePrompt):
+                task_message = agent_prompt_class.task_message(task, add_infos)
+            else:
+                # other prompt classes have no task message of their own
+                task_message = self.task_instructions(task)
+            self._add_message_with_tokens(task_message)
+        # system prompt, context and task message are never trimmed
+        self.prefix_length = len(self.history.messages)
+
     def cut_messages(self):
         """Get current message list, potentially trimmed to max tokens"""
         diff = self.history.total_tokens - self.max_input_tokens
-        min_message_len = 2 if self.message_context is not None else 1
         
-        while diff > 0 and len(self.history.messages) > min_message_len:
-            self.history.remove_message(min_message_len) # alway remove the oldest message
+        while diff > 0 and len(self.history.messages) > self.prefix_length:
+            # alway remove the oldest message, constant time on the deque backed history
+            self.history.remove_message(self.prefix_length)
             diff = self.history.total_tokens - self.max_input_tokens
         
     def add_state_message(
@@ -77,8 +130,46 @@ class CustomMassageManager(MessageManager):
             actions: Optional[List[ActionModel]] = None,
             result: Optional[List[ActionResult]] = None,
             step_info: Optional[AgentStepInfo] = None,
+            elements_text: Optional[str] = None,
+            focus_boxes: Optional[list[dict]] = None,
+            viewport_width: Optional[int] = None,
     ) -> None:
         """Add browser state as human message"""
+        elements_is_delta = False
+        screenshot_media_type = "image/png"
+        screenshot_note = None
+        if self.screenshot_policy is not None and state.screenshot:
+            screenshot = self.screenshot_policy.process(
+                state.screenshot,
+                state.url,
+                step_number=step_info.step_number if step_info else 0,
+                focus_boxes=focus_boxes,
+                viewport_width=viewport_width,
+                # after a failed action the llm should see the page as it is
+                force=any(r.error for r in result or []),
+            )
+            # the original screenshot stays in the agent history
+            state = dataclasses.replace(state, screenshot=screenshot.data)
+            screenshot_media_type = screenshot.media_type
+            screenshot_note = screenshot.note
+
+        if self.element_diff is not None:
+            if self._element_list_message is not None and not self._in_history(self._element_list_message):
+                # the full list was trimmed from the history, the next state has to resend it
+                self.element_diff.reset()
+                self._element_list_message = None
+            step_number = step_info.step_number if step_info else 0
+            snapshot = snapshot_elements(state.element_tree, state.url, self.include_attributes)
+            snapshot = self._fit_elements_budget(snapshot, step_info)
+            elements_text, is_full = self.element_diff.render(snapshot, step_number)
+            elements_is_delta = not is_full
+        elif self.max_elements_tokens:
+            if elements_text is None:
+                elements_text = state.element_tree.clickable_elements_to_string(include_attributes=self.include_attributes)
+            if len(elements_text) > self.max_elements_tokens * self.estimated_characters_per_token:
+                snapshot = snapshot_elements(state.element_tree, state.url, self.include_attributes)
+                elements_text = self._fit_elements_budget(snapshot, step_info).to_text()
+
         # otherwise add state message and result to next message (which will not stay in memory)
         state_message = self.agent_prompt_class(
             state,
@@ -87,17 +178,106 @@ class CustomMassageManager(MessageManager):
             include_attributes=self.include_attributes,
             max_error_length=self.max_error_length,
             step_info=step_info,
+            elements_text=elements_text,
+            elements_is_delta=elements_is_delta,
+            screenshot_media_type=screenshot_media_type,
+            screenshot_note=screenshot_note,
+            cacheable_layout=self.prompt_caching,
         ).get_user_message()
         self._add_message_with_tokens(state_message)
+
+        if self.element_diff is not None and not elements_is_delta:
+            self._element_list_message = self.history.messages[-1]
+            self._element_list_reference = (
+                f"Element list of step {step_number} ({state.url}), "
+                f"the following steps may only list the changes against it:\n{elements_text}"
+            )
+
+    def _fit_elements_budget(self, snapshot: ElementSnapshot, step_info: Optional[AgentStepInfo]) -> ElementSnapshot:
+        """Prune the element list to max_elements_tokens, ranking elements by the task, hints and future plans"""
+        if not self.max_elements_tokens:
+            return snapshot
+        terms = query_terms(
+            getattr(step_info, "task", None) or self.task,
+            getattr(step_info, "add_infos", None),
+            getattr(step_info, "future_plans", None),
+        )
+        pruned = prune_elements(snapshot, self.max_elements_tokens, terms, self.estimated_characters_per_token)
+        if pruned is not snapshot:
+            logger.info(
+                f"✂️ Pruned element list from {len(snapshot.lines)} to {len(pruned.lines)} lines "
+                f"to fit {self.max_elements_tokens} tokens"
+            )
+        return pruned
+
+    def _in_history(self, managed_message: ManagedMessage) -> bool:
+        return any(m is managed_message for m in reversed(self.history.human_messages))
+
+    def _keep_element_list_reference(self, index: int) -> None:
+        """Reduce the state message with the full element list to the list itself, the next deltas refer to it"""
+        reference = HumanMessage(content=self._element_list_reference)
+        self.history.replace_message(index, reference, MessageMetadata(input_tokens=self._count_tokens(reference)))
+        self._element_list_message = self.history.messages[index]
+        previous = self._previous_element_list_message
+        if previous is not None and self._in_history(previous):
+            self.history.remove_message(next(i for i, m in enumerate(self.history.messages) if m is previous))
+        self._previous_element_list_message = self._element_list_message
     
+    def get_messages(self) -> List[BaseMessage]:
+        messages = super().get_messages()
+        if self.prompt_caching and isinstance(self.llm, ChatAnthropic):
+            # anthropic only caches up to explicit breakpoints: the stable prefix and the history before the state
+            breakpoints = {self.prefix_length - 1, len(messages) - 2}
+            messages = [
+                with_cache_breakpoint(message) if i in breakpoints else message
+                for i, message in enumerate(messages)
+            ]
+        return messages
+
+    def merge_successive_human_messages(self, messages: list[BaseMessage]) -> list[BaseMessage]:
+        """
+        Merge runs of human messages for models that reject them in a row (deepseek-reasoner), into copies:
+        the messages are the history's own objects, merging into them would grow the stored ones every step.
+        """
+        merged_messages: list[BaseMessage] = []
+        streak = 0
+        for message in messages:
+            if isinstance(message, HumanMessage):
+                streak += 1
+                if streak > 1:
+                    previous = merged_messages[-1]
+                    merged_messages[-1] = previous.model_copy(
+                        update={"content": _concat_content(previous.content, message.content)}
+                    )
+                    continue
+            else:
+                streak = 0
+            merged_messages.append(message)
+        return merged_messages
+
+    def _count_tokens(self, message: BaseMessage) -> int:
+        if not isinstance(message.content, list):
+            return super()._count_tokens(message)
+        tokens = 0
+        for item in message.content:
+            if 'image_url' in item:
+                image_url = item['image_url']
+                tokens += self._count_image_tokens(image_url['url'] if isinstance(image_url, dict) else image_url)
+            elif isinstance(item, dict) and 'text' in item:
+                tokens += self._count_text_tokens(item['text'])
+        return tokens
+
+    def _count_image_tokens(self, url: str) -> int:
+        """Image tokens from the image size, downscaled screenshots cost less than the flat image_tokens"""
+        size = image_size_from_data_url(url)
+        if size is None:
+            return self.IMG_TOKENS
+        return estimate_image_tokens(*size, tiled=isinstance(self.llm, (ChatOpenAI, AzureChatOpenAI)))
+
     def _count_text_tokens(self, text: str) -> int:
         if isinstance(self.llm, (ChatOpenAI, ChatAnthropic, DeepSeekR1ChatOpenAI)):
-            try:
-                tokens = self.llm.get_num_tokens(text)
-            except Exception:
-                tokens = (
-					len(text) // self.estimated_characters_per_token
-				)  # Rough estimate if no tokenizer available
+            # local tokenizer, memoized per content hash and shared across agents, falls back to the estimate
+            tokens = count_text_tokens(self.llm, text, self.estimated_characters_per_token)
         else:
             tokens = (
 				len(text) // self.estimated_characters_per_token
@@ -106,12 +286,10 @@ class CustomMassageManager(MessageManager):
 
     def _remove_state_message_by_index(self, remove_ind=-1) -> None:
         """Remove last state message from history"""
-        i = len(self.history.messages) - 1
-        remove_cnt = 0
-        while i >= 0:
-            if isinstance(self.history.messages[i].message, HumanMessage): 
-                remove_cnt += 1
-            if remove_cnt == abs(remove_ind):
-                self.history.remove_message(i)
-                break
-            i -= 1
\ No newline at end of file
+        index = self.history.human_message_index(remove_ind)
+        if index is None:
+            return
+        if self.element_diff is not None and self.history.messages[index] is self._element_list_message:
+            self._keep_element_list_reference(index)
+        else:
+            self.history.remove_message(index)
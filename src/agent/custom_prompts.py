@@ -1,4 +1,5 @@
 import pdb
+from datetime import datetime
 from typing import List, Optional
 
 from browser_use.agent.prompts import SystemPrompt, AgentMessagePrompt
@@ -6,10 +7,22 @@ from browser_use.agent.views import ActionResult, ActionModel
 from browser_use.browser.views import BrowserState
 from langchain_core.messages import HumanMessage, SystemMessage
 
+from .agent_memory import AgentMemory
 from .custom_views import CustomAgentStepInfo
 
 
 class CustomSystemPrompt(SystemPrompt):
+    def __init__(
+            self,
+            action_description: str,
+            current_date: datetime,
+            max_actions_per_step: int = 10,
+            include_current_time: bool = True,
+    ):
+        super().__init__(action_description, current_date, max_actions_per_step)
+        # without the time the system prompt is byte-stable and can be served from the provider's prompt cache
+        self.include_current_time = include_current_time
+
     def important_rules(self) -> str:
         """
         Returns the important rules for the agent.
@@ -116,14 +129,17 @@ class CustomSystemPrompt(SystemPrompt):
         Returns:
             str: Formatted system prompt
         """
-        time_str = self.current_date.strftime("%Y-%m-%d %H:%M")
+        if self.include_current_time:
+            time_str = f'Current date and time: {self.current_date.strftime("%Y-%m-%d %H:%M")}'
+        else:
+            time_str = "The current date and time are given at the end of every state message."
 
         AGENT_PROMPT = f"""You are a precise browser automation agent that interacts with websites through structured commands. Your role is to:
     1. Analyze the provided webpage elements and structure
     2. Plan a sequence of actions to accomplish the given task
     3. Your final result MUST be a valid JSON as the **RESPONSE FORMAT** described, containing your action sequence and state assessment, No need extra content to expalin. 
 
-    Current date and time: {time_str}
+    {time_str}
 
     {self.input_format()}
 
@@ -145,6 +161,11 @@ class CustomAgentMessagePrompt(AgentMessagePrompt):
             include_attributes: list[str] = [],
             max_error_length: int = 400,
             step_info: Optional[CustomAgentStepInfo] = None,
+            elements_text: Optional[str] = None,
+            elements_is_delta: bool = False,
+            screenshot_media_type: str = "image/png",
+            screenshot_note: Optional[str] = None,
+            cacheable_layout: bool = False,
     ):
         super(CustomAgentMessagePrompt, self).__init__(state=state, 
                                                        result=result, 
@@ -153,6 +174,20 @@ class CustomAgentMessagePrompt(AgentMessagePrompt):
                                                        step_info=step_info
                                                        )
         self.actions = actions
+        # element string precomputed for this state, e.g. fitted to a token budget
+        self.elements_text = elements_text
+        # elements_text only lists the changes against an earlier full element list
+        self.elements_is_delta = elements_is_delta
+        # the screenshot may be re-encoded, cropped or left out by the screenshot policy
+        self.screenshot_media_type = screenshot_media_type
+        self.screenshot_note = screenshot_note
+        # task and hints are sent once in the cacheable prefix (see task_message), step and time go last
+        self.cacheable_layout = cacheable_layout
+
+    @staticmethod
+    def task_message(task: str, add_infos: str) -> HumanMessage:
+        """Task and hints as their own message, so they are part of the prefix the provider can cache"""
+        return HumanMessage(content=f"1. Task: {task}. \n2. Hints(Optional): \n{add_infos}")
 
     def get_user_message(self) -> HumanMessage:
         if self.step_info:
@@ -160,12 +195,20 @@ class CustomAgentMessagePrompt(AgentMessagePrompt):
         else:
             step_info_description = ''
 
-        elements_text = self.state.element_tree.clickable_elements_to_string(include_attributes=self.include_attributes)
+        if self.elements_text is not None:
+            elements_text = self.elements_text
+        else:
+            elements_text = self.state.element_tree.clickable_elements_to_string(include_attributes=self.include_attributes)
 
         has_content_above = (self.state.pixels_above or 0) > 0
         has_content_below = (self.state.pixels_below or 0) > 0
 
-        if elements_text != '':
+        if self.elements_is_delta:
+            if has_content_above:
+                elements_text = f'... {self.state.pixels_above} pixels above - scroll or extract content to see more ...\n{elements_text}'
+            if has_content_below:
+                elements_text = f'{elements_text}\n... {self.state.pixels_below} pixels below - scroll or extract content to see more ...'
+        elif elements_text != '':
             if has_content_above:
                 elements_text = (
                     f'... {self.state.pixels_above} pixels above - scroll or extract content to see more ...\n{elements_text}'
@@ -181,19 +224,29 @@ class CustomAgentMessagePrompt(AgentMessagePrompt):
         else:
             elements_text = 'empty page'
    
+        if self.cacheable_layout:
+            task_description = ""
+        else:
+            task_description = (
+                f"{step_info_description}\n1. Task: {self.step_info.task}. \n"
+                f"2. Hints(Optional): \n{self.step_info.add_infos}\n"
+            )
+
+        memory = self.step_info.memory
+        if isinstance(memory, AgentMemory):
+            memory = memory.render()
+
         state_description = f"""
-{step_info_description}
-1. Task: {self.step_info.task}. 
-2. Hints(Optional): 
-{self.step_info.add_infos}
-3. Memory: 
-{self.step_info.memory}
+{task_description}3. Memory: 
+{memory}
 4. Current url: {self.state.url}
 5. Available tabs:
 {self.state.tabs}
 6. Interactive elements:
 {elements_text}
         """
+        if self.screenshot_note:
+            state_description += f"\n{self.screenshot_note}\n"
 
         if self.actions and self.result:
             state_description += "\n **Previous Actions** \n"
@@ -211,6 +264,11 @@ class CustomAgentMessagePrompt(AgentMessagePrompt):
                             f"Error of previous action {i + 1}/{len(self.result)}: ...{error}\n"
                         )
 
+        if self.cacheable_layout:
+            state_description += (
+                f"\n{step_info_description}Current date and time: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n"
+            )
+
         if self.state.screenshot:
             # Format message for vision model
             return HumanMessage(
@@ -219,7 +277,7 @@ class CustomAgentMessagePrompt(AgentMessagePrompt):
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/png;base64,{self.state.screenshot}"
+                            "url": f"data:{self.screenshot_media_type};base64,{self.state.screenshot}"
                         },
                     },
                 ]
@@ -1,10 +1,15 @@
+from collections import deque
 from dataclasses import dataclass
-from typing import Type
+from typing import Deque, Optional, Type, Union
 
+from browser_use.agent.message_manager.views import ManagedMessage, MessageHistory, MessageMetadata
 from browser_use.agent.views import AgentOutput
 from browser_use.controller.registry.views import ActionModel
+from langchain_core.messages import BaseMessage, HumanMessage
 from pydantic import BaseModel, ConfigDict, Field, create_model
 
+from .agent_memory import AgentMemory
+
 
 @dataclass
 class CustomAgentStepInfo:
@@ -12,7 +17,7 @@ class CustomAgentStepInfo:
     max_steps: int
     task: str
     add_infos: str
-    memory: str
+    memory: Union[AgentMemory, str]
     task_progress: str
     future_plans: str
 
@@ -53,3 +58,68 @@ class CustomAgentOutput(AgentOutput):
             ),  # Properly annotated field with no default
             __module__=CustomAgentOutput.__module__,
         )
+
+
+class CustomMessageHistory(MessageHistory):
+    """Message history backed by a deque, with the positions of the HumanMessages indexed
+
+    Messages are only removed near either end (the oldest one after the system prompt when trimming,
+    or the last state message), so removal is constant time instead of shifting the whole list.
+    """
+
+    messages: Deque[ManagedMessage] = Field(default_factory=deque)
+    # the HumanMessage entries in history order, to find state messages without scanning
+    human_messages: Deque[ManagedMessage] = Field(default_factory=deque, exclude=True, repr=False)
+
+    def add_message(self, message: BaseMessage, metadata: MessageMetadata) -> None:
+        """Add a message with metadata"""
+        managed_message = ManagedMessage(message=message, metadata=metadata)
+        self.messages.append(managed_message)
+        if isinstance(message, HumanMessage):
+            self.human_messages.append(managed_message)
+        self.total_tokens += metadata.input_tokens
+
+    def remove_message(self, index: int = -1) -> None:
+        """Remove the message at index, constant time close to either end"""
+        if not self.messages:
+            return
+        msg = self.messages[index]
+        del self.messages[index]
+        self.total_tokens -= msg.metadata.input_tokens
+        if isinstance(msg.message, HumanMessage):
+            human_messages = self.human_messages
+            if human_messages[-1] is msg:
+                human_messages.pop()
+            elif human_messages[0] is msg:
+                human_messages.popleft()
+            else:
+                human_messages.remove(msg)
+
+    def replace_message(self, index: int, message: BaseMessage, metadata: MessageMetadata) -> None:
+        """Replace the message at index in place, keeping the token total and HumanMessage index in sync"""
+        old = self.messages[index]
+        managed_message = ManagedMessage(message=message, metadata=metadata)
+        self.messages[index] = managed_message
+        self.total_tokens += metadata.input_tokens - old.metadata.input_tokens
+        if isinstance(old.message, HumanMessage) and isinstance(message, HumanMessage):
+            human_messages = self.human_messages
+            for i in range(len(human_messages) - 1, -1, -1):
+                if human_messages[i] is old:
+                    human_messages[i] = managed_message
+                    break
+        elif isinstance(old.message, HumanMessage) or isinstance(message, HumanMessage):
+            self.human_messages = deque(m for m in self.messages if isinstance(m.message, HumanMessage))
+
+    def human_message_index(self, n: int = -1) -> Optional[int]:
+        """Position of the n-th HumanMessage counted from the end (-1 is the last one), None if there are fewer"""
+        n = -abs(n)
+        human_messages = self.human_messages
+        if len(human_messages) < -n:
+            return None
+        target = human_messages[n]
+        # state messages sit at the end of the history, so this walk only takes a few steps
+        messages = self.messages
+        for index in range(len(messages) - 1, -1, -1):
+            if messages[index] is target:
+                return index
+        return None
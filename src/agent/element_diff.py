@@ -0,0 +1,116 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+from browser_use.dom.views import DOMBaseNode, DOMElementNode, DOMTextNode
+
+
+@dataclass
+class ElementSnapshot:
+    """The serialized element list of a page, one line per element keyed by a stable identity"""
+
+    url: str
+    # identity -> line in the clickable_elements_to_string format, in page order
+    lines: dict[str, str] = field(default_factory=dict)
+
+    def to_text(self) -> str:
+        return "\n".join(self.lines.values())
+
+
+def snapshot_elements(element_tree: DOMElementNode, url: str, include_attributes: list[str] = []) -> ElementSnapshot:
+    """
+    Serialize the element tree exactly like clickable_elements_to_string, but keep every line keyed by the
+    element's xpath (or the parent xpath and text for text nodes). Highlight indices shift when elements
+    appear above, so they are part of the line and not of the identity.
+    """
+    snapshot = ElementSnapshot(url=url)
+
+    def add_line(key: str, line: str) -> None:
+        unique_key = key
+        occurrence = 1
+        # xpaths are relative to their iframe or shadow root, so they can repeat
+        while unique_key in snapshot.lines:
+            occurrence += 1
+            unique_key = f"{key}#{occurrence}"
+        snapshot.lines[unique_key] = line
+
+    def process_node(node: DOMBaseNode, parent_xpath: str) -> None:
+        if isinstance(node, DOMElementNode):
+            if node.highlight_index is not None:
+                attributes_str = ""
+                if include_attributes:
+                    attributes_str = " " + " ".join(
+                        f'{key}="{value}"' for key, value in node.attributes.items() if key in include_attributes
+                    )
+                add_line(
+                    node.xpath,
+                    f"{node.highlight_index}[:]<{node.tag_name}{attributes_str}>"
+                    f"{node.get_all_text_till_next_clickable_element()}</{node.tag_name}>",
+                )
+            for child in node.children:
+                process_node(child, node.xpath)
+
+        elif isinstance(node, DOMTextNode):
+            if not node.has_parent_with_highlight_index():
+                add_line(f"{parent_xpath}/text()={node.text}", f"_[:]{node.text}")
+
+    process_node(element_tree, "")
+    return snapshot
+
+
+def diff_snapshots(old: ElementSnapshot, new: ElementSnapshot) -> list[str]:
+    """Lines of new that were added (+) or changed (~) against old, followed by the removed ones (-)"""
+    delta = []
+    for key, line in new.lines.items():
+        old_line = old.lines.get(key)
+        if old_line is None:
+            delta.append(f"+ {line}")
+        elif old_line != line:
+            delta.append(f"~ {line}")
+    for key, line in old.lines.items():
+        if key not in new.lines:
+            delta.append(f"- {line}")
+    return delta
+
+
+class ElementDiffTracker:
+    """
+    Decides per step whether the llm gets the full element list or only the changes against the last full list.
+    The full list is sent on navigation, every resync_steps steps, and whenever the changes are not
+    clearly smaller than the list itself.
+    """
+
+    def __init__(self, resync_steps: int = 5, max_delta_ratio: float = 0.5):
+        self.resync_steps = resync_steps
+        self.max_delta_ratio = max_delta_ratio
+        self.baseline: Optional[ElementSnapshot] = None
+        self.baseline_step: int = 0
+        self._steps_since_baseline = 0
+
+    def reset(self) -> None:
+        self.baseline = None
+        self._steps_since_baseline = 0
+
+    def render(self, snapshot: ElementSnapshot, step_number: int) -> tuple[str, bool]:
+        """Return (elements text, is_full). A full list becomes the new baseline"""
+        full_text = snapshot.to_text()
+        if (
+                self.baseline is not None
+                and self.baseline.url == snapshot.url
+                and self._steps_since_baseline < self.resync_steps
+        ):
+            delta = diff_snapshots(self.baseline, snapshot)
+            delta_text = "\n".join(delta)
+            if len(delta_text) <= len(full_text) * self.max_delta_ratio:
+                self._steps_since_baseline += 1
+                if not delta:
+                    return f"No changes since the element list of step {self.baseline_step}.", False
+                return (
+                    f"Changes since the element list of step {self.baseline_step} "
+                    f"(+ added, ~ changed, - removed; all other elements are unchanged, with the same index):\n"
+                    f"{delta_text}"
+                ), False
+
+        self.baseline = snapshot
+        self.baseline_step = step_number
+        self._steps_since_baseline = 0
+        return full_text, True
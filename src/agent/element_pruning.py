@@ -0,0 +1,134 @@
+import bisect
+import re
+from typing import Optional
+
+from .element_diff import ElementSnapshot
+
+_POSITION = re.compile(r"\[\d+\]")
+_WORD = re.compile(r"[a-z0-9]{3,}")
+_FORM_TAGS = ("<input", "<select", "<textarea", "<button")
+STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "then", "from", "into", "your", "you", "are", "was", "has",
+    "have", "will", "should", "must", "can", "all", "any", "not", "but", "use", "page", "click", "step",
+    "steps", "given", "when", "scenario", "feature", "background",
+}
+
+
+def query_terms(*texts: Optional[str]) -> set[str]:
+    """Words of the task, hints and plans that make an element relevant"""
+    terms = set()
+    for text in texts:
+        if text:
+            terms.update(word for word in _WORD.findall(text.lower()) if word not in STOPWORDS)
+    return terms
+
+
+def _group_key(key: str) -> str:
+    """Elements that only differ in their sibling positions (table rows, menu items) share a group"""
+    key = key.split("#")[0]
+    if "/text()=" in key:
+        key = key.split("/text()=")[0] + "/text()"
+    return _POSITION.sub("", key)
+
+
+def _tag(line: str) -> str:
+    match = re.match(r"^\d+\[:\]<([a-zA-Z0-9-]+)", line)
+    return match.group(1) if match else "text"
+
+
+def _score(line: str, position: int, total: int, terms: set[str]) -> float:
+    relevance = len(terms.intersection(_WORD.findall(line.lower())))
+    score = relevance * 10.0
+    if not line.startswith("_[:]"):
+        score += 3
+        if any(tag in line for tag in _FORM_TAGS):
+            score += 2
+    # earlier elements are usually the visible ones
+    return score - position / max(total, 1)
+
+
+def collapse_repeated(snapshot: ElementSnapshot, terms: set[str], keep_per_group: int = 5) -> ElementSnapshot:
+    """Keep the first items and the relevant ones of long runs of similar elements, replace the rest by a note"""
+    items = list(snapshot.lines.items())
+    collapsed = ElementSnapshot(url=snapshot.url)
+    i = 0
+    while i < len(items):
+        group = _group_key(items[i][0])
+        end = i + 1
+        while end < len(items) and _group_key(items[end][0]) == group:
+            end += 1
+
+        run = items[i:end]
+        if len(run) <= keep_per_group + 1:
+            collapsed.lines.update(run)
+        else:
+            hidden = 0
+            for position, (key, line) in enumerate(run):
+                if position < keep_per_group or terms.intersection(_WORD.findall(line.lower())):
+                    collapsed.lines[key] = line
+                else:
+                    hidden += 1
+            collapsed.lines[f"{run[0][0]}#collapsed"] = (
+                f"_[:]... {hidden} more similar <{_tag(run[-1][1])}> items hidden, scroll or extract content to see them ..."
+            )
+        i = end
+    return collapsed
+
+
+def prune_elements(
+        snapshot: ElementSnapshot,
+        max_tokens: int,
+        terms: set[str],
+        characters_per_token: int = 3,
+        keep_per_group: int = 5,
+) -> ElementSnapshot:
+    """
+    Fit the element list into max_tokens: collapse repetitive lists first, then keep the elements
+    ranked most relevant to the task and plans, in page order, with a note where elements were left out.
+    """
+    max_chars = max_tokens * characters_per_token
+    if len(snapshot.to_text()) <= max_chars:
+        return snapshot
+
+    snapshot = collapse_repeated(snapshot, terms, keep_per_group)
+    if len(snapshot.to_text()) <= max_chars:
+        return snapshot
+
+    items = list(snapshot.lines.items())
+    ranked = sorted(
+        range(len(items)),
+        key=lambda position: _score(items[position][1], position, len(items), terms),
+        reverse=True,
+    )
+    # greedily keep the best elements, counting the omission note each gap between kept elements needs
+    note_size = len(_omitted_note(len(items))) + 1
+    kept = [-1, len(items)]
+    used = note_size
+    for position in ranked:
+        slot = bisect.bisect(kept, position)
+        before, after = kept[slot - 1], kept[slot]
+        notes_delta = (position - before > 1) + (after - position > 1) - (after - before > 1)
+        size = len(items[position][1]) + 1 + notes_delta * note_size
+        if used + size > max_chars:
+            continue
+        kept.insert(slot, position)
+        used += size
+
+    pruned = ElementSnapshot(url=snapshot.url)
+    kept_positions = set(kept[1:-1])
+    omitted = 0
+    for position, (key, line) in enumerate(items):
+        if position in kept_positions:
+            if omitted:
+                pruned.lines[f"{key}#omitted"] = _omitted_note(omitted)
+                omitted = 0
+            pruned.lines[key] = line
+        else:
+            omitted += 1
+    if omitted:
+        pruned.lines["#omitted-end"] = _omitted_note(omitted)
+    return pruned
+
+
+def _omitted_note(count: int) -> str:
+    return f"_[:]... {count} less relevant elements omitted, scroll or extract content to see them ..."
@@ -0,0 +1,340 @@
+import asyncio
+import base64
+import functools
+import io
+import itertools
+import logging
+import multiprocessing
+import os
+import platform
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+from browser_use.agent.service import Agent
+from PIL import GifImagePlugin, Image, ImageFont, ImageOps
+
+logger = logging.getLogger(__name__)
+
+FONT_OPTIONS = ['Helvetica', 'Arial', 'DejaVuSans', 'Verdana']
+VIDEO_CODECS = {".mp4": "libx264", ".webm": "libvpx-vp9"}
+
+
+@dataclass(frozen=True)
+class FrameStyle:
+    font_size: int = 40
+    title_font_size: int = 56
+    goal_font_size: int = 44
+    margin: int = 40
+    line_spacing: float = 1.5
+    show_logo: bool = False
+
+
+@dataclass(frozen=True)
+class FrameJob:
+    """One frame of the history animation: the task frame when task is set, otherwise a step screenshot"""
+
+    screenshot: str
+    step_number: int = 0
+    goal_text: Optional[str] = None
+    task: Optional[str] = None
+
+
+@functools.lru_cache(maxsize=8)
+def load_fonts(font_size: int, title_font_size: int, goal_font_size: int) -> tuple:
+    """(regular, title, goal) fonts, the first available of FONT_OPTIONS, loaded once per process"""
+    for font_name in FONT_OPTIONS:
+        try:
+            if platform.system() == 'Windows':
+                # Need to specify the abs font path on Windows
+                font_name = os.path.join(os.getenv('WIN_FONT_DIR', 'C:\\Windows\\Fonts'), font_name + '.ttf')
+            return (
+                ImageFont.truetype(font_name, font_size),
+                ImageFont.truetype(font_name, title_font_size),
+                ImageFont.truetype(font_name, goal_font_size),
+            )
+        except OSError:
+            continue
+    regular_font = ImageFont.load_default()
+    return regular_font, ImageFont.load_default(), regular_font
+
+
+@functools.lru_cache(maxsize=2)
+def load_logo(path: str = './static/browser-use.png', height: int = 150) -> Optional[Image.Image]:
+    try:
+        logo = Image.open(path)
+        width = int(height * logo.width / logo.height)
+        return logo.resize((width, height), Image.Resampling.LANCZOS)
+    except Exception as e:
+        logger.warning(f'Could not load logo: {e}')
+        return None
+
+
+class _FrameDrawing:
+    """The frame drawing of browser_use's Agent, without an agent instance"""
+
+    _wrap_text = Agent._wrap_text
+    _add_overlay_to_image = Agent._add_overlay_to_image
+    _create_task_frame = Agent._create_task_frame
+
+
+def render_frame(job: FrameJob, style: FrameStyle) -> Image.Image:
+    regular_font, title_font, _ = load_fonts(style.font_size, style.title_font_size, style.goal_font_size)
+    logo = load_logo() if style.show_logo else None
+    if job.task is not None:
+        return _FrameDrawing()._create_task_frame(
+            job.task, job.screenshot, title_font, regular_font, logo, style.line_spacing
+        )
+    image = Image.open(io.BytesIO(base64.b64decode(job.screenshot)))
+    if job.goal_text is None:
+        return image.convert('RGB')
+    return _FrameDrawing()._add_overlay_to_image(
+        image=image,
+        step_number=job.step_number,
+        goal_text=job.goal_text,
+        regular_font=regular_font,
+        title_font=title_font,
+        margin=style.margin,
+        logo=logo,
+    )
+
+
+def to_gif_frame(image: Image.Image) -> Image.Image:
+    """Quantize to an adaptive palette, the slowest part of writing a GIF frame"""
+    return image.convert('RGB').convert('P', palette=Image.Palette.ADAPTIVE)
+
+
+def _render_for_writer(job: FrameJob, style: FrameStyle, gif: bool) -> Image.Image:
+    image = render_frame(job, style)
+    return to_gif_frame(image) if gif else image.convert('RGB')
+
+
+class GifWriter:
+    """Writes an animated GIF frame by frame, each frame with its own palette, without keeping earlier frames"""
+
+    def __init__(self, path: str, duration: int = 3000, loop: int = 0):
+        self.path = path
+        self.duration = duration
+        self.loop = loop
+        self.size: Optional[tuple[int, int]] = None
+        self.frames = 0
+        self._file = open(path, 'wb')
+
+    def add(self, image: Image.Image) -> None:
+        if self.size is None:
+            self.size = image.size
+        elif image.size != self.size:
+            image = ImageOps.pad(image.convert('RGB'), self.size, color=(0, 0, 0))
+        # frames from to_gif_frame are already quantized
+        frame = image if image.mode == 'P' else to_gif_frame(image)
+        if self.frames == 0:
+            header, _ = GifImagePlugin.getheader(frame, info={'loop': self.loop, 'duration': self.duration})
+            self._file.write(b''.join(header))
+            # the first frame uses the global palette written with the header
+            data = GifImagePlugin.getdata(frame, duration=self.duration)
+        else:
+            data = GifImagePlugin.getdata(frame, duration=self.duration, include_color_table=True)
+        self._file.write(b''.join(data))
+        self.frames += 1
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.write(b';')
+            self._file.close()
+
+    def __enter__(self) -> 'GifWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class VideoWriter:
+    """Encodes frames to MP4 (H.264) or WebM (VP9) through ffmpeg as they are added"""
+
+    def __init__(self, path: str, duration: int = 3000):
+        try:
+            import imageio.v2 as imageio
+        except ImportError:
+            raise ImportError('Writing MP4/WebM requires imageio with ffmpeg, install it with `pip install imageio[ffmpeg]`')
+        import numpy as np
+
+        self._np = np
+        self.path = path
+        self.size: Optional[tuple[int, int]] = None
+        self.frames = 0
+        self._writer = imageio.get_writer(
+            path,
+            fps=1000 / duration,
+            codec=VIDEO_CODECS[os.path.splitext(path)[1].lower()],
+            pixelformat='yuv420p',
+        )
+
+    def add(self, image: Image.Image) -> None:
+        if self.size is None:
+            self.size = image.size
+        elif image.size != self.size:
+            image = ImageOps.pad(image, self.size, color=(0, 0, 0))
+        self._writer.append_data(self._np.asarray(image.convert('RGB')))
+        self.frames += 1
+
+    def close(self) -> None:
+        self._writer.close()
+
+    def __enter__(self) -> 'VideoWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def open_frame_writer(path: str, duration: int = 3000) -> Union[GifWriter, VideoWriter]:
+    """A GifWriter, or a VideoWriter for .mp4 and .webm paths"""
+    if os.path.splitext(path)[1].lower() in VIDEO_CODECS:
+        return VideoWriter(path, duration=duration)
+    return GifWriter(path, duration=duration)
+
+
+_frame_executor: Optional[ProcessPoolExecutor] = None
+_frame_executor_lock = threading.Lock()
+
+
+def frame_executor() -> ProcessPoolExecutor:
+    """
+    The process pool shared by every animation of this process, at most one worker per CPU however many
+    are written at once. Workers come from a forkserver (spawn where there is none), never forked from
+    a process running the event loop and the browser connection.
+    """
+    global _frame_executor
+    with _frame_executor_lock:
+        if _frame_executor is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _frame_executor = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1, mp_context=multiprocessing.get_context(method)
+            )
+        return _frame_executor
+
+
+def _discard_frame_executor(executor: Executor) -> None:
+    global _frame_executor
+    with _frame_executor_lock:
+        if _frame_executor is executor:
+            _frame_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def default_workers(frames: int) -> int:
+    """Frames worth rendering at once for frames frames, at least 4 frames per worker"""
+    return max(1, min(os.cpu_count() or 1, frames // 4))
+
+
+def _ordered_map(executor: Executor, fn: Callable, items: Iterable, window: int) -> Iterator:
+    """executor.map in order, with at most window results waiting so memory stays bounded when writing is slower"""
+    items = iter(items)
+    pending = deque(executor.submit(fn, item) for item in itertools.islice(items, window))
+    try:
+        while pending:
+            result = pending.popleft().result()
+            for item in itertools.islice(items, 1):
+                pending.append(executor.submit(fn, item))
+            yield result
+    finally:
+        # the executor is shared, only the frames of this animation are cancelled
+        for future in pending:
+            future.cancel()
+
+
+def write_history_animation(
+        jobs: list[FrameJob],
+        style: FrameStyle,
+        output_path: str,
+        duration: int = 3000,
+        workers: int = 1,
+        progress: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """
+    Render and write the frames of jobs in order, up to workers frames at a time on the shared frame_executor
+    when workers > 1, calling progress(frames written, frames total) after each frame. Returns the number of frames.
+    """
+    with open_frame_writer(output_path, duration=duration) as writer:
+        render = functools.partial(_render_for_writer, style=style, gif=isinstance(writer, GifWriter))
+        executor = frame_executor() if workers > 1 and len(jobs) > 1 else None
+        frames = _ordered_map(executor, render, jobs, window=workers) if executor else map(render, jobs)
+        try:
+            for frame in frames:
+                writer.add(frame)
+                if progress is not None:
+                    progress(writer.frames, len(jobs))
+        except BrokenProcessPool:
+            # a worker died, the next animation starts a new pool
+            _discard_frame_executor(executor)
+            raise
+        finally:
+            if executor is not None:
+                frames.close()
+    return writer.frames
+
+
+class HistoryAnimationJob:
+    """Writes a history animation in a background thread (drawing on the shared frame pool), with its progress"""
+
+    def __init__(
+            self,
+            jobs: list[FrameJob],
+            style: FrameStyle,
+            output_path: str,
+            duration: int = 3000,
+            workers: Optional[int] = None,
+    ):
+        self.jobs = jobs
+        self.style = style
+        self.output_path = output_path
+        self.duration = duration
+        self.workers = default_workers(len(jobs)) if workers is None else workers
+        self.frames_total = len(jobs)
+        self.frames_done = 0
+        self.elapsed = 0.0
+        self.error: Optional[BaseException] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def progress(self) -> float:
+        return self.frames_done / self.frames_total if self.frames_total else 1.0
+
+    @property
+    def done(self) -> bool:
+        return self._task is not None and self._task.done()
+
+    def start(self) -> 'HistoryAnimationJob':
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    async def wait(self) -> None:
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    def _on_progress(self, done: int, total: int) -> None:
+        self.frames_done = done
+
+    async def _run(self) -> None:
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(
+                write_history_animation, self.jobs, self.style, self.output_path, self.duration, self.workers,
+                self._on_progress,
+            )
+        except Exception as e:
+            self.error = e
+            logger.warning(f'Failed to create {self.output_path}: {e}')
+            return
+        finally:
+            self.elapsed = time.perf_counter() - start
+        logger.info(
+            f'Created {self.output_path} with {self.frames_done} frames in {self.elapsed:.1f}s '
+            f'({self.workers} worker{"s" if self.workers != 1 else ""})'
+        )
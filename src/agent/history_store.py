@@ -0,0 +1,221 @@
+import base64
+import hashlib
+import json
+import logging
+import mmap
+import os
+import zipfile
+from typing import Any, Optional, Type
+
+from browser_use.agent.views import AgentHistory, AgentHistoryList, AgentOutput
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FORMAT = "agent-history"
+HISTORY_VERSION = 1
+COMPRESSIONS = ("zstd",)
+
+
+def is_compact_history(path: str) -> bool:
+    return str(path).endswith(".jsonl")
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd compressed history requires zstandard, install it with `pip install zstandard`")
+    return zstandard
+
+
+class BlobStore:
+    """
+    Screenshots stored once by the sha256 of their bytes, one file per blob under directory, zstd compressed
+    when compression is "zstd". Histories saved to the same directory share their blobs.
+    """
+
+    def __init__(self, directory: str, compression: Optional[str] = None):
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown history compression '{compression}', use one of {', '.join(COMPRESSIONS)}")
+        self.directory = directory
+        self.compression = compression
+        self.written = 0
+        self.reused = 0
+
+    def path(self, digest: str, compression: Optional[str] = None) -> str:
+        suffix = ".zst" if compression == "zstd" else ""
+        return os.path.join(self.directory, digest[:2], digest + suffix)
+
+    def find(self, digest: str) -> Optional[str]:
+        """The file of the blob, stored compressed or not, None if it is missing"""
+        for compression in (None,) + COMPRESSIONS:
+            path = self.path(digest, compression)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        # a blob saved with another compression setting is not stored a second time
+        if self.find(digest) is not None:
+            self.reused += 1
+            return digest
+        path = self.path(digest, self.compression)
+        if self.compression == "zstd":
+            data = _zstd().ZstdCompressor().compress(data)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.written += 1
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """The blob's bytes, whether it was stored compressed or not"""
+        path = self.find(digest)
+        if path is None:
+            raise FileNotFoundError(f"screenshot {digest} is missing from {self.directory}")
+        with open(path, "rb") as f:
+            data = f.read()
+        return _zstd().ZstdDecompressor().decompress(data) if path.endswith(".zst") else data
+
+
+def save_compact_history(
+        history: AgentHistoryList,
+        path: str,
+        blob_dir: Optional[str] = None,
+        compression: Optional[str] = None,
+) -> None:
+    """
+    Save history as JSON Lines, a header line and one line per step, with every screenshot moved to a
+    BlobStore in blob_dir (a blobs directory next to path by default) and referenced by its hash.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    blob_dir = blob_dir or os.path.join(directory, "blobs")
+    blobs = BlobStore(blob_dir, compression=compression)
+    header = {
+        "format": HISTORY_FORMAT,
+        "version": HISTORY_VERSION,
+        "blobs": os.path.relpath(os.path.abspath(blob_dir), directory),
+        "steps": len(history.history),
+    }
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(header) + "\n")
+        for item in history.history:
+            step = item.model_dump()
+            screenshot = step["state"].pop("screenshot", None)
+            step["screenshot"] = blobs.put(base64.b64decode(screenshot)) if screenshot else None
+            # json escapes newlines in strings, a step is always one line
+            f.write(json.dumps(step, ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+    logger.info(
+        f"Saved {len(history.history)} steps to {path}: "
+        f"{blobs.written} new screenshots, {blobs.reused} already stored"
+    )
+
+
+class CompactHistory:
+    """
+    A history saved by save_compact_history, read lazily: the file is memory-mapped and only the line offsets
+    are indexed when it is opened, a step is parsed and its screenshot read when it is asked for.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} is empty")
+        self._offsets = self._index_lines()
+        self.header = json.loads(self._line(0))
+        if self.header.get("format") != HISTORY_FORMAT:
+            self.close()
+            raise ValueError(f"{path} is not a compact agent history")
+        self.blobs = BlobStore(os.path.join(os.path.dirname(os.path.abspath(path)), self.header["blobs"]))
+
+    def _index_lines(self) -> list[tuple[int, int]]:
+        offsets = []
+        start = 0
+        size = len(self._mmap)
+        while start < size:
+            end = self._mmap.find(b"\n", start)
+            if end == -1:
+                end = size
+            offsets.append((start, end))
+            start = end + 1
+        return offsets
+
+    def _line(self, index: int) -> bytes:
+        start, end = self._offsets[index]
+        return self._mmap[start:end]
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def step_data(self, index: int) -> dict[str, Any]:
+        """The step as saved, its screenshot replaced by the blob hash under "screenshot" """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"step {index} out of range")
+        return json.loads(self._line(index + 1))
+
+    def screenshot(self, index: int) -> Optional[str]:
+        """The base64 screenshot of the step, as the agent took it"""
+        digest = self.step_data(index)["screenshot"]
+        return base64.b64encode(self.blobs.get(digest)).decode() if digest else None
+
+    def step(self, index: int, output_model: Type[AgentOutput]) -> AgentHistory:
+        """
+        The step as saved by the agent. Like AgentHistoryList.load_from_file this needs the agent's output
+        model, the custom actions of a step are only known to it.
+        """
+        data = self.step_data(index)
+        digest = data.pop("screenshot")
+        data["state"]["screenshot"] = base64.b64encode(self.blobs.get(digest)).decode() if digest else None
+        data["state"].setdefault("interacted_element", None)
+        if isinstance(data["model_output"], dict):
+            data["model_output"] = output_model.model_validate(data["model_output"])
+        return AgentHistory.model_validate(data)
+
+    def load(self, output_model: Type[AgentOutput]) -> AgentHistoryList:
+        return AgentHistoryList(history=[self.step(index, output_model) for index in range(len(self))])
+
+    def close(self) -> None:
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> "CompactHistory":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def bundle_compact_history(path: str, bundle_path: Optional[str] = None) -> str:
+    """
+    Zip a compact history with the screenshots it references, a self-contained copy to download or move.
+    CompactHistory reads the history.jsonl of the extracted archive. Returns the path of the zip.
+    """
+    bundle_path = bundle_path or os.path.splitext(path)[0] + ".zip"
+    tmp_path = f"{bundle_path}.{os.getpid()}.tmp"
+    with CompactHistory(path) as history, zipfile.ZipFile(tmp_path, "w") as bundle:
+        header = dict(history.header, blobs="blobs")
+        lines = [json.dumps(header)] + [history._line(index + 1).decode("utf-8") for index in range(len(history))]
+        bundle.writestr("history.jsonl", "\n".join(lines) + "\n", compress_type=zipfile.ZIP_DEFLATED)
+        digests = {history.step_data(index)["screenshot"] for index in range(len(history))} - {None}
+        for digest in sorted(digests):
+            blob_path = history.blobs.find(digest)
+            if blob_path is None:
+                logger.warning(f"Screenshot {digest} of {path} is missing, it is left out of the bundle")
+                continue
+            # screenshots are compressed images already
+            bundle.write(blob_path, f"blobs/{digest[:2]}/{os.path.basename(blob_path)}",
+                         compress_type=zipfile.ZIP_STORED)
+    os.replace(tmp_path, bundle_path)
+    return bundle_path
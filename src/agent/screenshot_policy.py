@@ -0,0 +1,222 @@
+import base64
+import binascii
+import dataclasses
+import io
+import math
+from dataclasses import dataclass, field
+from typing import Optional
+
+from PIL import Image
+
+_MEDIA_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png"}
+
+
+def perceptual_hash(image: Image.Image, hash_size: int = 8) -> int:
+    """Difference hash: one bit per neighbouring pixel pair of a tiny grayscale copy, robust to re-encoding"""
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for column in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return bits
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def estimate_image_tokens(width: int, height: int, tiled: bool = False) -> int:
+    """
+    Input tokens of an image. tiled follows OpenAI's high detail tiling (fit into 2048x2048, shortest
+    side at most 768, 170 tokens per 512px tile plus 85), otherwise Anthropic's width * height / 750.
+    """
+    if not tiled:
+        return math.ceil(width * height / 750)
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+def image_size_from_data_url(url: str) -> Optional[tuple[int, int]]:
+    """Width and height of a base64 data url image, decoding only its header"""
+    _, _, data = url.partition("base64,")
+    if not data:
+        return None
+    try:
+        header = base64.b64decode(data[:8192 - 8192 % 4])
+        with Image.open(io.BytesIO(header)) as image:
+            return image.size
+    except (binascii.Error, OSError, ValueError):
+        return None
+
+
+@dataclass
+class ScreenshotPolicyStats:
+    sent: int = 0
+    skipped: int = 0
+    cropped: int = 0
+    input_bytes: int = 0
+    output_bytes: int = 0
+
+
+@dataclass
+class ProcessedScreenshot:
+    """The screenshot to send (None when skipped) and a note for the llm about what was done to it"""
+
+    data: Optional[str]
+    media_type: str = "image/png"
+    width: int = 0
+    height: int = 0
+    note: Optional[str] = None
+
+
+@dataclass
+class ScreenshotPolicy:
+    """
+    Decides per step whether and how the screenshot goes to the llm: it is left out while its perceptual hash
+    stays within change_threshold bits of the last sent one on the same url (at most max_skipped_steps in a row),
+    downscaled to max_width, re-encoded as jpeg/webp, and optionally cropped around the elements of the last step.
+    """
+
+    max_width: Optional[int] = 1024
+    image_format: str = "jpeg"
+    quality: int = 70
+    skip_unchanged: bool = True
+    change_threshold: int = 3
+    max_skipped_steps: int = 2
+    crop_to_focus: bool = False
+    crop_margin: int = 200
+    # a crop covering more than this share of the viewport is not worth the lost context
+    max_crop_ratio: float = 0.6
+    stats: ScreenshotPolicyStats = field(default_factory=ScreenshotPolicyStats)
+
+    def __post_init__(self):
+        if self.image_format not in _MEDIA_TYPES:
+            raise ValueError(f"Unsupported screenshot format {self.image_format}, use one of {list(_MEDIA_TYPES)}")
+        self._last_hash: Optional[int] = None
+        self._last_url: Optional[str] = None
+        self._last_step = 0
+        self._skipped_in_row = 0
+
+    def copy(self) -> "ScreenshotPolicy":
+        """Same settings with fresh change tracking and stats, policies must not be shared between agents"""
+        return dataclasses.replace(self, stats=ScreenshotPolicyStats())
+
+    def reset(self) -> None:
+        self._last_hash = None
+        self._last_url = None
+        self._skipped_in_row = 0
+
+    def process(
+            self,
+            screenshot: str,
+            url: str,
+            step_number: int = 0,
+            focus_boxes: Optional[list[dict]] = None,
+            viewport_width: Optional[int] = None,
+            force: bool = False,
+    ) -> ProcessedScreenshot:
+        """
+        screenshot is the base64 png of the viewport. focus_boxes are {x, y, width, height} viewport boxes in
+        css pixels of the elements the last step used, scaled to the image by viewport_width.
+        force always sends the image, e.g. after a failed action.
+        """
+        raw = base64.b64decode(screenshot)
+        self.stats.input_bytes += len(raw)
+        image = Image.open(io.BytesIO(raw))
+        image.load()
+
+        image_hash = perceptual_hash(image)
+        if (
+                self.skip_unchanged
+                and not force
+                and self._last_hash is not None
+                and self._last_url == url
+                and self._skipped_in_row < self.max_skipped_steps
+                and hamming_distance(image_hash, self._last_hash) <= self.change_threshold
+        ):
+            self._skipped_in_row += 1
+            self.stats.skipped += 1
+            return ProcessedScreenshot(
+                data=None,
+                note=f"Screenshot left out: the page looks the same as in the screenshot of step {self._last_step}.",
+            )
+        self._last_hash = image_hash
+        self._last_url = url
+        self._last_step = step_number
+        self._skipped_in_row = 0
+
+        original_size = image.size
+        note = None
+        crop_box = self._crop_box(image.size, focus_boxes, viewport_width) if self.crop_to_focus else None
+        if crop_box is not None:
+            image = image.crop(crop_box)
+            self.stats.cropped += 1
+            note = (
+                f"Screenshot cropped to the area around the elements used in the last step "
+                f"(pixels {crop_box[0]},{crop_box[1]} to {crop_box[2]},{crop_box[3]} of the viewport)."
+            )
+
+        if self.max_width and image.width > self.max_width:
+            height = max(1, round(image.height * self.max_width / image.width))
+            image = image.resize((self.max_width, height), Image.Resampling.LANCZOS)
+
+        if self.image_format == "png" and image.size == original_size:
+            # nothing to re-encode
+            data = raw
+        else:
+            buffer = io.BytesIO()
+            if self.image_format == "jpeg":
+                image.convert("RGB").save(buffer, format="JPEG", quality=self.quality, optimize=True)
+            elif self.image_format == "webp":
+                image.save(buffer, format="WEBP", quality=self.quality, method=4)
+            else:
+                image.save(buffer, format="PNG", optimize=True)
+            data = buffer.getvalue()
+
+        self.stats.sent += 1
+        self.stats.output_bytes += len(data)
+        return ProcessedScreenshot(
+            data=base64.b64encode(data).decode("utf-8"),
+            media_type=_MEDIA_TYPES[self.image_format],
+            width=image.width,
+            height=image.height,
+            note=note,
+        )
+
+    def _crop_box(
+            self,
+            image_size: tuple[int, int],
+            focus_boxes: Optional[list[dict]],
+            viewport_width: Optional[int],
+    ) -> Optional[tuple[int, int, int, int]]:
+        if not focus_boxes:
+            return None
+        width, height = image_size
+        # device pixels per css pixel
+        scale = width / viewport_width if viewport_width else 1.0
+        left = min(box["x"] for box in focus_boxes) * scale - self.crop_margin * scale
+        top = min(box["y"] for box in focus_boxes) * scale - self.crop_margin * scale
+        right = max(box["x"] + box["width"] for box in focus_boxes) * scale + self.crop_margin * scale
+        bottom = max(box["y"] + box["height"] for box in focus_boxes) * scale + self.crop_margin * scale
+        left, top = max(0, int(left)), max(0, int(top))
+        right, bottom = min(width, math.ceil(right)), min(height, math.ceil(bottom))
+        if right <= left or bottom <= top:
+            # the elements scrolled out of the viewport
+            return None
+        if (right - left) * (bottom - top) > width * height * self.max_crop_ratio:
+            return None
+        return left, top, right, bottom
+
+    def stats_dict(self) -> dict:
+        return {
+            "sent": self.stats.sent,
+            "skipped": self.stats.skipped,
+            "cropped": self.stats.cropped,
+            "input_bytes": self.stats.input_bytes,
+            "output_bytes": self.stats.output_bytes,
+        }
@@ -0,0 +1,386 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Deque, Optional
+
+from browser_use.browser.browser import BrowserConfig
+from browser_use.browser.context import BrowserContextConfig
+
+from .custom_browser import CustomBrowser
+from .custom_context import CustomBrowserContext
+
+logger = logging.getLogger(__name__)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _process_rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+async def browser_rss_bytes(browser: CustomBrowser) -> int:
+    """Resident memory of all processes of a local chromium, 0 if it cannot be measured"""
+    playwright_browser = browser.playwright_browser
+    if playwright_browser is None:
+        return 0
+    try:
+        session = await playwright_browser.new_browser_cdp_session()
+        try:
+            info = await session.send("SystemInfo.getProcessInfo")
+        finally:
+            await session.detach()
+    except Exception as e:
+        logger.debug(f"Failed to read browser processes: {e}")
+        return 0
+    return sum(_process_rss(process["id"]) for process in info.get("processInfo", []))
+
+
+@dataclass
+class BrowserLease:
+    """An isolated browser context handed out by the pool"""
+
+    lease_id: str
+    browser: CustomBrowser
+    browser_context: CustomBrowserContext
+
+
+@dataclass
+class _PooledBrowser:
+    browser: CustomBrowser
+    config: BrowserConfig
+    leases: set[str] = field(default_factory=set)
+    last_used: float = field(default_factory=time.monotonic)
+    warm: int = 0
+    contexts_created: int = 0
+    retiring: bool = False
+
+    def is_healthy(self) -> bool:
+        playwright_browser = self.browser.playwright_browser
+        return playwright_browser is not None and playwright_browser.is_connected()
+
+
+@dataclass
+class _WarmContext:
+    pooled: _PooledBrowser
+    browser_context: CustomBrowserContext
+
+
+@dataclass
+class _WarmSpec:
+    """Pre-created contexts for one browser and context configuration"""
+
+    browser_config: BrowserConfig
+    context_config: BrowserContextConfig
+    contexts: Deque[_WarmContext] = field(default_factory=deque)
+    task: Optional[asyncio.Task] = None
+
+
+class BrowserPool:
+    """
+    Pool of CustomBrowser instances that hands out one CustomBrowserContext per lease.
+
+    Browsers with the same BrowserConfig are shared, each lease gets its own context so
+    concurrent runs are isolated. Idle browsers are closed after idle_timeout seconds and
+    disconnected browsers are dropped before a new lease is handed out.
+
+    With warm_contexts > 0 the pool keeps that many contexts with an open page ready for every
+    configuration it was asked for, a lease takes one without waiting and a replacement is created
+    in the background. A browser stops getting new contexts after recycle_after_contexts contexts or
+    once its processes use more than max_browser_rss_mb, and is closed when its last context is gone.
+    """
+
+    def __init__(
+            self,
+            max_browsers: int = 2,
+            max_contexts_per_browser: int = 4,
+            idle_timeout: float = 300.0,
+            warm_contexts: int = 0,
+            recycle_after_contexts: int = 0,
+            max_browser_rss_mb: float = 0.0,
+    ):
+        self.max_browsers = max_browsers
+        self.max_contexts_per_browser = max_contexts_per_browser
+        self.idle_timeout = idle_timeout
+        self.warm_contexts = warm_contexts
+        self.recycle_after_contexts = recycle_after_contexts
+        self.max_browser_rss_mb = max_browser_rss_mb
+        self.warm_hits = 0
+        self.cold_acquires = 0
+        self.recycled_browsers = 0
+        self._browsers: list[_PooledBrowser] = []
+        self._leases: dict[str, _PooledBrowser] = {}
+        self._warm: list[_WarmSpec] = []
+        self._slots = asyncio.Semaphore(max_browsers * max_contexts_per_browser)
+        self._lock = asyncio.Lock()
+        self._evictor_task: Optional[asyncio.Task] = None
+
+    @property
+    def active_leases(self) -> int:
+        return len(self._leases)
+
+    @property
+    def warm_available(self) -> int:
+        return sum(len(spec.contexts) for spec in self._warm)
+
+    def stats_dict(self) -> dict:
+        return {
+            "browsers": len(self._browsers),
+            "active_leases": self.active_leases,
+            "warm_available": self.warm_available,
+            "warm_hits": self.warm_hits,
+            "cold_acquires": self.cold_acquires,
+            "recycled_browsers": self.recycled_browsers,
+        }
+
+    async def acquire(
+            self,
+            browser_config: BrowserConfig,
+            context_config: BrowserContextConfig = BrowserContextConfig(),
+    ) -> BrowserLease:
+        """Lease a fresh browser context, waiting if the pool is at capacity"""
+        await self._slots.acquire()
+        lease_id = str(uuid.uuid4())
+        try:
+            warm = self._take_warm(browser_config, context_config)
+            if warm is not None:
+                pooled, browser_context = warm.pooled, warm.browser_context
+                pooled.leases.add(lease_id)
+                self.warm_hits += 1
+            else:
+                async with self._lock:
+                    self._start_evictor()
+                    await self._evict()
+                    pooled = await self._get_browser(browser_config)
+                    self._count_context(pooled)
+                    # reserve the context on the browser before the lock is released, so concurrent
+                    # acquires count it and the browser is not evicted while the context is created
+                    pooled.leases.add(lease_id)
+                try:
+                    browser_context = await pooled.browser.new_context(config=context_config)
+                except Exception:
+                    pooled.leases.discard(lease_id)
+                    raise
+                self.cold_acquires += 1
+            pooled.last_used = time.monotonic()
+            self._leases[lease_id] = pooled
+        except Exception:
+            self._slots.release()
+            raise
+        self._start_warming(browser_config, context_config)
+        logger.debug(f"Leased {'warm' if warm else 'new'} browser context {lease_id} ({self.active_leases} active)")
+        return BrowserLease(lease_id=lease_id, browser=pooled.browser, browser_context=browser_context)
+
+    def prewarm(
+            self,
+            browser_config: BrowserConfig,
+            context_config: BrowserContextConfig = BrowserContextConfig(),
+    ) -> None:
+        """Start creating warm contexts for a configuration before its first lease"""
+        self._start_warming(browser_config, context_config)
+
+    async def release(self, lease: BrowserLease, close_browser: bool = False) -> None:
+        """Close the leased context and return its slot, optionally closing an otherwise unused browser"""
+        pooled = self._leases.pop(lease.lease_id, None)
+        if pooled is None:
+            return
+        try:
+            await lease.browser_context.close()
+        except Exception as e:
+            logger.debug(f"Failed to close leased context: {e}")
+        finally:
+            pooled.leases.discard(lease.lease_id)
+            pooled.last_used = time.monotonic()
+            self._slots.release()
+
+        if self.max_browser_rss_mb and not pooled.retiring:
+            rss = await browser_rss_bytes(pooled.browser)
+            if rss > self.max_browser_rss_mb * 1024 * 1024:
+                logger.info(f"Recycling pooled browser using {rss / 1024 / 1024:.0f}MB")
+                self._retire(pooled)
+
+        if (close_browser or pooled.retiring) and not pooled.leases and not pooled.warm:
+            async with self._lock:
+                await self._close_browser(pooled)
+
+    @asynccontextmanager
+    async def lease(
+            self,
+            browser_config: BrowserConfig,
+            context_config: BrowserContextConfig = BrowserContextConfig(),
+    ) -> AsyncIterator[BrowserLease]:
+        lease = await self.acquire(browser_config, context_config)
+        try:
+            yield lease
+        finally:
+            await self.release(lease)
+
+    async def evict_idle(self) -> None:
+        """Close browsers that are disconnected or have had no lease for longer than idle_timeout"""
+        async with self._lock:
+            await self._evict()
+
+    async def close(self) -> None:
+        if self._evictor_task is not None:
+            self._evictor_task.cancel()
+            self._evictor_task = None
+        specs, self._warm = self._warm, []
+        for spec in specs:
+            if spec.task is not None:
+                spec.task.cancel()
+        async with self._lock:
+            for pooled in list(self._browsers):
+                for lease_id in list(pooled.leases):
+                    # contexts still being created release their slot when creating them fails
+                    if self._leases.pop(lease_id, None) is not None:
+                        self._slots.release()
+                pooled.leases.clear()
+                await self._close_browser(pooled)
+
+    async def _get_browser(self, browser_config: BrowserConfig) -> _PooledBrowser:
+        candidates = [
+            pooled for pooled in self._browsers
+            if pooled.config == browser_config and not pooled.retiring
+            and len(pooled.leases) + pooled.warm < self.max_contexts_per_browser
+        ]
+        if candidates:
+            return min(candidates, key=lambda pooled: len(pooled.leases) + pooled.warm)
+
+        if len(self._browsers) >= self.max_browsers:
+            # make room by closing an unused browser, warm contexts of another config do not count as use
+            unused = [
+                pooled for pooled in self._browsers
+                if not pooled.leases and (pooled.config != browser_config or pooled.retiring or not pooled.warm)
+            ]
+            if not unused:
+                raise RuntimeError("Browser pool exhausted: all browsers are leased with other configurations")
+            await self._close_browser(min(unused, key=lambda pooled: pooled.last_used))
+
+        browser = CustomBrowser(config=browser_config)
+        # launch eagerly so the health check has a connection to look at
+        await browser.get_playwright_browser()
+        pooled = _PooledBrowser(browser=browser, config=browser_config)
+        self._browsers.append(pooled)
+        logger.info(f"Launched pooled browser ({len(self._browsers)}/{self.max_browsers})")
+        return pooled
+
+    def _count_context(self, pooled: _PooledBrowser) -> None:
+        pooled.contexts_created += 1
+        if self.recycle_after_contexts and pooled.contexts_created >= self.recycle_after_contexts:
+            self._retire(pooled)
+
+    def _retire(self, pooled: _PooledBrowser) -> None:
+        # contexts already created on it are still handed out, new ones go to another browser
+        if not pooled.retiring:
+            pooled.retiring = True
+            self.recycled_browsers += 1
+
+    def _find_spec(self, browser_config: BrowserConfig, context_config: BrowserContextConfig) -> Optional[_WarmSpec]:
+        for spec in self._warm:
+            if spec.browser_config == browser_config and spec.context_config == context_config:
+                return spec
+        return None
+
+    def _take_warm(
+            self,
+            browser_config: BrowserConfig,
+            context_config: BrowserContextConfig,
+    ) -> Optional[_WarmContext]:
+        spec = self._find_spec(browser_config, context_config)
+        while spec is not None and spec.contexts:
+            warm = spec.contexts.popleft()
+            warm.pooled.warm -= 1
+            if warm.pooled in self._browsers and warm.pooled.is_healthy():
+                return warm
+        return None
+
+    def _start_warming(self, browser_config: BrowserConfig, context_config: BrowserContextConfig) -> None:
+        if self.warm_contexts <= 0:
+            return
+        spec = self._find_spec(browser_config, context_config)
+        if spec is None:
+            spec = _WarmSpec(browser_config=browser_config, context_config=context_config)
+            self._warm.append(spec)
+        if spec.task is None or spec.task.done():
+            spec.task = asyncio.create_task(self._replenish(spec))
+
+    async def _replenish(self, spec: _WarmSpec) -> None:
+        while len(spec.contexts) < self.warm_contexts and spec in self._warm:
+            reservation = str(uuid.uuid4())
+            async with self._lock:
+                self._start_evictor()
+                try:
+                    pooled = await self._get_browser(spec.browser_config)
+                except Exception as e:
+                    # leased browsers take precedence over warm contexts
+                    logger.debug(f"Not warming a browser context: {e}")
+                    return
+                # reserved like a lease while it is created, it counts as warm once it is ready
+                pooled.leases.add(reservation)
+                self._count_context(pooled)
+            try:
+                browser_context = await pooled.browser.new_context(config=spec.context_config)
+                # opens the playwright context and its first page
+                await browser_context.get_session()
+            except Exception as e:
+                logger.debug(f"Failed to warm a browser context: {e}")
+                return
+            finally:
+                pooled.leases.discard(reservation)
+            if spec not in self._warm or pooled not in self._browsers:
+                await browser_context.close()
+                continue
+            pooled.warm += 1
+            spec.contexts.append(_WarmContext(pooled=pooled, browser_context=browser_context))
+
+    def _start_evictor(self) -> None:
+        if self._evictor_task is None or self._evictor_task.done():
+            self._evictor_task = asyncio.create_task(self._run_evictor())
+
+    async def _run_evictor(self) -> None:
+        while True:
+            await asyncio.sleep(self.idle_timeout / 2)
+            await self.evict_idle()
+
+    async def _evict(self) -> None:
+        now = time.monotonic()
+        for pooled in list(self._browsers):
+            if pooled.leases:
+                continue
+            if not pooled.is_healthy():
+                logger.info("Dropping disconnected pooled browser")
+                await self._close_browser(pooled)
+            elif now - pooled.last_used > self.idle_timeout:
+                logger.info("Closing idle pooled browser")
+                # an idle configuration is not warmed again until its next lease
+                for spec in [spec for spec in self._warm if spec.browser_config == pooled.config]:
+                    self._warm.remove(spec)
+                    if spec.task is not None:
+                        spec.task.cancel()
+                await self._close_browser(pooled)
+            elif pooled.retiring and not pooled.warm:
+                await self._close_browser(pooled)
+
+    async def _close_browser(self, pooled: _PooledBrowser) -> None:
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+        for spec in self._warm:
+            stale = [warm for warm in spec.contexts if warm.pooled is pooled]
+            for warm in stale:
+                spec.contexts.remove(warm)
+            if stale and (spec.task is None or spec.task.done()):
+                # replace the dropped contexts on another browser
+                spec.task = asyncio.create_task(self._replenish(spec))
+        pooled.warm = 0
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            logger.debug(f"Failed to close pooled browser: {e}")
@@ -1,6 +1,10 @@
 import asyncio
-import pdb
+import os
+import re
+import time
+from typing import Optional
 
+import httpx
 from playwright.async_api import Browser as PlaywrightBrowser
 from playwright.async_api import (
     BrowserContext as PlaywrightBrowserContext,
@@ -9,7 +13,7 @@ from playwright.async_api import (
     Playwright,
     async_playwright,
 )
-from browser_use.browser.browser import Browser
+from browser_use.browser.browser import Browser, BrowserConfig
 from browser_use.browser.context import BrowserContext, BrowserContextConfig
 from playwright.async_api import BrowserContext as PlaywrightBrowserContext
 import logging
@@ -18,64 +22,152 @@ from .custom_context import CustomBrowserContext
 
 logger = logging.getLogger(__name__)
 
+_DEVTOOLS_LISTENING = re.compile(rb"DevTools listening on (ws://\S+)")
+
+
+async def probe_devtools(
+        host: str,
+        port: int,
+        timeout: float = 10.0,
+        initial_delay: float = 0.05,
+        max_delay: float = 1.0,
+) -> Optional[str]:
+    """
+    Poll http://host:port/json/version with exponential backoff until it answers or timeout seconds passed,
+    return the browser websocket url, None if nothing answered. timeout=0 checks once.
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    async with httpx.AsyncClient(timeout=2.0) as client:
+        while True:
+            try:
+                response = await client.get(f"http://{host}:{port}/json/version")
+                if response.status_code == 200:
+                    return response.json().get("webSocketDebuggerUrl") or f"http://{host}:{port}"
+            except (httpx.HTTPError, ValueError):
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
+
+
+async def read_devtools_endpoint(stream: asyncio.StreamReader, timeout: float = 30.0) -> Optional[str]:
+    """Read chrome's stderr until it prints the DevTools websocket url, None if the stream ends first"""
+
+    async def read():
+        while True:
+            line = await stream.readline()
+            if not line:
+                return None
+            match = _DEVTOOLS_LISTENING.search(line)
+            if match:
+                return match.group(1).decode()
+
+    try:
+        return await asyncio.wait_for(read(), timeout)
+    except asyncio.TimeoutError:
+        return None
+
+
+async def _drain(stream: asyncio.StreamReader) -> None:
+    # chrome keeps logging to stderr, a full pipe would block it
+    while await stream.read(65536):
+        pass
+
+
 class CustomBrowser(Browser):
+    """
+    Browser whose chrome instance is attached without blocking the event loop. An instance already listening on
+    CHROME_DEBUGGING_HOST:CHROME_DEBUGGING_PORT is reused, otherwise chrome is started on debugging_port,
+    by default a port chrome picks itself, so several instances can start in parallel.
+    Only a reused instance keeps running after close, a chrome this class started is stopped with it.
+    """
+
+    def __init__(
+            self,
+            config: BrowserConfig = BrowserConfig(),
+            debugging_port: int = 0,
+            startup_timeout: float = 30.0,
+    ):
+        super().__init__(config=config)
+        self.debugging_port = debugging_port
+        self.startup_timeout = startup_timeout
+        self.cold_start_seconds: Optional[float] = None
+        self._chrome_process: Optional[asyncio.subprocess.Process] = None
+        self._stderr_task: Optional[asyncio.Task] = None
 
     async def new_context(
         self,
         config: BrowserContextConfig = BrowserContextConfig()
     ) -> CustomBrowserContext:
         return CustomBrowserContext(config=config, browser=self)
-    
+
+    async def _launch_chrome(self) -> str:
+        """Start chrome and return its DevTools endpoint"""
+        self._chrome_process = await asyncio.create_subprocess_exec(
+            self.config.chrome_instance_path,
+            f'--remote-debugging-port={self.debugging_port}',
+            *self.config.extra_chromium_args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        endpoint = await read_devtools_endpoint(self._chrome_process.stderr, timeout=self.startup_timeout)
+        self._stderr_task = asyncio.create_task(_drain(self._chrome_process.stderr))
+        if endpoint is None and self.debugging_port:
+            # a launcher script may detach chrome from our stderr, the fixed port still answers
+            endpoint = await probe_devtools('localhost', self.debugging_port, timeout=self.startup_timeout)
+        if endpoint is None:
+            raise RuntimeError('Chrome did not report a DevTools endpoint')
+        return endpoint
+
     async def _setup_browser_with_instance(self, playwright: Playwright) -> PlaywrightBrowser:
         """Sets up and returns a Playwright Browser instance with anti-detection measures."""
         if not self.config.chrome_instance_path:
             raise ValueError('Chrome instance path is required')
-        import subprocess
-
-        import requests
 
-        try:
-            # Check if browser is already running
-            response = requests.get('http://localhost:9222/json/version', timeout=2)
-            if response.status_code == 200:
-                logger.info('Reusing existing Chrome instance')
-                browser = await playwright.chromium.connect_over_cdp(
-                    endpoint_url='http://localhost:9222',
-                    timeout=20000,  # 20 second timeout for connection
-                )
-                return browser
-        except requests.ConnectionError:
+        start = time.perf_counter()
+        # Check if browser is already running
+        host = os.getenv('CHROME_DEBUGGING_HOST') or 'localhost'
+        port = int(os.getenv('CHROME_DEBUGGING_PORT') or 9222)
+        endpoint = await probe_devtools(host, port, timeout=0)
+        if endpoint:
+            logger.info('Reusing existing Chrome instance')
+        else:
             logger.debug('No existing Chrome instance found, starting a new one')
 
-        # Start a new Chrome instance
-        subprocess.Popen(
-            [
-                self.config.chrome_instance_path,
-                '--remote-debugging-port=9222',
-            ] + self.config.extra_chromium_args,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
-  
-        # try to connect first in case the browser have not started
-        for _ in range(10):
-            try:
-                response = requests.get('http://localhost:9222/json/version', timeout=2)
-                if response.status_code == 200:
-                    break
-            except requests.ConnectionError:
-                pass
-            await asyncio.sleep(1)
-
-        # Attempt to connect again after starting a new instance
         try:
+            if endpoint is None:
+                endpoint = await self._launch_chrome()
             browser = await playwright.chromium.connect_over_cdp(
-                endpoint_url='http://localhost:9222',
+                endpoint_url=endpoint,
                 timeout=20000,  # 20 second timeout for connection
             )
-            return browser
         except Exception as e:
             logger.error(f'Failed to start a new Chrome instance.: {str(e)}')
+            await self._stop_chrome()
             raise RuntimeError(
                 ' To start chrome in Debug mode, you need to close all existing Chrome instances and try again otherwise we can not connect to the instance.'
-            )
\ No newline at end of file
+            )
+        self.cold_start_seconds = time.perf_counter() - start
+        logger.info(f'Attached to Chrome at {endpoint} in {self.cold_start_seconds:.2f}s')
+        return browser
+
+    async def _stop_chrome(self) -> None:
+        if self._stderr_task:
+            self._stderr_task.cancel()
+            self._stderr_task = None
+        process, self._chrome_process = self._chrome_process, None
+        if process and process.returncode is None:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), 5)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+
+    async def close(self):
+        await super().close()
+        # chrome started by us is not shut down by disconnecting playwright, a reused instance has no process here
+        await self._stop_chrome()
@@ -1,6 +1,7 @@
 import json
 import logging
 import os
+from typing import Any
 
 from browser_use.browser.browser import Browser
 from browser_use.browser.context import BrowserContext, BrowserContextConfig
@@ -9,6 +10,8 @@ from playwright.async_api import BrowserContext as PlaywrightBrowserContext
 
 logger = logging.getLogger(__name__)
 
+_BLANK_PAGE = "<!DOCTYPE html><html><head></head><body></body></html>"
+
 
 class CustomBrowserContext(BrowserContext):
     def __init__(
@@ -16,4 +19,37 @@ class CustomBrowserContext(BrowserContext):
         browser: "Browser",
         config: BrowserContextConfig = BrowserContextConfig()
     ):
-        super(CustomBrowserContext, self).__init__(browser=browser, config=config)
\ No newline at end of file
+        super(CustomBrowserContext, self).__init__(browser=browser, config=config)
+
+    async def save_storage_state(self) -> dict[str, Any]:
+        """Cookies and localStorage of every origin of this context, in Playwright's storage state format"""
+        session = await self.get_session()
+        return await session.context.storage_state()
+
+    async def restore_storage_state(self, storage_state: dict[str, Any]) -> None:
+        """Add the cookies and localStorage of a storage state to this context"""
+        session = await self.get_session()
+        if storage_state.get("cookies"):
+            await session.context.add_cookies(storage_state["cookies"])
+        origins = [origin for origin in storage_state.get("origins", []) if origin.get("localStorage")]
+        if not origins:
+            return
+        # localStorage can only be written from a page of its origin: the current page is routed to a blank
+        # document of each origin instead of loading the site (a second page would become the agent's current page)
+        page = session.current_page
+        url = page.url
+
+        async def serve_blank(route):
+            await route.fulfill(status=200, content_type="text/html", body=_BLANK_PAGE)
+
+        await page.route("**/*", serve_blank)
+        try:
+            for origin in origins:
+                await page.goto(origin["origin"])
+                await page.evaluate(
+                    "items => { for (const item of items) localStorage.setItem(item.name, item.value) }",
+                    origin["localStorage"],
+                )
+        finally:
+            await page.unroute("**/*", serve_blank)
+        await page.goto(url if url.startswith("http") else "about:blank")
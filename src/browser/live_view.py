@@ -0,0 +1,219 @@
+import asyncio
+import base64
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Optional
+
+from playwright.async_api import CDPSession, Page
+
+from .custom_context import CustomBrowserContext
+
+logger = logging.getLogger(__name__)
+
+MJPEG_BOUNDARY = "frame"
+MJPEG_MEDIA_TYPE = f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}"
+
+
+@dataclass
+class ScreencastFrame:
+    sequence: int
+    # base64 JPEG as sent by chrome
+    data: str
+    timestamp: float
+    width: int = 0
+    height: int = 0
+    _jpeg: Optional[bytes] = field(default=None, repr=False)
+
+    @property
+    def jpeg(self) -> bytes:
+        if self._jpeg is None:
+            self._jpeg = base64.b64decode(self.data)
+        return self._jpeg
+
+
+class ScreencastStream:
+    """
+    Frames of the current page of a browser context from the DevTools screencast. Chrome only sends a frame
+    when the page is repainted and the next one after the previous is acknowledged, the acknowledgement is
+    delayed to stay below max_fps. Only the latest frame is kept: a viewer that falls behind skips to it.
+    The stream follows the agent when it switches tabs.
+    """
+
+    def __init__(
+            self,
+            browser_context: CustomBrowserContext,
+            max_fps: float = 10.0,
+            max_width: int = 1280,
+            max_height: int = 1280,
+            quality: int = 60,
+            page_check_interval: float = 0.5,
+    ):
+        self.browser_context = browser_context
+        self.max_fps = max_fps
+        self.max_width = max_width
+        self.max_height = max_height
+        self.quality = quality
+        self.page_check_interval = page_check_interval
+        self.viewers = 0
+        self.frames_received = 0
+        self.latest: Optional[ScreencastFrame] = None
+        self._page: Optional[Page] = None
+        self._cdp: Optional[CDPSession] = None
+        self._new_frame = asyncio.Event()
+        self._last_ack = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._follow_current_page())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self._detach()
+
+    async def next_frame(self, after: int = 0, timeout: Optional[float] = None) -> Optional[ScreencastFrame]:
+        """The latest frame if it is newer than sequence after, otherwise wait for one up to timeout seconds"""
+        if self.latest is None or self.latest.sequence <= after:
+            try:
+                await asyncio.wait_for(self._new_frame.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self.latest
+
+    async def _follow_current_page(self) -> None:
+        while True:
+            session = self.browser_context.session
+            page = session.current_page if session is not None else None
+            if page is not None and page is not self._page and not page.is_closed():
+                try:
+                    await self._attach(page)
+                except Exception as e:
+                    logger.debug(f"Failed to start screencast: {e}")
+                    self._page = None
+            await asyncio.sleep(self.page_check_interval)
+
+    async def _attach(self, page: Page) -> None:
+        await self._detach()
+        self._page = page
+        self._cdp = await page.context.new_cdp_session(page)
+        self._cdp.on("Page.screencastFrame", self._on_frame)
+        await self._cdp.send("Page.startScreencast", {
+            "format": "jpeg",
+            "quality": self.quality,
+            "maxWidth": self.max_width,
+            "maxHeight": self.max_height,
+        })
+
+    async def _detach(self) -> None:
+        cdp, self._cdp = self._cdp, None
+        self._page = None
+        if cdp is None:
+            return
+        try:
+            await cdp.send("Page.stopScreencast")
+            await cdp.detach()
+        except Exception as e:
+            # the page may already be closed
+            logger.debug(f"Failed to stop screencast: {e}")
+
+    def _on_frame(self, params: dict[str, Any]) -> None:
+        metadata = params.get("metadata", {})
+        self.frames_received += 1
+        self.latest = ScreencastFrame(
+            sequence=self.frames_received,
+            data=params["data"],
+            timestamp=time.time(),
+            width=int(metadata.get("deviceWidth", 0)),
+            height=int(metadata.get("deviceHeight", 0)),
+        )
+        event, self._new_frame = self._new_frame, asyncio.Event()
+        event.set()
+        asyncio.create_task(self._ack(self._cdp, params["sessionId"]))
+
+    async def _ack(self, cdp: Optional[CDPSession], session_id: int) -> None:
+        delay = self._last_ack + 1 / self.max_fps - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._last_ack = time.monotonic()
+        if cdp is None or cdp is not self._cdp:
+            return
+        try:
+            await cdp.send("Page.screencastFrameAck", {"sessionId": session_id})
+        except Exception as e:
+            logger.debug(f"Failed to acknowledge screencast frame: {e}")
+
+
+class LiveViewHub:
+    """One screencast per watched session however many viewers watch it, stopped when the last one leaves"""
+
+    def __init__(self, **stream_options):
+        self.stream_options = stream_options
+        self._streams: dict[str, ScreencastStream] = {}
+
+    def subscribe(self, key: str, browser_context: CustomBrowserContext) -> ScreencastStream:
+        stream = self._streams.get(key)
+        if stream is None or stream.browser_context is not browser_context:
+            # a new run of the session got another context, viewers of the old one keep their stream
+            stream = ScreencastStream(browser_context, **self.stream_options)
+            self._streams[key] = stream
+            stream.start()
+        stream.viewers += 1
+        return stream
+
+    async def unsubscribe(self, stream: ScreencastStream) -> None:
+        stream.viewers -= 1
+        if stream.viewers > 0:
+            return
+        for key, value in list(self._streams.items()):
+            if value is stream:
+                del self._streams[key]
+        await stream.stop()
+
+    def stream(self, key: str) -> Optional[ScreencastStream]:
+        return self._streams.get(key)
+
+
+async def mjpeg_stream(
+        hub: LiveViewHub,
+        key: str,
+        get_browser_context: Callable[[], Optional[CustomBrowserContext]],
+        idle_interval: float = 0.5,
+        is_active: Optional[Callable[[], bool]] = None,
+) -> AsyncIterator[bytes]:
+    """
+    The frames of the session key as a multipart/x-mixed-replace body, raw JPEG bytes an <img> shows natively.
+    The next frame is only taken once the previous one was sent, so a slow connection gets fewer frames
+    instead of a growing backlog. Waits for the session to get a browser context and follows it when
+    another one is leased. Ends once is_active returns False or the browser context is released.
+    """
+    boundary = f"--{MJPEG_BOUNDARY}\r\n".encode()
+    stream: Optional[ScreencastStream] = None
+    last_sequence = 0
+    # browsers only show a part once the next boundary arrived, so every part is followed by one
+    yield boundary
+    try:
+        while is_active is None or is_active():
+            browser_context = get_browser_context()
+            if stream is not None and stream.browser_context is not browser_context:
+                await hub.unsubscribe(stream)
+                stream, last_sequence = None, 0
+                if browser_context is None:
+                    # the lease was returned, there is nothing left to show
+                    break
+            if stream is None:
+                if browser_context is None:
+                    await asyncio.sleep(idle_interval)
+                    continue
+                stream = hub.subscribe(key, browser_context)
+            frame = await stream.next_frame(after=last_sequence, timeout=idle_interval)
+            if frame is None:
+                continue
+            last_sequence = frame.sequence
+            jpeg = frame.jpeg
+            yield b"Content-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n%s\r\n%s" % (len(jpeg), jpeg, boundary)
+    finally:
+        if stream is not None:
+            await hub.unsubscribe(stream)
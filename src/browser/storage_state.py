@@ -0,0 +1,72 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StorageStateCache:
+    """
+    Playwright storage states (cookies and localStorage per origin) saved under a fixture name, one JSON file
+    per fixture in directory. A snapshot older than ttl seconds is treated as missing and removed.
+    The files hold session cookies, keep the directory private.
+    """
+
+    def __init__(self, directory: str = "./tmp/storage_state", ttl: Optional[float] = 3600.0):
+        self.directory = directory
+        self.ttl = ttl
+
+    def path(self, fixture: str) -> str:
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", fixture).strip("._") or "fixture"
+        if slug != fixture:
+            # different names must not share a file after slugging
+            slug += "-" + hashlib.sha256(fixture.encode()).hexdigest()[:8]
+        return os.path.join(self.directory, f"{slug}.json")
+
+    def load(self, fixture: str) -> Optional[dict[str, Any]]:
+        """The storage state saved for fixture, None if there is none or it expired"""
+        path = self.path(fixture)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable storage state {path}: {e}")
+            return None
+        expires_at = entry.get("expires_at")
+        if expires_at is not None and expires_at <= time.time():
+            logger.info(f"Storage state of fixture '{fixture}' expired")
+            self.invalidate(fixture)
+            return None
+        return entry.get("storage_state")
+
+    def save(self, fixture: str, storage_state: dict[str, Any], ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        entry = {
+            "fixture": fixture,
+            "saved_at": now,
+            "expires_at": now + ttl if ttl else None,
+            "storage_state": storage_state,
+        }
+        path = self.path(fixture)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.info(
+            f"Saved storage state of fixture '{fixture}': {len(storage_state.get('cookies', []))} cookies, "
+            f"{len(storage_state.get('origins', []))} origins"
+        )
+
+    def invalidate(self, fixture: str) -> None:
+        try:
+            os.remove(self.path(fixture))
+        except FileNotFoundError:
+            pass
@@ -1,9 +1,53 @@
+import asyncio
+import logging
 import pyperclip
-from typing import Optional, Type
+from typing import AsyncIterable, Optional, Type
 from pydantic import BaseModel
-from browser_use.agent.views import ActionResult
+from browser_use.agent.views import ActionModel, ActionResult
 from browser_use.browser.context import BrowserContext
 from browser_use.controller.service import Controller, DoneAction
+from browser_use.utils import time_execution_async
+
+logger = logging.getLogger(__name__)
+
+
+async def _iterate(actions: list[ActionModel]):
+    for action in actions:
+        yield action
+
+
+async def multi_act_iter(
+        controller: Controller,
+        actions: AsyncIterable[ActionModel],
+        browser_context: BrowserContext,
+        check_for_new_elements: bool = True,
+) -> list[ActionResult]:
+    """
+    Controller.multi_act for actions that may still be arriving, e.g. while the llm writes the rest of the list.
+    Stops at done, on an error, or when new elements appeared before an action that needs an index.
+    """
+    results: list[ActionResult] = []
+    cached_path_hashes = None
+    async for action in actions:
+        if cached_path_hashes is None:
+            session = await browser_context.get_session()
+            cached_path_hashes = set(e.hash.branch_path_hash for e in session.cached_state.selector_map.values())
+            await browser_context.remove_highlights()
+        else:
+            await asyncio.sleep(browser_context.config.wait_between_actions)
+            if check_for_new_elements and action.get_index() is not None:
+                new_state = await browser_context.get_state()
+                new_path_hashes = set(e.hash.branch_path_hash for e in new_state.selector_map.values())
+                if not new_path_hashes.issubset(cached_path_hashes):
+                    # next action requires index but there are new elements on the page
+                    logger.info(f"Something new appeared after action {len(results)}")
+                    break
+
+        results.append(await controller.act(action, browser_context))
+        logger.debug(f"Executed action {len(results)}")
+        if results[-1].is_done or results[-1].error:
+            break
+    return results
 
 
 class CustomController(Controller):
@@ -13,6 +57,13 @@ class CustomController(Controller):
         super().__init__(exclude_actions=exclude_actions, output_model=output_model)
         self._register_custom_actions()
 
+    @time_execution_async("--multi-act")
+    async def multi_act(
+            self, actions: list[ActionModel], browser_context: BrowserContext, check_for_new_elements: bool = True
+    ) -> list[ActionResult]:
+        """Execute multiple actions"""
+        return await multi_act_iter(self, _iterate(actions), browser_context, check_for_new_elements)
+
     def _register_custom_actions(self):
         """Register all custom browser actions"""
 
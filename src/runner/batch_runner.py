@@ -0,0 +1,384 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Callable, Optional
+
+from browser_use.agent.views import AgentHistoryList
+from browser_use.browser.browser import BrowserConfig
+from browser_use.browser.context import BrowserContextConfig, BrowserContextWindowSize
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from src.agent.action_cache import ActionCache
+from src.agent.custom_agent import CustomAgent
+from src.agent.custom_prompts import CustomSystemPrompt, CustomAgentMessagePrompt
+from src.agent.screenshot_policy import ScreenshotPolicy
+from src.browser.browser_pool import BrowserPool
+from src.browser.storage_state import StorageStateCache
+from src.controller.custom_controller import CustomController
+from src.utils.agent_state import AgentState
+from src.utils.llm_cache import LLMResponseCache
+
+logger = logging.getLogger(__name__)
+
+RESTORED_SETUP_INFO = (
+    "Setup (already done in an earlier session, its cookies and local storage are restored in this browser: "
+    "do not sign in again, only repeat steps that open a page):"
+)
+DONE_SETUP_INFO = "Setup (already done in this browser, do not repeat it):"
+SETUP_INSTRUCTIONS = (
+    "Do the following setup steps in the browser, in order. "
+    "When they are done, or a step cannot be completed, use the done action. "
+    "Start the done text with 'PASSED' if every step succeeded, otherwise with 'FAILED: ' followed by "
+    "the failing step and the reason."
+)
+
+
+def setup_passed(history: AgentHistoryList) -> bool:
+    return history.is_done() and (history.final_result() or "").strip().upper().startswith("PASSED")
+
+
+@dataclass
+class BatchTask:
+    task_id: str
+    task: str
+    add_infos: str = ""
+    max_steps: Optional[int] = None
+    use_vision: Optional[bool] = None
+    max_actions_per_step: Optional[int] = None
+    # tasks with the same fixture share the browser storage state left by its setup steps
+    fixture: Optional[str] = None
+    setup: str = ""
+
+    def infos(self, restored: bool = False, setup_done: bool = False) -> str:
+        """add_infos with the setup steps, marked as done when they ran before or the fixture's state was restored"""
+        if not self.setup:
+            return self.add_infos
+        if restored:
+            header = RESTORED_SETUP_INFO
+        elif setup_done:
+            header = DONE_SETUP_INFO
+        else:
+            header = "Setup (do these steps first):"
+        return "\n".join(part for part in (self.add_infos, f"{header}\n{self.setup}") if part)
+
+
+@dataclass
+class BatchTaskResult:
+    task_id: str
+    task: str
+    success: bool
+    steps: int
+    duration: float
+    final_result: Optional[str] = None
+    fixture_restored: bool = False
+    # stopped by request_stop, before it started or while it ran
+    stopped: bool = False
+    errors: list[str] = field(default_factory=list)
+    history_file: Optional[str] = None
+
+
+@dataclass
+class BatchStats:
+    total: int = 0
+    completed: int = 0
+    succeeded: int = 0
+    steps: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def tasks_per_minute(self) -> float:
+        return self.completed / self.elapsed * 60 if self.elapsed else 0.0
+
+    @property
+    def steps_per_second(self) -> float:
+        return self.steps / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        data = asdict(self)
+        data["tasks_per_minute"] = round(self.tasks_per_minute, 3)
+        data["steps_per_second"] = round(self.steps_per_second, 3)
+        return data
+
+
+def _task_from_dict(data: dict[str, Any], index: int) -> BatchTask:
+    if "task" not in data:
+        raise ValueError(f"Task #{index + 1} has no 'task' field")
+    return BatchTask(
+        task_id=str(data.get("id", data.get("task_id", index + 1))),
+        task=data["task"],
+        add_infos=data.get("add_infos", ""),
+        max_steps=data.get("max_steps"),
+        use_vision=data.get("use_vision"),
+        max_actions_per_step=data.get("max_actions_per_step"),
+        fixture=data.get("fixture"),
+        setup=data.get("setup", ""),
+    )
+
+
+def load_tasks(path: str) -> list[BatchTask]:
+    """
+    Load tasks from a JSONL file (one object per line) or a YAML file (a list, or a mapping with a 'tasks' list).
+    Each entry needs a 'task' and may set 'id', 'add_infos', 'max_steps', 'use_vision', 'max_actions_per_step',
+    'fixture' and 'setup'.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+
+    if path.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("Loading YAML task files requires PyYAML, install it with `pip install pyyaml`")
+        data = yaml.safe_load(content) or []
+        if isinstance(data, dict):
+            data = data.get("tasks", [])
+    else:
+        data = [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    return [_task_from_dict(item, i) for i, item in enumerate(data)]
+
+
+class BatchRunner:
+    """Runs many tasks through CustomAgent with bounded concurrency over pooled browsers"""
+
+    def __init__(
+            self,
+            llm: BaseChatModel,
+            output_dir: str = "./tmp/batch",
+            concurrency: int = 4,
+            browser_config: BrowserConfig = BrowserConfig(headless=True),
+            context_config: BrowserContextConfig = BrowserContextConfig(
+                no_viewport=False,
+                browser_window_size=BrowserContextWindowSize(width=1280, height=1100),
+            ),
+            browser_pool: Optional[BrowserPool] = None,
+            max_steps: int = 100,
+            use_vision: bool = True,
+            max_actions_per_step: int = 10,
+            tool_calling_method: str = "auto",
+            action_cache: Optional[ActionCache] = None,
+            llm_cache: Optional[LLMResponseCache] = None,
+            use_element_diff: bool = False,
+            max_elements_tokens: Optional[int] = None,
+            screenshot_policy: Optional[ScreenshotPolicy] = None,
+            stream_actions: bool = False,
+            prompt_caching: bool = False,
+            max_memory_tokens: int = 2000,
+            warm_contexts: int = 0,
+            recycle_after_contexts: int = 0,
+            storage_states: Optional[StorageStateCache] = None,
+            history_compression: Optional[str] = None,
+    ):
+        self.llm = llm
+        self.output_dir = output_dir
+        self.concurrency = concurrency
+        self.browser_config = browser_config
+        self.context_config = context_config
+        # a pool passed in belongs to the caller, run() only closes the pool it created
+        self._owns_pool = browser_pool is None
+        self.browser_pool = browser_pool or BrowserPool(
+            max_browsers=max(1, (concurrency + 3) // 4),
+            max_contexts_per_browser=min(concurrency, 4),
+            warm_contexts=warm_contexts,
+            recycle_after_contexts=recycle_after_contexts,
+        )
+        self.max_steps = max_steps
+        self.use_vision = use_vision
+        self.max_actions_per_step = max_actions_per_step
+        self.tool_calling_method = tool_calling_method
+        self.action_cache = action_cache
+        self.llm_cache = llm_cache
+        self.use_element_diff = use_element_diff
+        self.max_elements_tokens = max_elements_tokens
+        self.screenshot_policy = screenshot_policy
+        self.stream_actions = stream_actions
+        self.prompt_caching = prompt_caching
+        self.max_memory_tokens = max_memory_tokens
+        self.storage_states = storage_states
+        self.history_compression = history_compression
+        # whether the setup run of a fixture left a state worth saving
+        self.snapshot_check: Callable[[AgentHistoryList], bool] = setup_passed
+        self.stats = BatchStats()
+        self.stop_requested = False
+        self._agent_states: dict[str, AgentState] = {}
+        self._fixture_locks: dict[str, asyncio.Lock] = {}
+
+    @property
+    def results_path(self) -> str:
+        return os.path.join(self.output_dir, "results.jsonl")
+
+    def request_stop(self) -> None:
+        """Stop all running agents at their next safe point, tasks that have not started yet are skipped"""
+        self.stop_requested = True
+        for agent_state in self._agent_states.values():
+            agent_state.request_stop()
+
+    async def run(
+            self,
+            tasks: list[BatchTask],
+            on_result: Optional[Callable[[BatchTaskResult], None]] = None,
+    ) -> BatchStats:
+        """Run all tasks, appending each result to results.jsonl (and passing it to on_result) as soon as it finishes"""
+        task_ids = [batch_task.task_id for batch_task in tasks]
+        duplicates = sorted({task_id for task_id in task_ids if task_ids.count(task_id) > 1})
+        if duplicates:
+            # results, histories and stop requests are keyed by task id
+            raise ValueError(f"Duplicate task ids: {', '.join(duplicates)}")
+        os.makedirs(os.path.join(self.output_dir, "history"), exist_ok=True)
+        self.stats = BatchStats(total=len(tasks))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start_time = time.monotonic()
+
+        with open(self.results_path, "a", encoding="utf-8") as results_file:
+            async def run_bounded(batch_task: BatchTask) -> None:
+                async with semaphore:
+                    if self.stop_requested:
+                        result = BatchTaskResult(
+                            task_id=batch_task.task_id,
+                            task=batch_task.task,
+                            success=False,
+                            steps=0,
+                            duration=0.0,
+                            stopped=True,
+                            errors=["Stopped before the task started"],
+                        )
+                    else:
+                        result = await self._run_task(batch_task)
+                results_file.write(json.dumps(asdict(result), ensure_ascii=False) + "\n")
+                results_file.flush()
+                if on_result is not None:
+                    on_result(result)
+
+                self.stats.completed += 1
+                self.stats.succeeded += int(result.success)
+                self.stats.steps += result.steps
+                self.stats.elapsed = time.monotonic() - start_time
+                logger.info(
+                    f"{'✅' if result.success else '❌'} [{self.stats.completed}/{self.stats.total}] {result.task_id} "
+                    f"in {result.duration:.1f}s - {self.stats.tasks_per_minute:.2f} tasks/min, "
+                    f"{self.stats.steps_per_second:.2f} steps/s"
+                )
+
+            try:
+                self.browser_pool.prewarm(self.browser_config, self.context_config)
+                await asyncio.gather(*(run_bounded(batch_task) for batch_task in tasks))
+            finally:
+                if self._owns_pool:
+                    await self.browser_pool.close()
+
+        self.stats.elapsed = time.monotonic() - start_time
+        with open(os.path.join(self.output_dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(self.stats.to_dict(), f, indent=2)
+        return self.stats
+
+    @asynccontextmanager
+    async def _fixture_state(self, fixture: Optional[str]) -> AsyncIterator[Optional[dict[str, Any]]]:
+        """
+        The cached storage state of fixture. Without one, tasks of the same fixture wait until the task
+        holding the lock ran the setup steps and saved it, so the setup is done once instead of by every task.
+        """
+        if not fixture or self.storage_states is None:
+            yield None
+            return
+        storage_state = self.storage_states.load(fixture)
+        if storage_state is None:
+            async with self._fixture_locks.setdefault(fixture, asyncio.Lock()):
+                # the task holding the lock may have saved it meanwhile
+                storage_state = self.storage_states.load(fixture)
+                if storage_state is None:
+                    yield None
+                    return
+        yield storage_state
+
+    def _new_agent(self, batch_task: BatchTask, task: str, add_infos: str, lease, agent_state: AgentState) -> CustomAgent:
+        return CustomAgent(
+            task=task,
+            add_infos=add_infos,
+            llm=self.llm,
+            browser=lease.browser,
+            browser_context=lease.browser_context,
+            controller=CustomController(),
+            system_prompt_class=CustomSystemPrompt,
+            agent_prompt_class=CustomAgentMessagePrompt,
+            use_vision=self.use_vision if batch_task.use_vision is None else batch_task.use_vision,
+            max_actions_per_step=batch_task.max_actions_per_step or self.max_actions_per_step,
+            agent_state=agent_state,
+            tool_calling_method=self.tool_calling_method,
+            generate_gif=False,
+            action_cache=self.action_cache,
+            llm_cache=self.llm_cache,
+            use_element_diff=self.use_element_diff,
+            max_elements_tokens=self.max_elements_tokens,
+            screenshot_policy=self.screenshot_policy.copy() if self.screenshot_policy else None,
+            stream_actions=self.stream_actions,
+            prompt_caching=self.prompt_caching,
+            max_memory_tokens=self.max_memory_tokens,
+            history_compression=self.history_compression,
+        )
+
+    async def _run_task(self, batch_task: BatchTask) -> BatchTaskResult:
+        start_time = time.monotonic()
+        agent_state = AgentState()
+        self._agent_states[batch_task.task_id] = agent_state
+        history: Optional[AgentHistoryList] = None
+        history_file = None
+        errors: list[str] = []
+        restored = False
+        setup_failed = False
+        setup_steps = 0
+        try:
+            async with self.browser_pool.lease(self.browser_config, self.context_config) as lease:
+                setup_history: Optional[AgentHistoryList] = None
+                async with self._fixture_state(batch_task.fixture) as storage_state:
+                    if storage_state is not None:
+                        await lease.browser_context.restore_storage_state(storage_state)
+                        restored = True
+                    elif batch_task.fixture and batch_task.setup and self.storage_states is not None:
+                        # the setup runs on its own and is saved before the task, which may sign out or change data
+                        setup_agent = self._new_agent(
+                            batch_task, f"{SETUP_INSTRUCTIONS}\n\n{batch_task.setup}", batch_task.add_infos,
+                            lease, agent_state,
+                        )
+                        setup_history = await setup_agent.run(max_steps=batch_task.max_steps or self.max_steps)
+                        setup_failed = not self.snapshot_check(setup_history)
+                        if not setup_failed:
+                            self.storage_states.save(
+                                batch_task.fixture, await lease.browser_context.save_storage_state()
+                            )
+                if setup_failed:
+                    history = setup_history
+                    errors = [error for error in history.errors() if error]
+                    errors.append(f"Setup of fixture '{batch_task.fixture}' did not pass")
+                else:
+                    setup_steps = len(setup_history.history) if setup_history else 0
+                    agent = self._new_agent(
+                        batch_task, batch_task.task, batch_task.infos(restored, setup_done=setup_history is not None),
+                        lease, agent_state,
+                    )
+                    history = await agent.run(max_steps=batch_task.max_steps or self.max_steps)
+                    history_file = os.path.join(self.output_dir, "history", f"{batch_task.task_id}.jsonl")
+                    agent.save_history(history_file)
+                    errors = [error for error in history.errors() if error]
+        except Exception as e:
+            logger.error(f"Task {batch_task.task_id} failed: {e}")
+            errors.append(str(e))
+        finally:
+            self._agent_states.pop(batch_task.task_id, None)
+
+        return BatchTaskResult(
+            task_id=batch_task.task_id,
+            task=batch_task.task,
+            # a stopped run ends with a done item, it did not finish the task
+            success=bool(history and history.is_done()) and not setup_failed and not agent_state.is_stop_requested(),
+            steps=setup_steps + (len(history.history) if history else 0),
+            duration=time.monotonic() - start_time,
+            final_result=history.final_result() if history else None,
+            fixture_restored=restored,
+            stopped=agent_state.is_stop_requested(),
+            errors=errors,
+            history_file=history_file,
+        )
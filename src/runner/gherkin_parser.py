@@ -0,0 +1,331 @@
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Optional
+
+STEP_KEYWORDS = ("Given", "When", "Then", "And", "But", "*")
+SCENARIO_KEYWORDS = ("Scenario", "Example")
+OUTLINE_KEYWORDS = ("Scenario Outline", "Scenario Template")
+EXAMPLES_KEYWORDS = ("Examples", "Scenarios")
+DOC_STRING_DELIMITERS = ('"""', "```")
+
+
+class GherkinParseError(ValueError):
+    def __init__(self, path: str, line: int, message: str):
+        super().__init__(f"{path}:{line}: {message}")
+        self.path = path
+        self.line = line
+
+
+@dataclass
+class GherkinStep:
+    keyword: str
+    text: str
+    line: int
+    doc_string: Optional[str] = None
+    data_table: list[list[str]] = field(default_factory=list)
+
+    def to_text(self) -> str:
+        """Render the step with its doc string and data table, as written in the feature file"""
+        text = f"{self.keyword} {self.text}" if self.keyword != "*" else f"* {self.text}"
+        if self.data_table:
+            widths = [max(len(row[i]) for row in self.data_table) for i in range(len(self.data_table[0]))]
+            for row in self.data_table:
+                text += "\n  | " + " | ".join(cell.ljust(widths[i]) for i, cell in enumerate(row)) + " |"
+        if self.doc_string is not None:
+            text += '\n  """\n' + "\n".join(f"  {line}" for line in self.doc_string.splitlines()) + '\n  """'
+        return text
+
+    def with_parameters(self, parameters: dict[str, str]) -> "GherkinStep":
+        """Substitute <name> placeholders of a Scenario Outline"""
+
+        def substitute(value: str) -> str:
+            return re.sub(r"<([^<>]+)>", lambda m: parameters.get(m.group(1), m.group(0)), value)
+
+        return GherkinStep(
+            keyword=self.keyword,
+            text=substitute(self.text),
+            line=self.line,
+            doc_string=substitute(self.doc_string) if self.doc_string is not None else None,
+            data_table=[[substitute(cell) for cell in row] for row in self.data_table],
+        )
+
+
+@dataclass
+class GherkinExamples:
+    name: str
+    line: int
+    tags: list[str] = field(default_factory=list)
+    description: str = ""
+    header: list[str] = field(default_factory=list)
+    rows: list[tuple[int, list[str]]] = field(default_factory=list)
+
+
+@dataclass
+class GherkinScenario:
+    keyword: str
+    name: str
+    line: int
+    tags: list[str] = field(default_factory=list)
+    description: str = ""
+    steps: list[GherkinStep] = field(default_factory=list)
+    # Feature and Rule backgrounds that run before this scenario
+    background: list[GherkinStep] = field(default_factory=list)
+    examples: list[GherkinExamples] = field(default_factory=list)
+    rule: str = ""
+
+    @property
+    def is_outline(self) -> bool:
+        return self.keyword in OUTLINE_KEYWORDS
+
+
+@dataclass
+class GherkinFeature:
+    name: str
+    path: str
+    line: int
+    tags: list[str] = field(default_factory=list)
+    description: str = ""
+    background: list[GherkinStep] = field(default_factory=list)
+    scenarios: list[GherkinScenario] = field(default_factory=list)
+
+
+@dataclass
+class ScenarioCase:
+    """A concrete scenario to run: a plain Scenario or one Examples row of a Scenario Outline"""
+
+    feature: GherkinFeature
+    scenario: GherkinScenario
+    name: str
+    line: int
+    tags: list[str]
+    steps: list[GherkinStep]
+    background: list[GherkinStep]
+    example_index: Optional[int] = None
+    # directory the feature files were loaded from, feature files of different subdirectories get different ids
+    root: Optional[str] = None
+
+    @property
+    def case_id(self) -> str:
+        path = Path(self.feature.path)
+        name = path.stem
+        if self.root is not None:
+            path = Path(os.path.relpath(path, self.root))
+            name = ".".join(path.parent.parts + (path.stem,))
+        case_id = f"{name}-L{self.line}"
+        if self.example_index is not None:
+            case_id += f"-ex{self.example_index}"
+        return case_id
+
+
+def _split_table_row(line: str) -> list[str]:
+    cells = re.split(r"(?<!\\)\|", line.strip())[1:-1]
+    return [cell.strip().replace("\\|", "|").replace("\\n", "\n").replace("\\\\", "\\") for cell in cells]
+
+
+def _match_keyword(line: str, keywords: tuple[str, ...]) -> Optional[tuple[str, str]]:
+    for keyword in keywords:
+        if line.startswith(keyword + ":"):
+            return keyword, line[len(keyword) + 1:].strip()
+    return None
+
+
+def parse_feature(text: str, path: str = "<string>") -> GherkinFeature:
+    """Parse the content of a .feature file (Feature, Rule, Background, Scenario, Scenario Outline, Examples)"""
+    feature: Optional[GherkinFeature] = None
+    pending_tags: list[str] = []
+    rule_name = ""
+    rule_background: list[GherkinStep] = []
+    # the element that receives steps, description lines or table rows
+    steps_target: Optional[list[GherkinStep]] = None
+    description_target = None
+    current_scenario: Optional[GherkinScenario] = None
+    current_examples: Optional[GherkinExamples] = None
+
+    lines = text.splitlines()
+    i = 0
+    while i < len(lines):
+        raw_line = lines[i]
+        line_no = i + 1
+        line = raw_line.strip()
+        i += 1
+
+        if not line or line.startswith("#"):
+            continue
+
+        if line.startswith("@"):
+            pending_tags.extend(tag for tag in line.split("#")[0].split() if tag.startswith("@"))
+            continue
+
+        match = _match_keyword(line, ("Feature",))
+        if match:
+            if feature is not None:
+                raise GherkinParseError(path, line_no, "only one Feature is allowed per file")
+            feature = GherkinFeature(name=match[1], path=path, line=line_no, tags=pending_tags)
+            pending_tags = []
+            description_target = feature
+            steps_target = None
+            continue
+
+        if feature is None:
+            raise GherkinParseError(path, line_no, f"expected 'Feature:' but got '{line}'")
+
+        match = _match_keyword(line, ("Rule",))
+        if match:
+            rule_name = match[1]
+            rule_background = []
+            pending_tags = []
+            # rule descriptions are accepted but not kept
+            description_target = SimpleNamespace(description="")
+            steps_target = None
+            current_scenario = None
+            current_examples = None
+            continue
+
+        match = _match_keyword(line, ("Background",))
+        if match:
+            steps_target = rule_background if rule_name else feature.background
+            description_target = None
+            current_scenario = None
+            current_examples = None
+            continue
+
+        match = _match_keyword(line, OUTLINE_KEYWORDS) or _match_keyword(line, SCENARIO_KEYWORDS)
+        if match:
+            current_scenario = GherkinScenario(
+                keyword=match[0],
+                name=match[1],
+                line=line_no,
+                tags=feature.tags + pending_tags,
+                background=feature.background + rule_background,
+                rule=rule_name,
+            )
+            feature.scenarios.append(current_scenario)
+            pending_tags = []
+            steps_target = current_scenario.steps
+            description_target = current_scenario
+            current_examples = None
+            continue
+
+        match = _match_keyword(line, EXAMPLES_KEYWORDS)
+        if match:
+            if current_scenario is None or not current_scenario.is_outline:
+                raise GherkinParseError(path, line_no, "Examples must belong to a Scenario Outline")
+            current_examples = GherkinExamples(name=match[1], line=line_no, tags=pending_tags)
+            current_scenario.examples.append(current_examples)
+            pending_tags = []
+            steps_target = None
+            description_target = current_examples
+            continue
+
+        step_keyword = next(
+            (keyword for keyword in STEP_KEYWORDS if line == keyword or line.startswith(keyword + " ")), None
+        )
+        if step_keyword:
+            if steps_target is None:
+                raise GherkinParseError(path, line_no, f"step outside of a Scenario or Background: '{line}'")
+            steps_target.append(
+                GherkinStep(keyword=step_keyword, text=line[len(step_keyword):].strip(), line=line_no)
+            )
+            description_target = None
+            continue
+
+        if line.startswith("|"):
+            row = _split_table_row(line)
+            if current_examples is not None and steps_target is None:
+                if not current_examples.header:
+                    current_examples.header = row
+                else:
+                    if len(row) != len(current_examples.header):
+                        raise GherkinParseError(path, line_no, "Examples row does not match the header")
+                    current_examples.rows.append((line_no, row))
+            elif steps_target:
+                steps_target[-1].data_table.append(row)
+            else:
+                raise GherkinParseError(path, line_no, "table without a step or Examples")
+            continue
+
+        delimiter = next((d for d in DOC_STRING_DELIMITERS if line.startswith(d)), None)
+        if delimiter:
+            if not steps_target:
+                raise GherkinParseError(path, line_no, "doc string without a step")
+            indent = len(raw_line) - len(raw_line.lstrip())
+            doc_lines = []
+            while i < len(lines) and lines[i].strip() != delimiter:
+                doc_line = lines[i]
+                doc_lines.append(doc_line[indent:] if doc_line[:indent].strip() == "" else doc_line.lstrip())
+                i += 1
+            if i >= len(lines):
+                raise GherkinParseError(path, line_no, "unterminated doc string")
+            i += 1
+            steps_target[-1].doc_string = "\n".join(doc_lines)
+            continue
+
+        if description_target is not None:
+            description_target.description = (description_target.description + "\n" + line).strip()
+            continue
+
+        raise GherkinParseError(path, line_no, f"unexpected line '{line}'")
+
+    if feature is None:
+        raise GherkinParseError(path, 1, "no Feature found")
+
+    return feature
+
+
+def parse_feature_file(path: str) -> GherkinFeature:
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_feature(f.read(), path=path)
+
+
+def find_feature_files(path: str) -> list[str]:
+    """Return the given .feature file, or all .feature files below a directory"""
+    if os.path.isdir(path):
+        return sorted(str(p) for p in Path(path).rglob("*.feature"))
+    return [path]
+
+
+def expand_scenarios(feature: GherkinFeature, root: Optional[str] = None) -> list[ScenarioCase]:
+    """
+    Turn the scenarios of a feature into concrete cases, one per Examples row for outlines.
+    Case ids hold the path of the feature relative to root, only its name without a root.
+    """
+    cases = []
+    for scenario in feature.scenarios:
+        if not scenario.is_outline:
+            cases.append(
+                ScenarioCase(
+                    feature=feature,
+                    scenario=scenario,
+                    name=scenario.name,
+                    line=scenario.line,
+                    tags=scenario.tags,
+                    steps=scenario.steps,
+                    background=scenario.background,
+                    root=root,
+                )
+            )
+            continue
+
+        example_index = 0
+        for examples in scenario.examples:
+            for row_line, row in examples.rows:
+                example_index += 1
+                parameters = dict(zip(examples.header, row))
+                name = re.sub(r"<([^<>]+)>", lambda m: parameters.get(m.group(1), m.group(0)), scenario.name)
+                cases.append(
+                    ScenarioCase(
+                        feature=feature,
+                        scenario=scenario,
+                        name=f"{name} ({', '.join(f'{k}={v}' for k, v in parameters.items())})",
+                        line=row_line,
+                        tags=scenario.tags + examples.tags,
+                        steps=[step.with_parameters(parameters) for step in scenario.steps],
+                        background=scenario.background,
+                        example_index=example_index,
+                        root=root,
+                    )
+                )
+    return cases
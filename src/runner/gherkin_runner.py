@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import re
+from typing import Any, Optional
+from xml.etree import ElementTree
+
+from .batch_runner import BatchRunner, BatchTask, BatchTaskResult
+from .gherkin_parser import ScenarioCase, expand_scenarios, find_feature_files, parse_feature_file
+
+logger = logging.getLogger(__name__)
+
+SCENARIO_INSTRUCTIONS = (
+    "Execute the following Gherkin scenario in the browser, step by step and in order. "
+    "Treat every Then step as an assertion and verify it against the actual page. "
+    "When all steps are done, or a step cannot be completed or an assertion does not hold, use the done action. "
+    "Start the done text with 'PASSED' if every step succeeded, otherwise with 'FAILED: ' followed by the failing step and the reason."
+)
+
+# @fixture:<name> scenarios share the browser storage state their Background leaves behind
+FIXTURE_TAG_PREFIX = "@fixture:"
+
+
+def load_scenarios(
+        path: str,
+        include_tags: Optional[list[str]] = None,
+        exclude_tags: Optional[list[str]] = None,
+) -> list[ScenarioCase]:
+    """Parse a .feature file or every .feature file below a directory, filtered by tags"""
+    cases = []
+    root = path if os.path.isdir(path) else os.path.dirname(path) or "."
+    for feature_path in find_feature_files(path):
+        cases.extend(expand_scenarios(parse_feature_file(feature_path), root=root))
+    if include_tags:
+        cases = [case for case in cases if set(case.tags) & set(include_tags)]
+    if exclude_tags:
+        cases = [case for case in cases if not set(case.tags) & set(exclude_tags)]
+    return cases
+
+
+def scenario_fixture(case: ScenarioCase) -> Optional[str]:
+    for tag in case.tags:
+        if tag.startswith(FIXTURE_TAG_PREFIX) and len(tag) > len(FIXTURE_TAG_PREFIX):
+            return tag[len(FIXTURE_TAG_PREFIX):]
+    return None
+
+
+def scenario_to_task(case: ScenarioCase) -> BatchTask:
+    """
+    Build the agent task for a scenario, the Background goes into add_infos.
+    For a @fixture:<name> scenario the Background are the setup steps of the fixture.
+    """
+    steps_text = "\n".join(step.to_text() for step in case.steps)
+    task = f"{SCENARIO_INSTRUCTIONS}\n\nScenario: {case.name}\n{steps_text}"
+
+    add_infos = f"Feature: {case.feature.name}"
+    if case.feature.description:
+        add_infos += f"\n{case.feature.description}"
+    fixture = scenario_fixture(case)
+    background_text = "\n".join(step.to_text() for step in case.background)
+    if fixture and background_text:
+        return BatchTask(task_id=case.case_id, task=task, add_infos=add_infos, fixture=fixture, setup=background_text)
+    if background_text:
+        add_infos += (
+            "\nBackground (these steps set up the scenario and must be done first):\n"
+            f"{background_text}"
+        )
+    return BatchTask(task_id=case.case_id, task=task, add_infos=add_infos, fixture=fixture)
+
+
+def _verdict(final_result: Optional[str]) -> str:
+    """PASSED or FAILED as the done text starts with, empty for any other text"""
+    match = re.match(r"(PASSED|FAILED)\b", (final_result or "").strip(), flags=re.IGNORECASE)
+    return match.group(1).upper() if match else ""
+
+
+def scenario_passed(result: BatchTaskResult) -> bool:
+    """A scenario passes only when the agent finished on its own with an explicit PASSED verdict"""
+    return result.success and not result.stopped and _verdict(result.final_result) == "PASSED"
+
+
+def _failure_message(result: BatchTaskResult) -> str:
+    if result.stopped:
+        return "Scenario was stopped"
+    if result.success and _verdict(result.final_result) != "FAILED":
+        return f"The agent gave no PASSED or FAILED verdict: {result.final_result or '(empty)'}"
+    if result.final_result:
+        return result.final_result
+    if result.errors:
+        return result.errors[-1]
+    return "Scenario did not complete"
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def build_junit_xml(cases: list[ScenarioCase], results: dict[str, BatchTaskResult]) -> str:
+    """One testsuite per feature and one testcase per scenario"""
+    testsuites = ElementTree.Element("testsuites")
+    features: dict[str, list[ScenarioCase]] = {}
+    for case in cases:
+        features.setdefault(case.feature.path, []).append(case)
+
+    for feature_cases in features.values():
+        feature = feature_cases[0].feature
+        suite_results = [results.get(case.case_id) for case in feature_cases]
+        testsuite = ElementTree.SubElement(
+            testsuites,
+            "testsuite",
+            name=feature.name,
+            tests=str(len(feature_cases)),
+            failures=str(sum(1 for r in suite_results if r and not scenario_passed(r))),
+            skipped=str(sum(1 for r in suite_results if r is None)),
+            time=f"{sum(r.duration for r in suite_results if r):.3f}",
+        )
+        for case, result in zip(feature_cases, suite_results):
+            testcase = ElementTree.SubElement(
+                testsuite,
+                "testcase",
+                classname=feature.name,
+                name=case.name,
+                file=feature.path,
+                line=str(case.line),
+                time=f"{result.duration:.3f}" if result else "0",
+            )
+            if result is None:
+                ElementTree.SubElement(testcase, "skipped")
+            elif not scenario_passed(result):
+                failure = ElementTree.SubElement(testcase, "failure", message=_failure_message(result)[:500])
+                failure.text = "\n".join(filter(None, [result.final_result] + result.errors))
+            if result is not None and result.history_file:
+                ElementTree.SubElement(testcase, "system-out").text = f"Agent history: {result.history_file}"
+
+    ElementTree.indent(testsuites)
+    return ElementTree.tostring(testsuites, encoding="unicode", xml_declaration=True)
+
+
+def build_cucumber_json(cases: list[ScenarioCase], results: dict[str, BatchTaskResult]) -> list[dict[str, Any]]:
+    """
+    Cucumber JSON report. The agent runs a scenario as a whole, so every step gets the scenario status
+    and the failure message and duration are reported on the last step.
+    """
+    features: dict[str, dict[str, Any]] = {}
+    for case in cases:
+        feature = case.feature
+        if feature.path not in features:
+            features[feature.path] = {
+                "uri": feature.path,
+                "id": _slug(feature.name),
+                "keyword": "Feature",
+                "name": feature.name,
+                "description": feature.description,
+                "line": feature.line,
+                "tags": [{"name": tag, "line": feature.line} for tag in feature.tags],
+                "elements": [],
+            }
+
+        result = results.get(case.case_id)
+        if result is None:
+            status = "skipped"
+        else:
+            status = "passed" if scenario_passed(result) else "failed"
+
+        def step_json(step, is_last: bool) -> dict[str, Any]:
+            step_result: dict[str, Any] = {"status": status, "duration": 0}
+            if is_last and result is not None:
+                step_result["duration"] = int(result.duration * 1e9)
+                if status == "failed":
+                    step_result["error_message"] = _failure_message(result)
+            data = {
+                "keyword": f"{step.keyword} ",
+                "name": step.text,
+                "line": step.line,
+                "result": step_result,
+            }
+            if step.doc_string is not None:
+                data["doc_string"] = {"value": step.doc_string, "line": step.line + 1}
+            if step.data_table:
+                data["rows"] = [{"cells": row} for row in step.data_table]
+            return data
+
+        all_steps = case.background + case.steps
+        features[feature.path]["elements"].append({
+            "id": f"{_slug(feature.name)};{_slug(case.name)}",
+            "keyword": "Scenario Outline" if case.scenario.is_outline else "Scenario",
+            "type": "scenario",
+            "name": case.name,
+            "description": case.scenario.description,
+            "line": case.line,
+            "tags": [{"name": tag, "line": case.scenario.line} for tag in case.tags],
+            "steps": [step_json(step, i == len(all_steps) - 1) for i, step in enumerate(all_steps)],
+        })
+    return list(features.values())
+
+
+class GherkinRunner:
+    """Runs Gherkin scenarios concurrently through a BatchRunner and writes JUnit and Cucumber JSON reports"""
+
+    def __init__(self, batch_runner: BatchRunner):
+        self.batch_runner = batch_runner
+
+    async def run(
+            self,
+            cases: list[ScenarioCase],
+            junit_path: Optional[str] = None,
+            cucumber_json_path: Optional[str] = None,
+    ) -> dict[str, BatchTaskResult]:
+        output_dir = self.batch_runner.output_dir
+        junit_path = junit_path or os.path.join(output_dir, "junit.xml")
+        cucumber_json_path = cucumber_json_path or os.path.join(output_dir, "cucumber.json")
+
+        tasks = [scenario_to_task(case) for case in cases]
+        results: dict[str, BatchTaskResult] = {}
+        await self.batch_runner.run(tasks, on_result=lambda result: results.__setitem__(result.task_id, result))
+
+        os.makedirs(os.path.dirname(junit_path) or ".", exist_ok=True)
+        with open(junit_path, "w", encoding="utf-8") as f:
+            f.write(build_junit_xml(cases, results))
+        os.makedirs(os.path.dirname(cucumber_json_path) or ".", exist_ok=True)
+        with open(cucumber_json_path, "w", encoding="utf-8") as f:
+            json.dump(build_cucumber_json(cases, results), f, indent=2, ensure_ascii=False)
+
+        passed = sum(1 for result in results.values() if scenario_passed(result))
+        logger.info(f"🥒 {passed}/{len(cases)} scenarios passed. Reports: {junit_path}, {cucumber_json_path}")
+        return results
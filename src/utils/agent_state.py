@@ -1,17 +1,16 @@
 import asyncio
 
+
+class AgentStoppedError(Exception):
+    """Raised inside an agent step when a stop request cancelled it"""
+
+
 class AgentState:
-    _instance = None
+    """Stop flag and last valid browser state of a single agent run"""
 
     def __init__(self):
-        if not hasattr(self, '_stop_requested'):
-            self._stop_requested = asyncio.Event()
-            self.last_valid_state = None  # store the last valid browser state
-
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(AgentState, cls).__new__(cls)
-        return cls._instance
+        self._stop_requested = asyncio.Event()
+        self.last_valid_state = None  # store the last valid browser state
 
     def request_stop(self):
         self._stop_requested.set()
@@ -23,8 +22,11 @@ class AgentState:
     def is_stop_requested(self):
         return self._stop_requested.is_set()
 
+    async def wait_for_stop(self):
+        await self._stop_requested.wait()
+
     def set_last_valid_state(self, state):
         self.last_valid_state = state
 
     def get_last_valid_state(self):
-        return self.last_valid_state
\ No newline at end of file
+        return self.last_valid_state
@@ -0,0 +1,219 @@
+import json
+import threading
+from typing import Any, Optional
+
+from json_repair import repair_json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+TIERS = ("strict", "extracted", "repaired")
+
+
+class JSONParseStats:
+    """How often each parsing tier produced the object, to see how much model output needs repairing"""
+
+    def __init__(self):
+        self.counts = {tier: 0 for tier in TIERS}
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def record(self, tier: Optional[str]) -> None:
+        with self._lock:
+            if tier is None:
+                self.failures += 1
+            else:
+                self.counts[tier] += 1
+
+    def stats_dict(self) -> dict:
+        total = sum(self.counts.values()) + self.failures
+        return {
+            **self.counts,
+            "failures": self.failures,
+            "repair_rate": round(self.counts["repaired"] / total, 4) if total else 0.0,
+        }
+
+
+json_parse_stats = JSONParseStats()
+
+
+def _loads(text: str) -> Any:
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _strict_object(text: str) -> Optional[dict]:
+    try:
+        value = _loads(text)
+    except ValueError:
+        # orjson.JSONDecodeError and json.JSONDecodeError are both ValueErrors
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def extract_json_text(text: str) -> str:
+    """
+    The part of a model response that should hold the json object: reasoning up to </think> is dropped,
+    then the span from the first '{' to the last '}' is taken, which also strips code fences and prose.
+    """
+    if "</think>" in text:
+        # some providers drop the opening tag, so everything up to the last closing tag is reasoning
+        text = text.rsplit("</think>", 1)[1]
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1:
+        return text.strip()
+    if end > start:
+        return text[start:end + 1]
+    # truncated response, repair_json closes what is open
+    return text[start:]
+
+
+def parse_json_object(text: str, stats: Optional[JSONParseStats] = None) -> tuple[dict, str]:
+    """
+    Parse the json object of a model response with the cheapest tier that works and return it with the tier:
+    strict decoding of the whole text, strict decoding of the extracted object, and repair_json last.
+    """
+    if stats is None:
+        stats = json_parse_stats
+
+    value = _strict_object(text.strip())
+    if value is not None:
+        stats.record("strict")
+        return value, "strict"
+
+    candidate = extract_json_text(text)
+    value = _strict_object(candidate)
+    if value is not None:
+        stats.record("extracted")
+        return value, "extracted"
+
+    value = repair_json(candidate, return_objects=True)
+    if isinstance(value, dict) and value:
+        stats.record("repaired")
+        return value, "repaired"
+
+    stats.record(None)
+    raise ValueError(f"Could not parse a json object from the response: {text[:200]}")
+
+
+class StreamingJSONObjectParser:
+    """
+    Scans a json object while it is streamed. feed() returns ("field", key, value) for every top-level field
+    whose value completed and ("item", key, value) for every object of the stream_key array as soon as it
+    closes (value is None if the item is not valid json), so they can be used before the response ends.
+    Text before the object, like prose, a code fence or <think> reasoning, is skipped.
+    """
+
+    def __init__(self, stream_key: str = "action"):
+        self.stream_key = stream_key
+        self.text = ""
+        self._reset()
+
+    def _reset(self) -> None:
+        self.done = False
+        self._pos = 0
+        self._started = False
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._string_start = 0
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> list[tuple[str, str, Any]]:
+        previous_length = len(self.text)
+        self.text += chunk
+        events = []
+        text = self.text
+        if self._started and "</think>" in text[max(0, previous_length - len("</think>")):]:
+            # reasoning without an opening tag, the object starts after it
+            self._reset()
+        if self.done:
+            return events
+        if not self._started:
+            if "<think>" in text and "</think>" not in text:
+                return events
+            think_end = text.rfind("</think>")
+            start = text.find("{", think_end + len("</think>") if think_end != -1 else 0)
+            if start == -1:
+                return events
+            self._started = True
+            self._pos = start
+
+        i = self._pos
+        while i < len(text):
+            char = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._expect_key and len(self._stack) == 1:
+                        self._key = json.loads(text[self._string_start:i + 1])
+                        self._expect_key = False
+                i += 1
+                continue
+
+            depth = len(self._stack)
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+                if depth == 1 and not self._expect_key and self._value_start is None:
+                    self._value_start = i
+            elif char in "{[":
+                if depth == 0:
+                    self._expect_key = True
+                elif depth == 1 and self._value_start is None:
+                    self._value_start = i
+                elif depth == 2 and char == "{" and self._key == self.stream_key and self._stack[1] == "[":
+                    self._item_start = i
+                self._stack.append(char)
+            elif char in "}]":
+                self._stack.pop()
+                depth = len(self._stack)
+                if depth == 2 and self._item_start is not None:
+                    item = _loads_or_invalid(text[self._item_start:i + 1])
+                    events.append(("item", self.stream_key, None if item is _INVALID else item))
+                    self._item_start = None
+                elif depth == 1:
+                    self._end_field(events, text[self._value_start:i + 1])
+                elif depth == 0:
+                    if self._value_start is not None:
+                        self._end_field(events, text[self._value_start:i])
+                    self.done = True
+                    i += 1
+                    break
+            elif char == "," and depth == 1:
+                if self._value_start is not None:
+                    self._end_field(events, text[self._value_start:i])
+                self._expect_key = True
+            elif depth == 1 and char != ":" and not char.isspace() and not self._expect_key and self._value_start is None:
+                # numbers, true, false and null
+                self._value_start = i
+            i += 1
+        self._pos = i
+        return events
+
+    def _end_field(self, events: list, raw: str) -> None:
+        if self._key != self.stream_key:
+            value = _loads_or_invalid(raw.strip())
+            if value is not _INVALID:
+                events.append(("field", self._key, value))
+        self._value_start = None
+
+
+_INVALID = object()
+
+
+def _loads_or_invalid(text: str) -> Any:
+    try:
+        return _loads(text)
+    except ValueError:
+        return _INVALID
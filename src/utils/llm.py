@@ -1,4 +1,4 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import pdb
 from langchain_openai import ChatOpenAI
 from langchain_core.globals import get_llm_cache
@@ -48,6 +48,10 @@ class DeepSeekR1ChatOpenAI(ChatOpenAI):
             base_url=kwargs.get("base_url"),
             api_key=kwargs.get("api_key")
         ) 
+        self.async_client = AsyncOpenAI(
+            base_url=kwargs.get("base_url"),
+            api_key=kwargs.get("api_key")
+        )
         
     async def ainvoke(
         self,
@@ -66,9 +70,9 @@ class DeepSeekR1ChatOpenAI(ChatOpenAI):
             else:
                 message_history.append({"role": "user", "content": input_.content})
         
-        response = self.client.chat.completions.create(
+        response = await self.async_client.chat.completions.create(
             model=self.model_name,
-            messages=messages
+            messages=message_history
         )
 
         reasoning_content = response.choices[0].message.reasoning_content
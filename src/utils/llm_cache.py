@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+
+logger = logging.getLogger(__name__)
+
+# the prompts state the current time to the minute, a rerun would never match an earlier entry with it
+_CURRENT_TIME = re.compile(r"(Current date and time: )\d{4}-\d{2}-\d{2} \d{2}:\d{2}")
+
+
+def _normalize_text(text: str) -> str:
+    return _CURRENT_TIME.sub(r"\1<now>", text)
+
+
+def _normalize_content(content: Any) -> Any:
+    """Replace inline images by their hash and the current time by a placeholder, the key stays stable and small"""
+    if isinstance(content, str):
+        return _normalize_text(content)
+    if not isinstance(content, list):
+        return content
+    normalized = []
+    for part in content:
+        if isinstance(part, dict) and part.get("type") == "image_url":
+            image_url = part["image_url"]
+            url = image_url.get("url", "") if isinstance(image_url, dict) else str(image_url)
+            normalized.append({"type": "image_url", "sha256": hashlib.sha256(url.encode()).hexdigest()})
+        elif isinstance(part, dict) and part.get("type") == "text":
+            normalized.append({**part, "text": _normalize_text(part.get("text", ""))})
+        elif isinstance(part, str):
+            normalized.append(_normalize_text(part))
+        else:
+            normalized.append(part)
+    return normalized
+
+
+def llm_cache_namespace(llm: BaseChatModel) -> str:
+    """Identify the model and its parameters, responses of different models never share an entry"""
+    try:
+        return llm._get_llm_string()
+    except Exception:
+        return f"{type(llm).__name__}:{getattr(llm, 'model_name', getattr(llm, 'model', ''))}"
+
+
+def make_cache_key(messages: list[BaseMessage], namespace: str) -> str:
+    payload = json.dumps(
+        [namespace] + [[message.type, _normalize_content(message.content)] for message in messages],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _dump_message(message: BaseMessage) -> str:
+    return json.dumps({
+        "content": message.content,
+        "reasoning_content": getattr(message, "reasoning_content", None),
+    }, ensure_ascii=False)
+
+
+def _load_message(data: str) -> AIMessage:
+    fields = json.loads(data)
+    if fields.get("reasoning_content") is not None:
+        return AIMessage(content=fields["content"], reasoning_content=fields["reasoning_content"])
+    return AIMessage(content=fields["content"])
+
+
+class MemoryCacheBackend:
+    """In-memory LRU with TTL"""
+
+    def __init__(self, max_entries: int = 1000, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created_at, value = entry
+        if self.ttl is not None and time.time() - created_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, created_at: Optional[float] = None) -> None:
+        self._entries[key] = (created_at or time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class SQLiteCacheBackend:
+    """Persistent store in a single SQLite file with TTL and size based eviction (least recently used first)"""
+
+    def __init__(self, path: str = "./tmp/llm_cache.sqlite", max_entries: int = 10000, ttl: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+        self._conn.commit()
+        self._evict()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[tuple[float, str]]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl is not None and time.time() - created_at > self.ttl:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return created_at, value
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._conn.commit()
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            if self.ttl is not None:
+                self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+@dataclass
+class LLMCacheStats:
+    hits: int = 0
+    memory_hits: int = 0
+    misses: int = 0
+    writes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class LLMResponseCache:
+    """
+    Cache of llm responses keyed on the exact message list sent to the model, screenshots are hashed.
+    An in-memory LRU sits in front of an optional persistent backend (e.g. SQLiteCacheBackend).
+    """
+
+    def __init__(
+            self,
+            disk_backend: Optional[SQLiteCacheBackend] = None,
+            max_memory_entries: int = 1000,
+            ttl: Optional[float] = None,
+    ):
+        self.memory = MemoryCacheBackend(max_entries=max_memory_entries, ttl=ttl)
+        self.disk = disk_backend
+        self.stats = LLMCacheStats()
+
+    @classmethod
+    def from_path(cls, path: Optional[str], ttl: Optional[float] = None, max_entries: int = 10000) -> "LLMResponseCache":
+        """Memory only cache when path is empty, otherwise memory in front of a SQLite file"""
+        disk_backend = SQLiteCacheBackend(path, max_entries=max_entries, ttl=ttl) if path else None
+        return cls(disk_backend=disk_backend, ttl=ttl)
+
+    def _lookup_memory(self, key: str) -> Optional[AIMessage]:
+        value = self.memory.get(key)
+        if value is None:
+            return None
+        self.stats.hits += 1
+        self.stats.memory_hits += 1
+        return _load_message(value)
+
+    def _store_disk_entry(self, key: str, entry: Optional[tuple[float, str]]) -> Optional[AIMessage]:
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        created_at, value = entry
+        self.memory.set(key, value, created_at=created_at)
+        self.stats.hits += 1
+        return _load_message(value)
+
+    def lookup(self, key: str) -> Optional[AIMessage]:
+        message = self._lookup_memory(key)
+        if message is not None:
+            return message
+        return self._store_disk_entry(key, self.disk.get(key) if self.disk is not None else None)
+
+    def update(self, key: str, message: BaseMessage) -> None:
+        value = _dump_message(message)
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+        self.stats.writes += 1
+
+    async def alookup(self, key: str) -> Optional[AIMessage]:
+        """Like lookup, but the SQLite query runs in a thread. The memory tier is only touched from the event loop"""
+        message = self._lookup_memory(key)
+        if message is not None:
+            return message
+        entry = await asyncio.to_thread(self.disk.get, key) if self.disk is not None else None
+        return self._store_disk_entry(key, entry)
+
+    async def aupdate(self, key: str, message: BaseMessage) -> None:
+        value = _dump_message(message)
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value)
+        self.stats.writes += 1
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats_dict(self) -> dict[str, Any]:
+        data = asdict(self.stats)
+        data["hit_rate"] = round(self.stats.hit_rate, 3)
+        return data
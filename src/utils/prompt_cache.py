@@ -0,0 +1,72 @@
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from langchain_core.messages import BaseMessage
+
+logger = logging.getLogger(__name__)
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def usage_cache_tokens(message: BaseMessage) -> Optional[tuple[int, int, int]]:
+    """
+    (input tokens, input tokens read from the provider's prompt cache, input tokens written to it) of a response,
+    None if the provider did not report usage. langchain normalizes OpenAI and Anthropic usage into
+    usage_metadata, DeepSeek only reports prompt_cache_hit_tokens in the raw token usage.
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        details = usage.get("input_token_details") or {}
+        cache_read = details.get("cache_read") or 0
+        if not cache_read:
+            token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+            cache_read = token_usage.get("prompt_cache_hit_tokens") or 0
+        return usage.get("input_tokens", 0), cache_read, details.get("cache_creation") or 0
+    return None
+
+
+@dataclass
+class PromptCacheStats:
+    requests: int = 0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    cache_write_tokens: int = 0
+
+    def record(self, message: BaseMessage) -> None:
+        tokens = usage_cache_tokens(message)
+        if tokens is None:
+            return
+        input_tokens, cached_tokens, cache_write_tokens = tokens
+        self.requests += 1
+        self.input_tokens += input_tokens
+        self.cached_tokens += cached_tokens
+        self.cache_write_tokens += cache_write_tokens
+
+    def stats_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "input_tokens": self.input_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "hit_rate": round(self.cached_tokens / self.input_tokens, 4) if self.input_tokens else 0.0,
+        }
+
+
+def with_cache_breakpoint(message: BaseMessage) -> BaseMessage:
+    """A copy of message whose last text block carries an Anthropic cache_control breakpoint"""
+    if isinstance(message.content, str):
+        if not message.content:
+            # anthropic rejects empty text blocks
+            return message
+        content = [{"type": "text", "text": message.content, "cache_control": CACHE_CONTROL}]
+    else:
+        content = [dict(block) if isinstance(block, dict) else {"type": "text", "text": block}
+                   for block in message.content]
+        for block in reversed(content):
+            if block.get("type") == "text":
+                block["cache_control"] = CACHE_CONTROL
+                break
+        else:
+            return message
+    return message.model_copy(update={"content": content})
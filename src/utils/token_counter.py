@@ -0,0 +1,119 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterator, Optional
+
+from langchain_core.language_models import BaseLanguageModel
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCountCache:
+    """Bounded LRU of token counts keyed on (tokenizer, content hash), shared by all agents of the process"""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._counts: OrderedDict[tuple[str, bytes], int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def get(self, key: tuple[str, bytes]) -> Optional[int]:
+        with self._lock:
+            count = self._counts.get(key)
+            if count is None:
+                self.misses += 1
+                return None
+            self._counts.move_to_end(key)
+            self.hits += 1
+            return count
+
+    def set(self, key: tuple[str, bytes], count: int) -> None:
+        with self._lock:
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+token_count_cache = TokenCountCache()
+# tiktoken encoding for models it does not know, close to the tokenizers of other recent models
+DEFAULT_ENCODING = "o200k_base"
+# a tokenizer that failed, e.g. tiktoken without network access to download its encoding, is retried after this
+TOKENIZER_RETRY_SECONDS = 60.0
+# tokenizer name -> time.monotonic() until which it is not tried again
+_failed_tokenizers: dict[str, float] = {}
+
+
+def _model_name(llm: BaseLanguageModel) -> str:
+    return getattr(llm, 'model_name', None) or getattr(llm, 'model', '') or ''
+
+
+def _tiktoken_tokenizer(llm: BaseLanguageModel) -> Optional[tuple[str, Callable[[str], int]]]:
+    """(name, count) of the local tiktoken encoding for the llm's model, None if tiktoken is not installed"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(_model_name(llm))
+    except KeyError:
+        encoding_name = DEFAULT_ENCODING
+
+    def count(text: str) -> int:
+        # tiktoken downloads the encoding on first use and keeps it loaded
+        return len(tiktoken.get_encoding(encoding_name).encode(text, disallowed_special=()))
+
+    return f"tiktoken:{encoding_name}", count
+
+
+def _tokenizers(llm: BaseLanguageModel) -> Iterator[tuple[str, Callable[[str], int]]]:
+    """Tokenizers to try in order, the local tiktoken encoding before the llm's own get_num_tokens"""
+    local = _tiktoken_tokenizer(llm)
+    if local is not None:
+        yield local
+    yield f"{type(llm).__name__}:{_model_name(llm)}", llm.get_num_tokens
+
+
+def count_text_tokens(
+        llm: BaseLanguageModel,
+        text: str,
+        estimated_characters_per_token: int = 3,
+        cache: Optional[TokenCountCache] = None,
+) -> int:
+    """
+    Count the tokens of text with a local tiktoken encoding, or the llm's tokenizer without tiktoken,
+    memoized on the content hash. A tokenizer that fails is skipped for TOKENIZER_RETRY_SECONDS,
+    the character estimate is used if none works.
+    """
+    if cache is None:
+        cache = token_count_cache
+    digest = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    for tokenizer_name, count in _tokenizers(llm):
+        if _failed_tokenizers.get(tokenizer_name, 0.0) > time.monotonic():
+            continue
+        key = (tokenizer_name, digest)
+        tokens = cache.get(key)
+        if tokens is not None:
+            return tokens
+        try:
+            tokens = count(text)
+        except Exception as e:
+            logger.debug(f"Tokenizer {tokenizer_name} failed, not trying it for {TOKENIZER_RETRY_SECONDS:.0f}s: {e}")
+            _failed_tokenizers[tokenizer_name] = time.monotonic() + TOKENIZER_RETRY_SECONDS
+            continue
+        _failed_tokenizers.pop(tokenizer_name, None)
+        cache.set(key, tokens)
+        return tokens
+    return len(text) // estimated_characters_per_token
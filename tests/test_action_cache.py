@@ -0,0 +1,73 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(".")
+
+from browser_use.dom.views import DOMElementNode
+
+from src.agent.action_cache import ActionCache, dom_fingerprint, make_cache_key, url_pattern
+
+
+def _element(tag, xpath, **attributes):
+    return DOMElementNode(
+        tag_name=tag, xpath=xpath, attributes=attributes, children=[], is_visible=True, parent=None
+    )
+
+
+def test_url_pattern():
+    assert url_pattern("https://Shop.com/item/123?ref=x&a=1#top") == "https://shop.com/item/:num?a&ref"
+    assert url_pattern("https://shop.com/order/3f2b8c1d9e7a6b5c4d3e") == "https://shop.com/order/:id"
+    assert url_pattern("about:blank") == "about://blank"
+
+
+def test_cache_key_ignores_values_and_formatting():
+    before = {0: _element("input", "html/body/input", name="user"), 1: _element("button", "html/body/button")}
+    typed = {0: _element("input", "html/body/input", name="user", value="admin"), 1: before[1]}
+    assert dom_fingerprint(before) == dom_fingerprint(typed)
+    assert make_cache_key("Log in  as Admin", "https://a.com/login?next=1", before) == make_cache_key(
+        "log in as admin", "https://a.com/login?next=2", typed
+    )
+    assert make_cache_key("log in as admin", "https://a.com/login", before) != make_cache_key(
+        "log in as admin", "https://a.com/login", {0: before[0]}
+    )
+
+
+def test_action_cache_persists_and_evicts(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ActionCache(path, max_entries=2)
+    actions = [{"input_text": {"index": 0, "text": "admin"}}, {"click_element": {"index": 1}}]
+    assert cache.get("a") is None
+    cache.put("a", actions, url="https://a.com/login", result_url="https://a.com/home/42")
+
+    reloaded = ActionCache(path, max_entries=2)
+    entry = reloaded.get("a")
+    assert entry["actions"] == actions and entry["result_url"] == "https://a.com/home/:num"
+
+    reloaded.put("b", actions, url="https://a.com", result_url="https://a.com")
+    reloaded.put("c", actions, url="https://a.com", result_url="https://a.com")
+    assert len(reloaded) == 2
+    reloaded.invalidate("c")
+    assert reloaded.get("c") is None
+    assert reloaded.stats_dict()["invalidations"] == 1
+    assert cache.stats.misses == 1
+
+
+def test_writes_are_batched_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "cache.json")
+    actions = [{"click_element": {"index": 1}}]
+
+    async def run():
+        cache = ActionCache(path, save_delay=0.05)
+        for i in range(20):
+            cache.put(str(i), actions, url="https://a.com", result_url="https://a.com")
+        # nothing is written by put itself
+        assert not os.path.exists(path)
+        await asyncio.sleep(0.2)
+        assert len(ActionCache(path)) == 20
+        cache.invalidate("0")
+        await cache.flush()
+        assert len(ActionCache(path)) == 19
+
+    asyncio.run(run())
+    assert os.listdir(tmp_path) == ["cache.json"]
@@ -0,0 +1,46 @@
+import sys
+
+sys.path.append(".")
+
+from src.agent.agent_memory import AgentMemory
+
+
+def test_duplicates_are_skipped():
+    memory = AgentMemory()
+    assert memory.add("Order 1042 costs $25.", step=1)
+    assert not memory.add("  order 1042   costs $25. ", step=2)
+    assert memory.add("Order 1043 costs $30.", step=2)
+    assert memory.render() == "Order 1042 costs $25.\nOrder 1043 costs $30.\n"
+    assert str(memory) is memory.render()
+
+
+def test_old_entries_are_condensed_within_budget():
+    memory = AgentMemory(max_tokens=100, characters_per_token=3, summary_ratio=0.3)
+    for step in range(1, 21):
+        memory.add(f"Result {step}: the product page lists {step} reviews. " + "detail " * 10, step=step)
+        assert memory.tokens + memory.summary_tokens <= 100
+
+    rendered = memory.render()
+    assert rendered.startswith("Earlier notes (condensed):\n")
+    assert "- (step 18) Result 18: the product page lists 18 reviews." in rendered
+    assert "Result 1:" not in rendered
+    assert memory.entries[-1].text.startswith("Result 20:")
+    # an evicted fact can be remembered again
+    assert memory.add(f"Result 1: the product page lists 1 reviews. " + "detail " * 10, step=21)
+
+
+def test_prompt_renders_the_store():
+    from browser_use.browser.views import BrowserState
+    from browser_use.dom.views import DOMElementNode
+
+    from src.agent.custom_prompts import CustomAgentMessagePrompt
+    from src.agent.custom_views import CustomAgentStepInfo
+
+    memory = AgentMemory()
+    memory.add("The cheapest flight is $120.", step=1)
+    root = DOMElementNode(tag_name="body", xpath="html/body", attributes={}, children=[], is_visible=True, parent=None)
+    step_info = CustomAgentStepInfo(step_number=2, max_steps=10, task="find flights", add_infos="", memory=memory,
+                                    task_progress="", future_plans="")
+    state = BrowserState(element_tree=root, selector_map={}, url="https://a.com", title="", tabs=[])
+    content = CustomAgentMessagePrompt(state, step_info=step_info).get_user_message().content
+    assert "3. Memory: \nThe cheapest flight is $120.\n\n4. Current url" in content
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import sys
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+sys.path.append(".")
+
+import pytest
+
+from src.runner import batch_runner
+from src.runner.batch_runner import BatchRunner, load_tasks
+
+
+def test_load_tasks_jsonl(tmp_path):
+    path = tmp_path / "tasks.jsonl"
+    path.write_text(
+        '{"id": "search", "task": "Search OpenAI", "max_steps": 5}\n'
+        '\n'
+        '{"task": "Open google.com", "add_infos": "use english"}\n'
+    )
+    tasks = load_tasks(str(path))
+    assert [t.task_id for t in tasks] == ["search", "2"]
+    assert tasks[0].max_steps == 5
+    assert tasks[1].add_infos == "use english"
+
+
+def test_load_tasks_yaml(tmp_path):
+    path = tmp_path / "tasks.yaml"
+    path.write_text("tasks:\n  - id: a\n    task: first\n  - task: second\n")
+    tasks = load_tasks(str(path))
+    assert [(t.task_id, t.task) for t in tasks] == [("a", "first"), ("2", "second")]
+
+
+def test_batch_runner_streams_results(tmp_path, monkeypatch):
+    running = 0
+    max_running = 0
+
+    class FakeHistory:
+        def __init__(self, task):
+            self.history = [None, None]
+            self.task = task
+
+        def is_done(self):
+            return self.task != "fail"
+
+        def errors(self):
+            return [None]
+
+        def final_result(self):
+            return f"done {self.task}"
+
+    class FakeAgent:
+        def __init__(self, task, **kwargs):
+            self.task = task
+
+        async def run(self, max_steps):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return FakeHistory(self.task)
+
+        def save_history(self, path):
+            with open(path, "w") as f:
+                f.write("{}")
+
+    class FakePool:
+        closed = False
+
+        @asynccontextmanager
+        async def lease(self, browser_config, context_config):
+            yield SimpleNamespace(browser=None, browser_context=None)
+
+        def prewarm(self, browser_config, context_config):
+            pass
+
+        async def close(self):
+            self.closed = True
+
+    monkeypatch.setattr(batch_runner, "CustomAgent", FakeAgent)
+    monkeypatch.setattr(batch_runner, "CustomController", lambda: None)
+    tasks = [batch_runner.BatchTask(task_id=str(i), task="fail" if i == 0 else "ok") for i in range(6)]
+    pool = FakePool()
+    runner = BatchRunner(llm=None, output_dir=str(tmp_path), concurrency=2, browser_pool=pool)
+
+    stats = asyncio.run(runner.run(tasks))
+
+    assert max_running == 2
+    # the pool was passed in, the caller closes it
+    assert not pool.closed
+    assert stats.completed == 6 and stats.succeeded == 5 and stats.steps == 12
+    results = [json.loads(line) for line in open(runner.results_path)]
+    assert sorted(r["task_id"] for r in results) == [str(i) for i in range(6)]
+    assert json.load(open(tmp_path / "summary.json"))["completed"] == 6
+
+
+def test_stop_skips_pending_tasks(tmp_path, monkeypatch):
+    runner = None
+    started = []
+
+    class FakeHistory:
+        history = [None]
+
+        def is_done(self):
+            return True
+
+        def errors(self):
+            return []
+
+        def final_result(self):
+            return "done"
+
+    class FakeAgent:
+        def __init__(self, task, agent_state, **kwargs):
+            self.task = task
+            self.agent_state = agent_state
+
+        async def run(self, max_steps):
+            started.append(self.task)
+            runner.request_stop()
+            return FakeHistory()
+
+        def save_history(self, path):
+            pass
+
+    class FakePool:
+        @asynccontextmanager
+        async def lease(self, browser_config, context_config):
+            yield SimpleNamespace(browser=None, browser_context=None)
+
+        def prewarm(self, browser_config, context_config):
+            pass
+
+        async def close(self):
+            pass
+
+    monkeypatch.setattr(batch_runner, "CustomAgent", FakeAgent)
+    monkeypatch.setattr(batch_runner, "CustomController", lambda: None)
+    tasks = [batch_runner.BatchTask(task_id=str(i), task=str(i)) for i in range(4)]
+    runner = BatchRunner(llm=None, output_dir=str(tmp_path), concurrency=1, browser_pool=FakePool())
+
+    stats = asyncio.run(runner.run(tasks))
+
+    assert started == ["0"] and stats.completed == 4 and stats.succeeded == 0
+    results = {r["task_id"]: r for r in map(json.loads, open(runner.results_path))}
+    # the stopped run ends with a done item but did not finish its task
+    assert results["0"]["stopped"] and not results["0"]["success"]
+    assert all(results[str(i)]["stopped"] and not results[str(i)]["success"] for i in range(1, 4))
+
+
+def test_duplicate_task_ids_are_rejected(tmp_path):
+    tasks = [batch_runner.BatchTask(task_id="1", task="a"), batch_runner.BatchTask(task_id="1", task="b")]
+    runner = BatchRunner(llm=None, output_dir=str(tmp_path))
+    with pytest.raises(ValueError, match="Duplicate task ids: 1"):
+        asyncio.run(runner.run(tasks))
@@ -0,0 +1,139 @@
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(".")
+
+from browser_use.browser.browser import BrowserConfig
+from browser_use.browser.context import BrowserContextConfig
+
+from src.browser import browser_pool
+from src.browser.browser_pool import BrowserPool
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self.session = None
+        self.closed = False
+
+    async def get_session(self):
+        await asyncio.sleep(0.05)
+        self.session = object()
+        return self.session
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    launched = []
+
+    def __init__(self, config):
+        self.config = config
+        self.playwright_browser = SimpleNamespace(is_connected=lambda: not self.closed)
+        self.closed = False
+        FakeBrowser.launched.append(self)
+
+    async def get_playwright_browser(self):
+        await asyncio.sleep(0.05)
+        return self.playwright_browser
+
+    async def new_context(self, config):
+        return FakeContext(self)
+
+    async def close(self):
+        self.closed = True
+
+
+def _pool(monkeypatch, **kwargs) -> BrowserPool:
+    FakeBrowser.launched = []
+    monkeypatch.setattr(browser_pool, "CustomBrowser", FakeBrowser)
+    return BrowserPool(max_browsers=2, max_contexts_per_browser=4, **kwargs)
+
+
+async def _settle(pool: BrowserPool) -> None:
+    for spec in pool._warm:
+        if spec.task is not None:
+            await spec.task
+
+
+def test_warm_contexts_are_handed_out_and_replaced(monkeypatch):
+    async def run():
+        pool = _pool(monkeypatch, warm_contexts=2)
+        config = BrowserConfig(headless=True)
+        pool.prewarm(config)
+        await _settle(pool)
+        assert pool.warm_available == 2
+
+        start = time.perf_counter()
+        lease = await pool.acquire(config)
+        elapsed = time.perf_counter() - start
+        assert lease.browser_context.session is not None
+        await pool.release(lease)
+        await _settle(pool)
+        # another configuration is not served from the warm contexts
+        other = await pool.acquire(config, BrowserContextConfig(no_viewport=False))
+        assert other.browser_context.session is None
+        await pool.close()
+        return elapsed, pool.stats_dict()
+
+    elapsed, stats = asyncio.run(run())
+    assert elapsed < 0.01
+    assert stats["warm_hits"] == 1 and stats["cold_acquires"] == 1
+    assert len(FakeBrowser.launched) == 1
+
+
+def test_browser_is_recycled_after_n_contexts(monkeypatch):
+    async def run():
+        pool = _pool(monkeypatch, recycle_after_contexts=2)
+        config = BrowserConfig(headless=True)
+        browsers = []
+        for _ in range(3):
+            lease = await pool.acquire(config)
+            browsers.append(lease.browser)
+            await pool.release(lease)
+        await pool.close()
+        return browsers, pool.recycled_browsers
+
+    browsers, recycled = asyncio.run(run())
+    assert browsers[0] is browsers[1] and browsers[2] is not browsers[0]
+    assert browsers[0].closed and recycled >= 1
+
+
+def test_browser_over_rss_threshold_is_recycled(monkeypatch):
+    async def rss(browser):
+        return 900 * 1024 * 1024
+
+    async def run():
+        pool = _pool(monkeypatch, max_browser_rss_mb=500)
+        monkeypatch.setattr(browser_pool, "browser_rss_bytes", rss)
+        config = BrowserConfig(headless=True)
+        first = await pool.acquire(config)
+        await pool.release(first)
+        second = await pool.acquire(config)
+        await pool.close()
+        return first.browser, second.browser
+
+    first, second = asyncio.run(run())
+    assert first.closed and first is not second
+
+
+def test_concurrent_acquires_respect_contexts_per_browser(monkeypatch):
+    class SlowContextBrowser(FakeBrowser):
+        async def new_context(self, config):
+            await asyncio.sleep(0.05)
+            return FakeContext(self)
+
+    async def run():
+        pool = _pool(monkeypatch)
+        monkeypatch.setattr(browser_pool, "CustomBrowser", SlowContextBrowser)
+        pool.max_contexts_per_browser = 1
+        config = BrowserConfig(headless=True)
+        leases = await asyncio.gather(pool.acquire(config), pool.acquire(config))
+        await pool.close()
+        return leases
+
+    first, second = asyncio.run(run())
+    assert first.browser is not second.browser
@@ -0,0 +1,112 @@
+import asyncio
+import sys
+import time
+
+sys.path.append(".")
+
+from src.browser.custom_browser import CustomBrowser, _drain, probe_devtools, read_devtools_endpoint
+
+WS_URL = "ws://127.0.0.1:9333/devtools/browser/abc"
+
+
+async def _devtools_server(fail_first: int):
+    """A /json/version endpoint that answers 503 to the first fail_first requests"""
+    requests = []
+
+    async def handle(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        requests.append(time.monotonic())
+        if len(requests) <= fail_first:
+            status, body = "503 Service Unavailable", b""
+        else:
+            status, body = "200 OK", ('{"webSocketDebuggerUrl": "%s"}' % WS_URL).encode()
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1], requests
+
+
+def test_probe_backs_off_until_devtools_answers():
+    async def run():
+        server, port, requests = await _devtools_server(fail_first=3)
+        async with server:
+            endpoint = await probe_devtools("127.0.0.1", port, timeout=5, initial_delay=0.02)
+        gaps = [b - a for a, b in zip(requests, requests[1:])]
+        return endpoint, gaps
+
+    endpoint, gaps = asyncio.run(run())
+    assert endpoint == WS_URL
+    assert len(gaps) == 3 and gaps[2] > gaps[0] * 2
+
+
+def test_probe_gives_up_without_a_browser():
+    async def run():
+        server, port, _ = await _devtools_server(fail_first=0)
+        server.close()
+        await server.wait_closed()
+        start = time.monotonic()
+        return await probe_devtools("127.0.0.1", port, timeout=0.3), time.monotonic() - start
+
+    endpoint, elapsed = asyncio.run(run())
+    assert endpoint is None and elapsed < 1.5
+
+
+def _fake_chrome(delay: float) -> list:
+    script = (
+        "import sys, time\n"
+        "print('[0101/000000.000:ERROR] some warning', file=sys.stderr, flush=True)\n"
+        f"time.sleep({delay})\n"
+        f"print('\\nDevTools listening on {WS_URL}', file=sys.stderr, flush=True)\n"
+        "time.sleep(5)\n"
+    )
+    return [sys.executable, "-c", script]
+
+
+def test_parallel_launches_read_their_endpoint_from_stderr():
+    async def launch():
+        process = await asyncio.create_subprocess_exec(*_fake_chrome(0.3), stderr=asyncio.subprocess.PIPE)
+        try:
+            return await read_devtools_endpoint(process.stderr, timeout=5)
+        finally:
+            process.kill()
+            await process.wait()
+
+    async def run():
+        start = time.monotonic()
+        endpoints = await asyncio.gather(*(launch() for _ in range(4)))
+        return endpoints, time.monotonic() - start
+
+    endpoints, elapsed = asyncio.run(run())
+    assert endpoints == [WS_URL] * 4
+    # the launches overlap instead of queueing behind each other
+    assert elapsed < 0.3 * 4
+
+
+def test_stderr_closing_early_returns_none():
+    async def run():
+        process = await asyncio.create_subprocess_exec(sys.executable, "-c", "pass", stderr=asyncio.subprocess.PIPE)
+        endpoint = await read_devtools_endpoint(process.stderr, timeout=5)
+        await process.wait()
+        return endpoint
+
+    assert asyncio.run(run()) is None
+
+
+def test_close_stops_the_chrome_it_started():
+    async def run():
+        browser = CustomBrowser()
+        process = await asyncio.create_subprocess_exec(*_fake_chrome(0), stderr=asyncio.subprocess.PIPE)
+        browser._chrome_process = process
+        browser._stderr_task = drain = asyncio.create_task(_drain(process.stderr))
+        await browser.close()
+        running = process.returncode is None
+        if running:
+            process.kill()
+            await process.wait()
+        await asyncio.sleep(0)
+        return running, drain.cancelled()
+
+    running, drain_cancelled = asyncio.run(run())
+    assert not running and drain_cancelled
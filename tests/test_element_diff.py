@@ -0,0 +1,101 @@
+import sys
+
+sys.path.append(".")
+
+from browser_use.browser.views import BrowserState
+from browser_use.dom.views import DOMElementNode, DOMTextNode
+from langchain_core.messages import AIMessage
+
+from src.agent.custom_massage_manager import CustomMassageManager
+from src.agent.custom_prompts import CustomAgentMessagePrompt, CustomSystemPrompt
+from src.agent.custom_views import CustomAgentStepInfo
+from src.agent.element_diff import ElementDiffTracker, diff_snapshots, snapshot_elements
+
+
+def _page(options: list[str], value: str = ""):
+    """A form with a combobox; options appear between the input and the submit button"""
+    root = DOMElementNode(tag_name="body", xpath="html/body", attributes={}, children=[], is_visible=True, parent=None)
+    title = DOMTextNode(text="Order form", is_visible=True, parent=root)
+    index = 0
+    field = DOMElementNode(
+        tag_name="input", xpath="html/body/input", attributes={"name": "fruit", "value": value},
+        children=[], is_visible=True, parent=root, highlight_index=index,
+    )
+    root.children = [title, field]
+    for i, option in enumerate(options):
+        index += 1
+        item = DOMElementNode(
+            tag_name="li", xpath=f"html/body/ul/li[{i + 1}]", attributes={}, children=[], is_visible=True,
+            parent=root, highlight_index=index,
+        )
+        item.children = [DOMTextNode(text=option, is_visible=True, parent=item)]
+        root.children.append(item)
+    button = DOMElementNode(
+        tag_name="button", xpath="html/body/button", attributes={}, children=[], is_visible=True,
+        parent=root, highlight_index=index + 1,
+    )
+    button.children = [DOMTextNode(text="Submit", is_visible=True, parent=button)]
+    root.children.append(button)
+    for i in range(40):
+        root.children.append(DOMTextNode(text=f"Terms paragraph {i}", is_visible=True, parent=root))
+    return root
+
+
+def test_snapshot_matches_clickable_elements_to_string():
+    tree = _page(["Apple", "Banana"], value="a")
+    assert snapshot_elements(tree, "u", ["name", "value"]).to_text() == tree.clickable_elements_to_string(["name", "value"])
+
+
+def test_diff_keys_elements_by_identity():
+    closed = snapshot_elements(_page([]), "u", ["value"])
+    opened = snapshot_elements(_page(["Apple"], value="a"), "u", ["value"])
+    assert diff_snapshots(closed, opened) == [
+        '~ 0[:]<input value="a"></input>',
+        "+ 1[:]<li >Apple</li>",
+        "~ 2[:]<button >Submit</button>",
+    ]
+
+
+def test_tracker_resyncs_on_navigation_and_interval():
+    tracker = ElementDiffTracker(resync_steps=2)
+    first = snapshot_elements(_page([]), "https://a.com")
+    assert tracker.render(first, 1) == (first.to_text(), True)
+    text, is_full = tracker.render(snapshot_elements(_page(["Apple"]), "https://a.com"), 2)
+    assert not is_full and "+ 1[:]<li>Apple</li>" in text and "element list of step 1" in text
+    assert tracker.render(first, 3) == ("No changes since the element list of step 1.", False)
+    # resync after two deltas
+    assert tracker.render(first, 4)[1]
+    # navigation always sends the full list
+    assert tracker.render(snapshot_elements(_page([]), "https://a.com/next"), 5)[1]
+
+
+def test_message_manager_keeps_full_list_as_reference():
+    manager = CustomMassageManager(
+        llm=None,
+        task="order an apple",
+        action_descriptions="",
+        system_prompt_class=CustomSystemPrompt,
+        agent_prompt_class=CustomAgentMessagePrompt,
+        use_element_diff=True,
+    )
+    step_info = CustomAgentStepInfo(step_number=1, max_steps=10, task="order an apple", add_infos="", memory="",
+                                    task_progress="", future_plans="")
+
+    def run_step(tree):
+        state = BrowserState(element_tree=tree, selector_map={}, url="https://a.com", title="", tabs=[])
+        manager.add_state_message(state, step_info=step_info)
+        sent = manager.get_messages()[-1].content
+        manager._add_message_with_tokens(AIMessage(content="{}"))
+        manager._remove_state_message_by_index(-1)
+        step_info.step_number += 1
+        return sent
+
+    full = run_step(_page([]))
+    assert "Terms paragraph 39" in full
+    delta = run_step(_page(["Apple"]))
+    assert "Terms paragraph" not in delta and "+ 1[:]<li>Apple</li>" in delta
+
+    contents = [m.message.content for m in manager.history.messages]
+    assert contents[-3].startswith("Element list of step 1 (https://a.com)")
+    assert contents[-2:] == ["{}", "{}"]
+    assert manager.history.total_tokens == sum(m.metadata.input_tokens for m in manager.history.messages)
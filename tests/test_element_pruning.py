@@ -0,0 +1,80 @@
+import sys
+
+sys.path.append(".")
+
+from src.agent.element_diff import ElementSnapshot
+from src.agent.element_pruning import collapse_repeated, prune_elements, query_terms
+
+
+def _snapshot():
+    snapshot = ElementSnapshot(url="https://shop.com/orders")
+    snapshot.lines["html/body/input"] = '0[:]<input placeholder="Search orders"></input>'
+    for i in range(1, 61):
+        snapshot.lines[f"html/body/table/tr[{i}]/a"] = f"{i}[:]<a>Order {1000 + i} - shipped</a>"
+    snapshot.lines["html/body/table/tr[42]/a"] = "42[:]<a>Order 1042 - refund requested</a>"
+    for i in range(100):
+        snapshot.lines[f"html/body/div[{i % 7}]/p/text()=Legal {i}"] = f"_[:]Legal notice paragraph {i} " + "x" * 40
+    snapshot.lines["html/body/button"] = "61[:]<button>Export</button>"
+    return snapshot
+
+
+def test_query_terms_skip_stopwords():
+    assert query_terms("Open the refund page", None, "1. Click refund. 2. Export") == {"open", "refund", "export"}
+
+
+def test_collapse_keeps_first_and_relevant_rows():
+    collapsed = collapse_repeated(_snapshot(), {"refund"})
+    rows = [line for key, line in collapsed.lines.items() if "/tr[" in key and not key.endswith("#collapsed")]
+    assert len(rows) == 6 and rows[-1] == "42[:]<a>Order 1042 - refund requested</a>"
+    assert "_[:]... 54 more similar <a> items hidden, scroll or extract content to see them ..." in collapsed.lines.values()
+
+
+def test_prune_fits_budget_and_keeps_page_order():
+    snapshot = _snapshot()
+    pruned = prune_elements(snapshot, max_tokens=300, terms=query_terms("refund the order, then export"))
+    text = pruned.to_text()
+    assert len(text) <= 300 * 3
+    assert "Order 1042 - refund requested" in text and "<button>Export</button>" in text
+    assert "less relevant elements omitted" in text
+    kept = [key for key in pruned.lines if key in snapshot.lines]
+    order = list(snapshot.lines)
+    assert kept == sorted(kept, key=order.index)
+
+
+def test_small_list_is_untouched():
+    snapshot = ElementSnapshot(url="u", lines={"a": "0[:]<a>Home</a>"})
+    assert prune_elements(snapshot, max_tokens=100, terms=set()) is snapshot
+
+
+def test_state_message_respects_element_budget():
+    from browser_use.browser.views import BrowserState
+    from browser_use.dom.views import DOMElementNode, DOMTextNode
+
+    from src.agent.custom_massage_manager import CustomMassageManager
+    from src.agent.custom_prompts import CustomAgentMessagePrompt, CustomSystemPrompt
+
+    root = DOMElementNode(tag_name="ul", xpath="html/body/ul", attributes={}, children=[], is_visible=True, parent=None)
+    for i in range(500):
+        item = DOMElementNode(tag_name="a", xpath=f"html/body/ul/li[{i + 1}]/a", attributes={}, children=[],
+                              is_visible=True, parent=root, highlight_index=i)
+        item.children = [DOMTextNode(text=f"Product {i}", is_visible=True, parent=item)]
+        root.children.append(item)
+
+    manager = CustomMassageManager(
+        llm=None,
+        task="open product 250",
+        action_descriptions="",
+        system_prompt_class=CustomSystemPrompt,
+        agent_prompt_class=CustomAgentMessagePrompt,
+        max_elements_tokens=200,
+    )
+    from src.agent.custom_views import CustomAgentStepInfo
+
+    step_info = CustomAgentStepInfo(step_number=1, max_steps=10, task="open product 250", add_infos="", memory="",
+                                    task_progress="", future_plans="")
+    state = BrowserState(element_tree=root, selector_map={}, url="https://shop.com", title="", tabs=[])
+    manager.add_state_message(state, step_info=step_info)
+    content = manager.get_messages()[-1].content
+    assert "250[:]<a>Product 250</a>" in content
+    assert "Product 400" not in content
+    assert manager.history.messages[-1].metadata.input_tokens < 400
@@ -0,0 +1,123 @@
+import json
+import sys
+from xml.etree import ElementTree
+
+import pytest
+
+sys.path.append(".")
+
+from src.runner.batch_runner import BatchTaskResult
+from src.runner.gherkin_parser import GherkinParseError, expand_scenarios, parse_feature
+from src.runner.gherkin_runner import (
+    build_cucumber_json,
+    build_junit_xml,
+    load_scenarios,
+    scenario_passed,
+    scenario_to_task,
+)
+
+FEATURE = '''@web
+Feature: Search
+  Searching from the home page.
+
+  Background:
+    Given I open "https://www.google.com"
+
+  @smoke
+  Scenario: Simple search
+    When I search for "OpenAI"
+    Then the results contain "openai.com"
+
+  Scenario Outline: Search <term>
+    When I search for "<term>"
+    Then the page shows:
+      """
+      results for <term>
+      """
+
+    @wip
+    Examples:
+      | term    |
+      | browser |
+      | agent   |
+'''
+
+
+def test_parse_feature_and_expand_outline():
+    feature = parse_feature(FEATURE, path="features/search.feature")
+    assert feature.name == "Search"
+    assert feature.description == "Searching from the home page."
+    assert [step.text for step in feature.background] == ['I open "https://www.google.com"']
+
+    cases = expand_scenarios(feature)
+    assert [case.case_id for case in cases] == ["search-L9", "search-L23-ex1", "search-L24-ex2"]
+    assert cases[0].tags == ["@web", "@smoke"]
+    assert cases[1].tags == ["@web", "@wip"]
+    assert cases[1].name == "Search browser (term=browser)"
+    assert cases[2].steps[0].text == 'I search for "agent"'
+    assert cases[2].steps[1].doc_string == "results for agent"
+
+
+def test_parse_errors():
+    with pytest.raises(GherkinParseError):
+        parse_feature("Scenario: no feature\n  Given a step\n")
+    with pytest.raises(GherkinParseError):
+        parse_feature("Feature: f\n  Scenario: s\n    Given a step\n  Examples:\n    | a |\n")
+
+
+def test_load_scenarios_filters_tags(tmp_path):
+    (tmp_path / "search.feature").write_text(FEATURE)
+    assert len(load_scenarios(str(tmp_path))) == 3
+    assert [c.case_id for c in load_scenarios(str(tmp_path), include_tags=["@smoke"])] == ["search-L9"]
+    assert [c.case_id for c in load_scenarios(str(tmp_path), exclude_tags=["@wip"])] == ["search-L9"]
+
+
+def test_scenario_task_and_reports():
+    cases = expand_scenarios(parse_feature(FEATURE, path="search.feature"))
+    task = scenario_to_task(cases[0])
+    assert task.task_id == "search-L9"
+    assert 'When I search for "OpenAI"' in task.task
+    assert 'Given I open "https://www.google.com"' in task.add_infos
+
+    results = {
+        "search-L9": BatchTaskResult("search-L9", "", success=True, steps=3, duration=2.0, final_result="PASSED"),
+        "search-L23-ex1": BatchTaskResult(
+            "search-L23-ex1", "", success=True, steps=4, duration=1.5, final_result="FAILED: no results shown"
+        ),
+    }
+    assert scenario_passed(results["search-L9"])
+    assert not scenario_passed(results["search-L23-ex1"])
+
+    suite = ElementTree.fromstring(build_junit_xml(cases, results)).find("testsuite")
+    assert suite.get("tests") == "3" and suite.get("failures") == "1" and suite.get("skipped") == "1"
+    testcases = suite.findall("testcase")
+    assert testcases[1].find("failure").get("message") == "FAILED: no results shown"
+    assert testcases[2].find("skipped") is not None
+
+    report = json.loads(json.dumps(build_cucumber_json(cases, results)))
+    elements = report[0]["elements"]
+    assert [e["steps"][-1]["result"]["status"] for e in elements] == ["passed", "failed", "skipped"]
+    assert elements[0]["steps"][0]["keyword"] == "Given "
+    assert elements[0]["steps"][-1]["result"]["duration"] == 2_000_000_000
+
+
+def test_only_an_explicit_passed_verdict_passes():
+    def result(final_result, success=True, stopped=False):
+        return BatchTaskResult("a", "", success=success, steps=1, duration=1.0, final_result=final_result,
+                               stopped=stopped)
+
+    assert scenario_passed(result("passed: all steps succeeded"))
+    assert not scenario_passed(result(None))
+    assert not scenario_passed(result(""))
+    assert not scenario_passed(result("The results contain openai.com"))
+    assert not scenario_passed(result("PASSEDX"))
+    assert not scenario_passed(result("PASSED", stopped=True))
+    assert not scenario_passed(result("PASSED", success=False))
+
+
+def test_case_ids_hold_the_feature_directory(tmp_path):
+    for directory in ("admin", "shop"):
+        (tmp_path / directory).mkdir()
+        (tmp_path / directory / "login.feature").write_text("Feature: Login\n  Scenario: s\n    Given a step\n")
+    assert [c.case_id for c in load_scenarios(str(tmp_path))] == ["admin.login-L2", "shop.login-L2"]
+    assert [c.case_id for c in load_scenarios(str(tmp_path / "shop" / "login.feature"))] == ["login-L2"]
@@ -0,0 +1,154 @@
+import asyncio
+import base64
+import os
+import io
+import sys
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+sys.path.append(".")
+
+import pytest
+from browser_use.agent.views import AgentHistory, AgentHistoryList
+from browser_use.browser.views import BrowserStateHistory
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from PIL import Image
+
+from src.agent.custom_agent import CustomAgent
+from src.agent.custom_prompts import CustomAgentMessagePrompt, CustomSystemPrompt
+from src.agent.custom_views import CustomAgentBrain
+from src.agent.history_gif import (
+    FrameJob,
+    FrameStyle,
+    GifWriter,
+    HistoryAnimationJob,
+    frame_executor,
+    load_fonts,
+    write_history_animation,
+)
+
+
+def _screenshot(color, size=(320, 240)) -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def _agent(steps: int) -> CustomAgent:
+    agent = CustomAgent(
+        task="open the pricing page",
+        llm=GenericFakeChatModel(messages=iter([])),
+        browser_context=SimpleNamespace(config=SimpleNamespace(wait_between_actions=0)),
+        system_prompt_class=CustomSystemPrompt,
+        agent_prompt_class=CustomAgentMessagePrompt,
+        generate_gif=False,
+    )
+    brain = CustomAgentBrain(prev_action_evaluation="", important_contents="", task_progress="",
+                             future_plans="", thought="Click the pricing link", summary="")
+    agent.history = AgentHistoryList(history=[
+        AgentHistory(
+            model_output=agent.AgentOutput(current_state=brain, action=[]) if i % 2 else None,
+            result=[],
+            state=BrowserStateHistory(url="https://a.com", title="", tabs=[], interacted_element=[None],
+                                      screenshot=_screenshot((40 * i % 256, 80, 160))),
+        )
+        for i in range(steps)
+    ])
+    return agent
+
+
+def test_gif_has_a_frame_per_screenshot(tmp_path):
+    path = str(tmp_path / "history.gif")
+    _agent(4).create_history_gif(output_path=path, duration=500, font_size=12, title_font_size=14)
+
+    with Image.open(path) as gif:
+        assert gif.n_frames == 5 and gif.size == (320, 240) and gif.info["loop"] == 0
+        colors = []
+        for index in range(gif.n_frames):
+            gif.seek(index)
+            assert gif.info["duration"] == 500
+            colors.append(gif.convert("RGB").getpixel((5, 5)))
+    # task frame, then the screenshots with their own palettes
+    assert colors[0] == (0, 0, 0) and colors[1] == (0, 80, 160) and colors[3] == (80, 80, 160)
+
+
+def test_gif_writer_keeps_no_frames(tmp_path):
+    frames = []
+    with GifWriter(str(tmp_path / "history.gif"), duration=100) as writer:
+        for i in range(5):
+            frame = Image.new("RGB", (640, 480), (10 * i, 20, 30))
+            writer.add(frame)
+            frames.append(weakref.ref(frame))
+            del frame
+        # every frame is written and released before the next one is drawn
+        assert all(ref() is None for ref in frames)
+    with Image.open(str(tmp_path / "history.gif")) as gif:
+        assert gif.n_frames == 5
+
+
+def test_fonts_are_loaded_once():
+    load_fonts.cache_clear()
+    load_fonts(40, 56, 44)
+    load_fonts(40, 56, 44)
+    assert load_fonts.cache_info().hits == 1
+
+
+def test_video_output_needs_imageio(tmp_path):
+    pytest.importorskip("imageio")
+    path = str(tmp_path / "history.mp4")
+    _agent(3).create_history_gif(output_path=path, duration=500)
+    assert (tmp_path / "history.mp4").stat().st_size > 0
+
+
+def _frame_colors(path: str) -> list:
+    colors = []
+    with Image.open(path) as gif:
+        for index in range(gif.n_frames):
+            gif.seek(index)
+            colors.append(gif.convert("RGB").getpixel((5, 5)))
+    return colors
+
+
+def test_parallel_rendering_keeps_the_frame_order(tmp_path):
+    jobs = [FrameJob(screenshot=_screenshot((i * 20, 0, 0)), step_number=i) for i in range(10)]
+    progress = []
+    frames = write_history_animation(jobs, FrameStyle(), str(tmp_path / "parallel.gif"), duration=100, workers=3,
+                                      progress=lambda done, total: progress.append((done, total)))
+    write_history_animation(jobs, FrameStyle(), str(tmp_path / "serial.gif"), duration=100, workers=1)
+
+    assert frames == 10 and progress[-1] == (10, 10) and len(progress) == 10
+    assert _frame_colors(str(tmp_path / "parallel.gif")) == [(i * 20, 0, 0) for i in range(10)]
+    assert (tmp_path / "parallel.gif").read_bytes() == (tmp_path / "serial.gif").read_bytes()
+
+
+def test_background_job_reports_progress(tmp_path):
+    path = str(tmp_path / "history.gif")
+
+    async def run():
+        job = _agent(6).create_history_gif_job(output_path=path, style=FrameStyle(font_size=12, title_font_size=14))
+        assert isinstance(job, HistoryAnimationJob) and not job.done
+        # the event loop keeps running while the frames are drawn
+        ticks = 0
+        while not job.done:
+            ticks += 1
+            await asyncio.sleep(0.001)
+        await job.wait()
+        return job, ticks
+
+    job, ticks = asyncio.run(run())
+    assert job.error is None and job.progress == 1.0 and job.frames_total == 7 and ticks > 0
+    assert Image.open(path).n_frames == 7
+
+
+def test_concurrent_animations_share_one_bounded_pool(tmp_path):
+    jobs = [FrameJob(screenshot=_screenshot((0, i * 40, 0)), step_number=i) for i in range(6)]
+    paths = [str(tmp_path / f"{i}.gif") for i in range(3)]
+    with ThreadPoolExecutor(3) as threads:
+        list(threads.map(lambda path: write_history_animation(jobs, FrameStyle(), path, duration=100, workers=4), paths))
+
+    executor = frame_executor()
+    assert executor is frame_executor()
+    assert executor._max_workers == (os.cpu_count() or 1)
+    assert executor._mp_context.get_start_method() in ("forkserver", "spawn")
+    assert all(_frame_colors(path) == [(0, i * 40, 0) for i in range(6)] for path in paths)
@@ -0,0 +1,112 @@
+import base64
+import io
+import os
+import sys
+import zipfile
+
+sys.path.append(".")
+
+import pytest
+from browser_use.agent.views import ActionResult, AgentBrain, AgentHistory, AgentHistoryList, AgentOutput
+from browser_use.browser.views import BrowserStateHistory
+from browser_use.controller.service import Controller
+from PIL import Image
+
+from src.agent.history_store import BlobStore, CompactHistory, bundle_compact_history, save_compact_history
+
+
+def _screenshot(color) -> str:
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 30), color).save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def _history(colors, output_model) -> AgentHistoryList:
+    action_model = output_model.model_fields["action"].annotation.__args__[0]
+    items = []
+    for step, color in enumerate(colors):
+        model_output = output_model(
+            current_state=AgentBrain(evaluation_previous_goal="Success", memory="", next_goal=f"step {step}"),
+            action=[action_model(go_to_url={"url": f"https://a.com/{step}"})],
+        )
+        state = BrowserStateHistory(url=f"https://a.com/{step}", title="A\nB", tabs=[], interacted_element=[None],
+                                    screenshot=_screenshot(color) if color else None)
+        items.append(AgentHistory(model_output=model_output, result=[ActionResult(extracted_content=f"page {step}")],
+                                  state=state))
+    return AgentHistoryList(history=items)
+
+
+@pytest.fixture
+def output_model():
+    return AgentOutput.type_with_custom_actions(Controller().registry.create_action_model())
+
+
+def test_screenshots_are_stored_once(tmp_path, output_model):
+    history = _history([(255, 0, 0), (255, 0, 0), None, (0, 0, 255)], output_model)
+    path = str(tmp_path / "run.jsonl")
+    save_compact_history(history, path)
+    # a second run with the same pages adds no blobs
+    save_compact_history(history, str(tmp_path / "rerun.jsonl"))
+
+    blobs = [name for _, _, names in os.walk(tmp_path / "blobs") for name in names]
+    assert len(blobs) == 2
+    lines = (tmp_path / "run.jsonl").read_text().splitlines()
+    assert len(lines) == 5 and all("iVBOR" not in line for line in lines)
+
+    with CompactHistory(path) as saved:
+        assert len(saved) == 4
+        assert saved.step_data(0)["screenshot"] == saved.step_data(1)["screenshot"]
+        assert saved.screenshot(2) is None
+        assert saved.screenshot(-1) == history.history[3].state.screenshot
+        assert saved.step(3, output_model) == history.history[3]
+        assert saved.load(output_model) == history
+        with pytest.raises(IndexError):
+            saved.step_data(4)
+
+
+def test_zstd_compressed_blobs(tmp_path, output_model):
+    pytest.importorskip("zstandard")
+    history = _history([(0, 255, 0)], output_model)
+    path = str(tmp_path / "run.jsonl")
+    save_compact_history(history, path, compression="zstd")
+
+    with CompactHistory(path) as saved:
+        digest = saved.step_data(0)["screenshot"]
+        assert os.path.exists(BlobStore(str(tmp_path / "blobs")).path(digest, "zstd"))
+        assert saved.screenshot(0) == history.history[0].state.screenshot
+
+
+def test_unknown_compression_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        BlobStore(str(tmp_path), compression="lz4")
+
+
+def test_blobs_are_not_stored_again_with_another_compression(tmp_path, output_model):
+    pytest.importorskip("zstandard")
+    history = _history([(255, 0, 0)], output_model)
+    save_compact_history(history, str(tmp_path / "run.jsonl"))
+    save_compact_history(history, str(tmp_path / "rerun.jsonl"), compression="zstd")
+    assert len([name for _, _, names in os.walk(tmp_path / "blobs") for name in names]) == 1
+
+
+def test_steps_need_the_output_model(tmp_path, output_model):
+    path = str(tmp_path / "run.jsonl")
+    save_compact_history(_history([(255, 0, 0)], output_model), path)
+    with CompactHistory(path) as saved, pytest.raises(TypeError):
+        saved.load()
+
+
+def test_bundle_is_self_contained(tmp_path, output_model):
+    history = _history([(255, 0, 0), (255, 0, 0), (0, 0, 255)], output_model)
+    save_compact_history(_history([(0, 255, 0)], output_model), str(tmp_path / "other.jsonl"))
+    path = str(tmp_path / "run.jsonl")
+    save_compact_history(history, path)
+
+    bundle_path = bundle_compact_history(path)
+    assert bundle_path == str(tmp_path / "run.zip")
+    with zipfile.ZipFile(bundle_path) as bundle:
+        # only the screenshots of this history
+        assert len([name for name in bundle.namelist() if name.startswith("blobs/")]) == 2
+        bundle.extractall(tmp_path / "elsewhere")
+    with CompactHistory(str(tmp_path / "elsewhere" / "history.jsonl")) as saved:
+        assert saved.load(output_model) == history
@@ -0,0 +1,129 @@
+import json
+import sys
+import time
+
+sys.path.append(".")
+
+import pytest
+
+from src.utils.json_parser import JSONParseStats, StreamingJSONObjectParser, extract_json_text, parse_json_object
+
+OUTPUT = {
+    "current_state": {
+        "prev_action_evaluation": "Success - the search results are shown",
+        "important_contents": "",
+        "task_progress": "1. Opened google.com 2. Searched 'OpenAI'",
+        "future_plans": "1. Open the first result",
+        "thought": "The first result is the OpenAI homepage, I click it. Code fences look like ```this```.",
+        "summary": "Open the first result",
+    },
+    "action": [{"click_element": {"index": 12}}],
+}
+
+
+def _responses() -> dict[str, str]:
+    plain = json.dumps(OUTPUT, indent=2)
+    return {
+        "plain": plain,
+        "fenced": f"```json\n{plain}\n```",
+        "prose": f"Here is my next step:\n```\n{plain}\n```\nLet me know if anything is unclear.",
+        "think": f"<think>\nThe user wants {{the first result}}, I should click it.\n</think>\n\n{plain}",
+        "no_open_think": f"I should click {{index 12}}.\n</think>{plain}",
+        "trailing_comma": plain.replace('"index": 12', '"index": 12,'),
+        "truncated": f"```json\n{plain[:-20]}",
+    }
+
+
+@pytest.mark.parametrize("name,tier", [
+    ("plain", "strict"),
+    ("fenced", "extracted"),
+    ("prose", "extracted"),
+    ("think", "extracted"),
+    ("no_open_think", "extracted"),
+    ("trailing_comma", "repaired"),
+])
+def test_tiers(name, tier):
+    stats = JSONParseStats()
+    value, used = parse_json_object(_responses()[name], stats)
+    assert used == tier and value == OUTPUT
+    assert stats.counts[tier] == 1
+
+
+def test_fences_inside_strings_survive():
+    # the old blanket replace of ``` corrupted string values that quote code
+    value, _ = parse_json_object(_responses()["fenced"], JSONParseStats())
+    assert value["current_state"]["thought"].endswith("```this```.")
+
+
+def test_truncated_output_is_repaired():
+    value, tier = parse_json_object(_responses()["truncated"], JSONParseStats())
+    assert tier == "repaired" and value["current_state"]["prev_action_evaluation"].startswith("Success")
+
+
+def test_unparseable_output_raises():
+    stats = JSONParseStats()
+    with pytest.raises(ValueError):
+        parse_json_object("I cannot help with that.", stats)
+    assert stats.stats_dict()["failures"] == 1
+
+
+def test_extract_json_text():
+    assert extract_json_text('<think>{"a": 1}</think>\n```json\n{"b": 2}\n```') == '{"b": 2}'
+
+
+@pytest.mark.parametrize("name", ["plain", "fenced", "think", "no_open_think"])
+def test_streaming_parser_reports_actions_as_they_close(name):
+    text = _responses()[name]
+    parser = StreamingJSONObjectParser(stream_key="action")
+    events = []
+    for position, char in enumerate(text):
+        events += [(position, event) for event in parser.feed(char)]
+    assert [event for _, event in events] == [
+        ("field", "current_state", OUTPUT["current_state"]),
+        ("item", "action", {"click_element": {"index": 12}}),
+    ]
+    # the action is available before the response ends
+    assert events[-1][0] < len(text) - 1 and parser.done
+
+
+def test_streaming_parser_scalars_and_invalid_items():
+    parser = StreamingJSONObjectParser(stream_key="action")
+    events = parser.feed('{"a": 1, "b": "x,}", "c": [1, {"d": 2}], "action": [{"x": 1}, {"y": 1,}], "e": null}')
+    assert events == [
+        ("field", "a", 1), ("field", "b", "x,}"), ("field", "c", [1, {"d": 2}]),
+        ("item", "action", {"x": 1}), ("item", "action", None), ("field", "e", None),
+    ]
+
+
+def benchmark_parsing(corpus_path: str = None, rounds: int = 200):
+    """
+    Compare the tiered parser with the previous replace + repair_json + json.loads pipeline.
+    corpus_path is an optional jsonl file of real model responses, one {"content": "..."} per line.
+    """
+    from json_repair import repair_json
+
+    if corpus_path:
+        with open(corpus_path, encoding="utf-8") as f:
+            corpus = {f"line {i}": json.loads(line)["content"] for i, line in enumerate(f) if line.strip()}
+    else:
+        corpus = _responses()
+
+    def legacy(text):
+        return json.loads(repair_json(text.replace("```json", "").replace("```", "")))
+
+    stats = JSONParseStats()
+    for name, text in corpus.items():
+        start = time.perf_counter()
+        for _ in range(rounds):
+            legacy(text)
+        legacy_us = (time.perf_counter() - start) / rounds * 1e6
+        start = time.perf_counter()
+        for _ in range(rounds):
+            _, tier = parse_json_object(text, stats)
+        tiered_us = (time.perf_counter() - start) / rounds * 1e6
+        print(f"{name:>16}: legacy {legacy_us:8.1f}µs  tiered {tiered_us:8.1f}µs  ({tier})")
+    print(stats.stats_dict())
+
+
+if __name__ == "__main__":
+    benchmark_parsing(sys.argv[1] if len(sys.argv) > 1 else None)
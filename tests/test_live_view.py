@@ -0,0 +1,147 @@
+import asyncio
+import base64
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(".")
+
+from src.browser.live_view import LiveViewHub, ScreencastStream, mjpeg_stream
+
+
+class FakeCDPSession:
+    def __init__(self):
+        self.acks = []
+
+    async def send(self, method, params=None):
+        if method == "Page.screencastFrameAck":
+            self.acks.append((time.monotonic(), params["sessionId"]))
+
+    async def detach(self):
+        pass
+
+
+def _frame(session_id: int) -> dict:
+    data = base64.b64encode(f"jpeg {session_id}".encode()).decode()
+    return {"data": data, "sessionId": session_id, "metadata": {"deviceWidth": 800, "deviceHeight": 600}}
+
+
+def test_viewers_behind_skip_to_the_latest_frame():
+    async def run():
+        stream = ScreencastStream(SimpleNamespace(session=None), max_fps=1000)
+        stream._cdp = FakeCDPSession()
+        assert await stream.next_frame(timeout=0.01) is None
+
+        waiter = asyncio.create_task(stream.next_frame(after=0, timeout=1))
+        await asyncio.sleep(0)
+        stream._on_frame(_frame(1))
+        first = await waiter
+
+        # a viewer that was busy while three frames arrived only gets the last one
+        for session_id in (2, 3, 4):
+            stream._on_frame(_frame(session_id))
+        latest = await stream.next_frame(after=first.sequence, timeout=1)
+        await asyncio.sleep(0.01)
+        return first, latest, stream._cdp.acks
+
+    first, latest, acks = asyncio.run(run())
+    assert first.sequence == 1 and first.jpeg == b"jpeg 1" and first.width == 800
+    assert latest.sequence == 4 and latest.jpeg == b"jpeg 4"
+    assert sorted(session_id for _, session_id in acks) == [1, 2, 3, 4]
+
+
+def test_acknowledgements_are_paced_to_max_fps():
+    async def run():
+        stream = ScreencastStream(SimpleNamespace(session=None), max_fps=20)
+        stream._cdp = FakeCDPSession()
+        for session_id in range(1, 5):
+            stream._on_frame(_frame(session_id))
+            # chrome sends the next frame only after the ack
+            while len(stream._cdp.acks) < session_id:
+                await asyncio.sleep(0.001)
+        return [t for t, _ in stream._cdp.acks]
+
+    times = asyncio.run(run())
+    assert times[-1] - times[0] >= 3 / 20 * 0.9
+
+
+def test_hub_shares_one_stream_per_session():
+    async def run():
+        hub = LiveViewHub(page_check_interval=0.01)
+        context = SimpleNamespace(session=None)
+        first = hub.subscribe("session", context)
+        second = hub.subscribe("session", context)
+        assert first is second and first.viewers == 2
+        other = hub.subscribe("session", SimpleNamespace(session=None))
+        assert other is not first and hub.stream("session") is other
+        await hub.unsubscribe(first)
+        assert first._task is not None
+        await hub.unsubscribe(second)
+        await hub.unsubscribe(other)
+        return first, hub.stream("session")
+
+    first, remaining = asyncio.run(run())
+    assert first._task is None and remaining is None
+
+
+def test_mjpeg_stream_sends_raw_frames_and_skips_when_behind():
+    async def run():
+        hub = LiveViewHub(max_fps=1000)
+        context = SimpleNamespace(session=None)
+        current = {"context": None}
+        body = mjpeg_stream(hub, "session", lambda: current["context"], idle_interval=0.01)
+        assert await body.__anext__() == b"--frame\r\n"
+
+        part = asyncio.create_task(body.__anext__())
+        await asyncio.sleep(0.05)
+        # the session gets its browser context after the viewer connected
+        current["context"] = context
+        while hub.stream("session") is None:
+            await asyncio.sleep(0.01)
+        stream = hub.stream("session")
+        stream._cdp = FakeCDPSession()
+        stream._on_frame(_frame(1))
+        first = await part
+
+        # the client was slow while three frames arrived
+        for session_id in (2, 3, 4):
+            stream._on_frame(_frame(session_id))
+        second = await body.__anext__()
+        await body.aclose()
+        return first, second, stream
+
+    first, second, stream = asyncio.run(run())
+    assert first == b"Content-Type: image/jpeg\r\nContent-Length: 6\r\n\r\njpeg 1\r\n--frame\r\n"
+    assert b"jpeg 4" in second and b"base64" not in second
+    assert stream.viewers == 0 and stream._task is None
+
+
+def test_mjpeg_stream_ends_with_the_run_or_the_lease():
+    async def frames(body):
+        return [part async for part in body]
+
+    async def run():
+        hub = LiveViewHub(max_fps=1000)
+        active = {"run": True}
+        current = {"context": None}
+        waiting = asyncio.create_task(frames(
+            mjpeg_stream(hub, "session", lambda: current["context"], idle_interval=0.01,
+                         is_active=lambda: active["run"])
+        ))
+        await asyncio.sleep(0.05)
+        # the run finished before it leased a browser context
+        active["run"] = False
+        ended_with_run = await asyncio.wait_for(waiting, 1)
+
+        current["context"] = SimpleNamespace(session=None)
+        watching = asyncio.create_task(frames(mjpeg_stream(hub, "session", lambda: current["context"],
+                                                           idle_interval=0.01)))
+        while hub.stream("session") is None:
+            await asyncio.sleep(0.01)
+        current["context"] = None
+        ended_with_lease = await asyncio.wait_for(watching, 1)
+        return ended_with_run, ended_with_lease, hub.stream("session")
+
+    ended_with_run, ended_with_lease, remaining = asyncio.run(run())
+    assert ended_with_run == [b"--frame\r\n"] and ended_with_lease == [b"--frame\r\n"]
+    assert remaining is None
@@ -0,0 +1,101 @@
+import asyncio
+import sys
+import time
+
+sys.path.append(".")
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from src.utils.llm_cache import LLMResponseCache, MemoryCacheBackend, SQLiteCacheBackend, make_cache_key
+
+
+def _messages(screenshot: str):
+    return [
+        SystemMessage(content="system"),
+        HumanMessage(content=[
+            {"type": "text", "text": "state"},
+            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{screenshot}"}},
+        ]),
+    ]
+
+
+def test_cache_key_hashes_screenshots():
+    key = make_cache_key(_messages("AAAA"), "gpt-4o")
+    assert key == make_cache_key(_messages("AAAA"), "gpt-4o")
+    assert key != make_cache_key(_messages("BBBB"), "gpt-4o")
+    assert key != make_cache_key(_messages("AAAA"), "gpt-4o-mini")
+
+
+def test_memory_backend_lru_and_ttl():
+    backend = MemoryCacheBackend(max_entries=2, ttl=60)
+    backend.set("a", "1")
+    backend.set("b", "2")
+    backend.get("a")
+    backend.set("c", "3")
+    assert backend.get("b") is None and backend.get("a") == "1"
+    backend.set("old", "x", created_at=time.time() - 120)
+    assert backend.get("old") is None
+
+
+def test_sqlite_backed_cache_survives_restart(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite")
+    cache = LLMResponseCache.from_path(path)
+    key = make_cache_key(_messages("AAAA"), "gpt-4o")
+    assert asyncio.run(cache.alookup(key)) is None
+    asyncio.run(cache.aupdate(key, AIMessage(content='{"action": []}', reasoning_content="thinking")))
+
+    restarted = LLMResponseCache.from_path(path)
+    message = asyncio.run(restarted.alookup(key))
+    assert message.content == '{"action": []}' and message.reasoning_content == "thinking"
+    assert restarted.lookup(key).content == '{"action": []}'
+    assert restarted.stats_dict() == {"hits": 2, "memory_hits": 1, "misses": 0, "writes": 0, "hit_rate": 1.0}
+    assert cache.stats.misses == 1 and cache.stats.writes == 1
+
+
+def test_sqlite_backend_evicts_by_size(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.sqlite"), max_entries=2)
+    for key in ("a", "b", "c"):
+        backend.set(key, key)
+        time.sleep(0.01)
+    assert len(backend) == 2
+    assert backend.get("a") is None and backend.get("c")[1] == "c"
+
+
+def test_cache_key_ignores_the_current_time(monkeypatch):
+    from datetime import datetime
+
+    from browser_use.browser.views import BrowserState
+    from browser_use.dom.views import DOMElementNode
+
+    from src.agent import custom_prompts
+    from src.agent.custom_prompts import CustomAgentMessagePrompt, CustomSystemPrompt
+    from src.agent.custom_views import CustomAgentStepInfo
+
+    root = DOMElementNode(tag_name="body", xpath="html/body", attributes={}, children=[], is_visible=True, parent=None)
+    state = BrowserState(element_tree=root, selector_map={}, url="https://a.com", title="", tabs=[],
+                         screenshot="AAAA")
+    step_info = CustomAgentStepInfo(step_number=1, max_steps=10, task="find flights", add_infos="", memory="",
+                                    task_progress="", future_plans="")
+
+    def step_messages(now: datetime, cacheable_layout: bool):
+        class FixedDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return now
+
+        monkeypatch.setattr(custom_prompts, "datetime", FixedDatetime)
+        return [
+            CustomSystemPrompt("actions", current_date=now, include_current_time=not cacheable_layout)
+            .get_system_message(),
+            CustomAgentMessagePrompt(state, step_info=step_info, cacheable_layout=cacheable_layout).get_user_message(),
+        ]
+
+    for cacheable_layout in (False, True):
+        earlier = step_messages(datetime(2025, 1, 1, 9, 30), cacheable_layout)
+        later = step_messages(datetime(2025, 1, 1, 9, 31), cacheable_layout)
+        assert earlier != later
+        assert make_cache_key(earlier, "gpt-4o") == make_cache_key(later, "gpt-4o")
+
+    cache = LLMResponseCache()
+    cache.update(make_cache_key(earlier, "gpt-4o"), AIMessage(content="cached"))
+    assert cache.lookup(make_cache_key(later, "gpt-4o")).content == "cached"
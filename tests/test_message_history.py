@@ -0,0 +1,76 @@
+import sys
+import time
+
+sys.path.append(".")
+
+from browser_use.agent.message_manager.views import MessageHistory, MessageMetadata
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from src.agent.custom_massage_manager import CustomMassageManager
+from src.agent.custom_prompts import CustomAgentMessagePrompt, CustomSystemPrompt
+from src.agent.custom_views import CustomMessageHistory
+
+
+def _fill(history, steps: int, tokens: int = 100):
+    history.add_message(SystemMessage(content="system"), MessageMetadata(input_tokens=tokens))
+    for i in range(steps):
+        history.add_message(HumanMessage(content=f"state {i}"), MessageMetadata(input_tokens=tokens))
+        history.add_message(AIMessage(content=f"action {i}"), MessageMetadata(input_tokens=tokens))
+
+
+def test_history_keeps_totals_and_human_index():
+    history = CustomMessageHistory()
+    _fill(history, 3)
+    assert history.total_tokens == 700
+    assert history.human_message_index(-1) == 5
+    assert history.human_message_index(-3) == 1
+    assert history.human_message_index(-4) is None
+
+    history.remove_message(history.human_message_index(-1))
+    history.remove_message(1)
+    assert [m.message.content for m in history.messages] == ["system", "action 0", "state 1", "action 1", "action 2"]
+    assert history.total_tokens == 500
+    assert history.human_message_index(-1) == 2
+    history.remove_message(history.human_message_index(-1))
+    assert history.human_message_index(-1) is None
+
+
+def test_message_manager_trims_and_removes_state_messages():
+    manager = CustomMassageManager(
+        llm=None,
+        task="task",
+        action_descriptions="",
+        system_prompt_class=CustomSystemPrompt,
+        agent_prompt_class=CustomAgentMessagePrompt,
+        max_input_tokens=10_000,
+    )
+    system_tokens = manager.history.total_tokens
+    for i in range(50):
+        manager._add_message_with_tokens(HumanMessage(content="x" * 300))
+        manager._add_message_with_tokens(AIMessage(content="y" * 300))
+    manager._remove_state_message_by_index(-1)
+    assert isinstance(manager.history.messages[-1].message, AIMessage)
+    assert isinstance(manager.history.messages[-2].message, AIMessage)
+
+    manager.max_input_tokens = system_tokens + 1000
+    manager.cut_messages()
+    assert manager.history.total_tokens <= manager.max_input_tokens
+    assert isinstance(manager.history.messages[0].message, SystemMessage)
+    assert manager.history.total_tokens == sum(m.metadata.input_tokens for m in manager.history.messages)
+
+
+def benchmark_trimming(sizes=(1_000, 10_000, 100_000), removals: int = 1_000) -> None:
+    """python tests/test_message_history.py - cost of trimming the oldest message, list vs deque backed history"""
+    for size in sizes:
+        for history_class in (MessageHistory, CustomMessageHistory):
+            history = history_class()
+            _fill(history, size // 2)
+            start = time.perf_counter()
+            for _ in range(removals):
+                history.remove_message(1)
+            elapsed = time.perf_counter() - start
+            print(f"{size:>7} messages  {history_class.__name__:<21} {elapsed / removals * 1e6:6.2f} us per removal")
+
+
+if __name__ == "__main__":
+    benchmark_trimming()
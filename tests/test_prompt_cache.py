@@ -0,0 +1,125 @@
+import sys
+from datetime import datetime
+
+sys.path.append(".")
+
+from browser_use.agent.prompts import AgentMessagePrompt
+from browser_use.browser.views import BrowserState
+from browser_use.dom.views import DOMElementNode
+from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import AIMessage
+
+from src.agent.custom_massage_manager import CustomMassageManager
+from src.agent.custom_prompts import CustomAgentMessagePrompt, CustomSystemPrompt
+from src.agent.custom_views import CustomAgentStepInfo
+from src.utils.prompt_cache import PromptCacheStats, usage_cache_tokens
+
+
+def _manager(llm=None, **kwargs) -> CustomMassageManager:
+    return CustomMassageManager(
+        llm=llm,
+        task="book a table",
+        action_descriptions="actions",
+        system_prompt_class=CustomSystemPrompt,
+        agent_prompt_class=CustomAgentMessagePrompt,
+        prompt_caching=True,
+        add_infos="for two people",
+        **kwargs,
+    )
+
+
+def _add_step(manager: CustomMassageManager, step_number: int) -> None:
+    root = DOMElementNode(tag_name="body", xpath="html/body", attributes={}, children=[], is_visible=True, parent=None)
+    step_info = CustomAgentStepInfo(step_number=step_number, max_steps=10, task="book a table", add_infos="for two people",
+                                    memory="", task_progress="", future_plans="")
+    state = BrowserState(element_tree=root, selector_map={}, url="https://a.com", title="", tabs=[])
+    manager.add_state_message(state, step_info=step_info)
+
+
+def test_system_prompt_without_time_is_stable():
+    prompts = [
+        CustomSystemPrompt("actions", current_date=datetime(2025, 1, 1, 10, minute), include_current_time=False)
+        .get_system_message().content
+        for minute in (1, 2)
+    ]
+    assert prompts[0] == prompts[1] and "10:01" not in prompts[0]
+    assert "10:01" in CustomSystemPrompt("actions", current_date=datetime(2025, 1, 1, 10, 1)).get_system_message().content
+
+
+def test_stable_prefix_and_volatile_tail():
+    manager = _manager()
+    _add_step(manager, 1)
+    first = manager.get_messages()
+    manager._remove_state_message_by_index(-1)
+    manager._add_message_with_tokens(AIMessage(content='{"action": []}'))
+    _add_step(manager, 2)
+    second = manager.get_messages()
+
+    assert [m.content for m in first[:2]] == [m.content for m in second[:2]]
+    assert "1. Task: book a table" in first[1].content and "for two people" in first[1].content
+    state = second[-1].content
+    assert "book a table" not in state
+    assert state.rstrip().splitlines()[-2] == "Current step: 2/10"
+
+
+def test_trimming_keeps_the_prefix():
+    manager = _manager(max_input_tokens=1200)
+    for step in range(1, 6):
+        _add_step(manager, step)
+        manager._remove_state_message_by_index(-1)
+        manager._add_message_with_tokens(AIMessage(content="x" * 600))
+        manager.cut_messages()
+    assert manager.get_messages()[1].content.startswith("1. Task: book a table")
+
+
+def test_anthropic_cache_breakpoints():
+    manager = _manager(llm=ChatAnthropic(model="claude-3-5-sonnet-20241022", api_key="test"))
+    manager._add_message_with_tokens(AIMessage(content='{"action": []}'))
+    _add_step(manager, 2)
+    messages = manager.get_messages()
+    marked = [i for i, m in enumerate(messages) if isinstance(m.content, list)
+              and any("cache_control" in block for block in m.content)]
+    assert marked == [1, 2]
+    # the stored history is not modified
+    assert isinstance(manager.history.messages[1].message.content, str)
+
+
+def test_prompt_cache_stats():
+    stats = PromptCacheStats()
+    stats.record(AIMessage(content="", usage_metadata={
+        "input_tokens": 1000, "output_tokens": 10, "total_tokens": 1010,
+        "input_token_details": {"cache_read": 800, "cache_creation": 0},
+    }))
+    deepseek = AIMessage(content="", usage_metadata={"input_tokens": 1000, "output_tokens": 10, "total_tokens": 1010},
+                         response_metadata={"token_usage": {"prompt_cache_hit_tokens": 600}})
+    assert usage_cache_tokens(deepseek) == (1000, 600, 0)
+    stats.record(deepseek)
+    stats.record(AIMessage(content="cached response without usage"))
+    assert stats.stats_dict()["hit_rate"] == 0.7 and stats.requests == 2
+
+
+def test_merging_human_messages_leaves_the_history_unchanged():
+    manager = _manager()
+    task_message = manager.get_messages()[1].content
+    merged_lengths = []
+    for step in range(1, 4):
+        _add_step(manager, step)
+        merged = manager.merge_successive_human_messages(manager.get_messages())
+        merged_lengths.append(len(merged[-1].content))
+        assert merged[-1].content.startswith(task_message)
+        manager._remove_state_message_by_index(-1)
+
+    assert manager.get_messages()[1].content == task_message
+    assert len(set(merged_lengths)) == 1
+
+
+def test_other_prompt_classes_get_the_default_task_message():
+    manager = CustomMassageManager(
+        llm=None,
+        task="book a table",
+        action_descriptions="actions",
+        system_prompt_class=CustomSystemPrompt,
+        agent_prompt_class=AgentMessagePrompt,
+        prompt_caching=True,
+    )
+    assert manager.history.messages[-1].message.content.startswith("Your ultimate task is: book a table")
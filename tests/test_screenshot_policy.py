@@ -0,0 +1,107 @@
+import base64
+import io
+import sys
+
+sys.path.append(".")
+
+from PIL import Image, ImageDraw
+
+from src.agent.screenshot_policy import ScreenshotPolicy, estimate_image_tokens, image_size_from_data_url
+
+
+def _screenshot(label: str = "", size=(1280, 1100), dark_box=None, photo=False) -> str:
+    image = Image.new("RGB", size, "white")
+    if photo:
+        image = Image.merge("RGB", [Image.effect_noise(size, 60)] * 3)
+    draw = ImageDraw.Draw(image)
+    for y in range(0, size[1], 40):
+        draw.rectangle((40, y, 40 + (y * 7) % (size[0] - 80), y + 20), fill=(90, 90, 160))
+    if dark_box:
+        draw.rectangle(dark_box, fill="black")
+    draw.text((60, 60), label, fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def test_unchanged_page_is_skipped_until_it_changes():
+    policy = ScreenshotPolicy(max_skipped_steps=2)
+    assert policy.process(_screenshot(), "https://a.com", step_number=1).data is not None
+    skipped = policy.process(_screenshot("typed"), "https://a.com", step_number=2)
+    assert skipped.data is None and "step 1" in skipped.note
+    # a different url, a visible change or a failed action always sends the image
+    assert policy.process(_screenshot("typed"), "https://a.com/next", step_number=3).data is not None
+    assert policy.process(_screenshot(dark_box=(500, 300, 1000, 800)), "https://a.com/next", step_number=4).data
+    assert policy.process(_screenshot(dark_box=(500, 300, 1000, 800)), "https://a.com/next", force=True).data
+    assert policy.stats.skipped == 1 and policy.stats.sent == 4
+
+
+def test_skips_are_limited():
+    policy = ScreenshotPolicy(max_skipped_steps=2)
+    sent = [policy.process(_screenshot(), "https://a.com").data is not None for _ in range(6)]
+    assert sent == [True, False, False, True, False, False]
+
+
+def test_downscaled_jpeg_is_smaller():
+    policy = ScreenshotPolicy(max_width=640, image_format="jpeg", skip_unchanged=False)
+    original = _screenshot(photo=True)
+    processed = policy.process(original, "https://a.com")
+    assert processed.media_type == "image/jpeg" and (processed.width, processed.height) == (640, 550)
+    assert len(processed.data) < len(original)
+    assert image_size_from_data_url(f"data:image/jpeg;base64,{processed.data}") == (640, 550)
+
+
+def test_crop_around_focus_boxes_in_css_pixels():
+    policy = ScreenshotPolicy(max_width=None, crop_to_focus=True, crop_margin=50, skip_unchanged=False)
+    # device scale factor 2: a 640 css pixel viewport in a 1280 pixel screenshot
+    processed = policy.process(_screenshot(), "https://a.com", focus_boxes=[{"x": 100, "y": 100, "width": 100,
+                                                                              "height": 20}], viewport_width=640)
+    assert (processed.width, processed.height) == (400, 240)
+    assert "100,100 to 500,340" in processed.note
+    # boxes covering most of the viewport are not cropped
+    processed = policy.process(_screenshot(), "https://a.com", focus_boxes=[{"x": 0, "y": 0, "width": 600,
+                                                                              "height": 500}], viewport_width=640)
+    assert processed.width == 1280 and processed.note is None
+
+
+def test_image_token_estimates():
+    assert estimate_image_tokens(1280, 1100) == 1878
+    assert estimate_image_tokens(1024, 880) == 1202
+    assert estimate_image_tokens(1280, 1100, tiled=True) == 765
+    assert estimate_image_tokens(512, 400, tiled=True) == 255
+
+
+def test_state_message_uses_policy():
+    from browser_use.browser.views import BrowserState
+    from browser_use.dom.views import DOMElementNode
+
+    from src.agent.custom_massage_manager import CustomMassageManager
+    from src.agent.custom_prompts import CustomAgentMessagePrompt, CustomSystemPrompt
+    from src.agent.custom_views import CustomAgentStepInfo
+
+    manager = CustomMassageManager(
+        llm=None,
+        task="fill the form",
+        action_descriptions="",
+        system_prompt_class=CustomSystemPrompt,
+        agent_prompt_class=CustomAgentMessagePrompt,
+        screenshot_policy=ScreenshotPolicy(max_width=640),
+    )
+    root = DOMElementNode(tag_name="body", xpath="html/body", attributes={}, children=[], is_visible=True, parent=None)
+    step_info = CustomAgentStepInfo(step_number=1, max_steps=10, task="fill the form", add_infos="", memory="",
+                                    task_progress="", future_plans="")
+    state = BrowserState(element_tree=root, selector_map={}, url="https://a.com", title="", tabs=[],
+                         screenshot=_screenshot())
+
+    manager.add_state_message(state, step_info=step_info)
+    text, image = manager.get_messages()[-1].content
+    assert image["image_url"]["url"].startswith("data:image/jpeg;base64,")
+    text_tokens = manager._count_text_tokens(text["text"])
+    assert manager.history.messages[-1].metadata.input_tokens == text_tokens + estimate_image_tokens(640, 550)
+    # the agent history keeps the original screenshot
+    assert state.screenshot.startswith("iVBOR")
+
+    manager._remove_state_message_by_index(-1)
+    manager.add_state_message(state, step_info=step_info)
+    content = manager.get_messages()[-1].content
+    assert isinstance(content, str) and "Screenshot left out" in content
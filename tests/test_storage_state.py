@@ -0,0 +1,165 @@
+import asyncio
+import json
+import sys
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+sys.path.append(".")
+
+from src.browser.storage_state import StorageStateCache
+from src.runner import batch_runner
+from src.runner.batch_runner import DONE_SETUP_INFO, SETUP_INSTRUCTIONS, BatchRunner, BatchTask
+from src.runner.gherkin_parser import expand_scenarios, parse_feature
+from src.runner.gherkin_runner import scenario_to_task
+
+STATE = {
+    "cookies": [{"name": "sid", "value": "abc", "domain": "example.com", "path": "/", "expires": -1,
+                 "httpOnly": True, "secure": True, "sameSite": "Lax"}],
+    "origins": [{"origin": "https://example.com", "localStorage": [{"name": "token", "value": "t"}]}],
+}
+
+
+def test_snapshot_round_trip_and_expiry(tmp_path):
+    cache = StorageStateCache(str(tmp_path), ttl=3600)
+    assert cache.load("admin") is None
+    cache.save("admin", STATE)
+    assert cache.load("admin") == STATE
+
+    cache.save("expired", STATE, ttl=-1)
+    assert cache.load("expired") is None
+    assert not (tmp_path / "expired.json").exists()
+
+    # names that need escaping do not collide
+    assert cache.path("a/b") != cache.path("a_b")
+
+
+def test_fixture_tag_moves_background_into_setup():
+    feature = parse_feature(
+        "Feature: Orders\n"
+        "  Background:\n"
+        "    Given I am signed in as \"admin\"\n"
+        "  @fixture:admin\n"
+        "  Scenario: List orders\n"
+        "    Then I see the orders\n"
+    )
+    task = scenario_to_task(expand_scenarios(feature)[0])
+    assert task.fixture == "admin" and task.setup == 'Given I am signed in as "admin"'
+    assert "Background" not in task.add_infos
+    assert task.infos().endswith('Setup (do these steps first):\nGiven I am signed in as "admin"')
+    assert "do not sign in again" in task.infos(restored=True)
+
+
+def test_fixture_setup_runs_once_and_is_restored(tmp_path, monkeypatch):
+    tasks_run = []
+    restored = []
+
+    class FakeContext:
+        def __init__(self):
+            self.state = {"cookies": [], "origins": []}
+
+        async def restore_storage_state(self, storage_state):
+            restored.append(storage_state)
+            self.state = storage_state
+
+        async def save_storage_state(self):
+            return self.state
+
+    class FakeHistory:
+        history = [None]
+
+        def is_done(self):
+            return True
+
+        def errors(self):
+            return []
+
+        def final_result(self):
+            return "PASSED"
+
+    class FakeAgent:
+        def __init__(self, task, add_infos, browser_context, **kwargs):
+            self.task = task
+            self.add_infos = add_infos
+            self.browser_context = browser_context
+
+        async def run(self, max_steps):
+            tasks_run.append((self.task, self.add_infos))
+            await asyncio.sleep(0.01)
+            # the setup signs in, the task itself signs out again
+            self.browser_context.state = STATE if self.task.startswith(SETUP_INSTRUCTIONS) else {}
+            return FakeHistory()
+
+        def save_history(self, path):
+            pass
+
+    class FakePool:
+        @asynccontextmanager
+        async def lease(self, browser_config, context_config):
+            yield SimpleNamespace(browser=None, browser_context=FakeContext())
+
+        def prewarm(self, browser_config, context_config):
+            pass
+
+        async def close(self):
+            pass
+
+    monkeypatch.setattr(batch_runner, "CustomAgent", FakeAgent)
+    monkeypatch.setattr(batch_runner, "CustomController", lambda: None)
+    cache = StorageStateCache(str(tmp_path / "states"))
+    runner = BatchRunner(llm=None, output_dir=str(tmp_path), concurrency=4, browser_pool=FakePool(),
+                         storage_states=cache)
+    tasks = [BatchTask(task_id=str(i), task="check orders", fixture="admin", setup="Sign in") for i in range(4)]
+    asyncio.run(runner.run(tasks))
+
+    # one task ran the setup on its own, the others waited for its snapshot
+    setups = [task for task, _ in tasks_run if task.startswith(SETUP_INSTRUCTIONS)]
+    assert setups == [f"{SETUP_INSTRUCTIONS}\n\nSign in"]
+    assert sum(DONE_SETUP_INFO in infos for _, infos in tasks_run) == 1
+    # the snapshot holds the state after the setup, not after the task signed out
+    assert cache.load("admin") == STATE
+    assert len(restored) == 3 and restored[0] == STATE
+    results = [json.loads(line) for line in open(runner.results_path)]
+    assert sum(result["fixture_restored"] for result in results) == 3
+    assert all(result["success"] for result in results)
+
+
+def test_failed_setup_fails_the_task_without_a_snapshot(tmp_path, monkeypatch):
+    class FakeHistory:
+        history = [None]
+
+        def is_done(self):
+            return True
+
+        def errors(self):
+            return []
+
+        def final_result(self):
+            return "FAILED: could not sign in"
+
+    class FakeAgent:
+        def __init__(self, task, **kwargs):
+            assert task.startswith(SETUP_INSTRUCTIONS)
+
+        async def run(self, max_steps):
+            return FakeHistory()
+
+    class FakePool:
+        @asynccontextmanager
+        async def lease(self, browser_config, context_config):
+            yield SimpleNamespace(browser=None, browser_context=None)
+
+        def prewarm(self, browser_config, context_config):
+            pass
+
+        async def close(self):
+            pass
+
+    monkeypatch.setattr(batch_runner, "CustomAgent", FakeAgent)
+    monkeypatch.setattr(batch_runner, "CustomController", lambda: None)
+    cache = StorageStateCache(str(tmp_path / "states"))
+    runner = BatchRunner(llm=None, output_dir=str(tmp_path), browser_pool=FakePool(), storage_states=cache)
+    asyncio.run(runner.run([BatchTask(task_id="a", task="check orders", fixture="admin", setup="Sign in")]))
+
+    result = json.loads(open(runner.results_path).readline())
+    assert not result["success"] and result["final_result"] == "FAILED: could not sign in"
+    assert cache.load("admin") is None
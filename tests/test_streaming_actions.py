@@ -0,0 +1,177 @@
+import asyncio
+import json
+import sys
+from types import SimpleNamespace
+
+sys.path.append(".")
+
+import pytest
+from browser_use.agent.views import ActionResult
+from browser_use.browser.views import BrowserState
+from browser_use.dom.views import DOMElementNode
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+from src.agent.custom_agent import CustomAgent
+from src.agent.custom_prompts import CustomAgentMessagePrompt, CustomSystemPrompt
+from src.agent.custom_views import CustomAgentStepInfo
+from src.controller.custom_controller import CustomController
+from src.utils.agent_state import AgentState, AgentStoppedError
+
+RESPONSE = json.dumps({
+    "current_state": {
+        "prev_action_evaluation": "Unknown",
+        "important_contents": "",
+        "task_progress": "",
+        "future_plans": "1. fill the form",
+        "thought": "I type the name and the email.",
+        "summary": "Fill the form",
+    },
+    "action": [
+        {"input_text": {"index": 1, "text": "Ada"}},
+        {"input_text": {"index": 2, "text": "ada@example.com"}},
+        {"done": {"text": "filled"}},
+    ],
+})
+
+
+class SlowStreamingLLM:
+    """Streams the response in small chunks and records when it finished"""
+
+    def __init__(self, events: list, response: str = RESPONSE):
+        self.events = events
+        self.response = response
+
+    async def astream(self, messages):
+        for start in range(0, len(self.response), 16):
+            await asyncio.sleep(0.001)
+            yield AIMessageChunk(content=self.response[start:start + 16])
+        self.events.append("stream finished")
+
+
+class RecordingController(CustomController):
+    def __init__(self, events: list):
+        super().__init__()
+        self.events = events
+
+    async def act(self, action, browser_context):
+        name, params = next(iter(action.model_dump(exclude_unset=True).items()))
+        self.events.append(name)
+        return ActionResult(is_done=name == "done", extracted_content=params.get("text"))
+
+
+def _agent(events: list) -> CustomAgent:
+    session = SimpleNamespace(cached_state=SimpleNamespace(selector_map={}))
+
+    async def get_session():
+        return session
+
+    async def remove_highlights():
+        pass
+
+    async def get_state():
+        return SimpleNamespace(selector_map={})
+
+    browser_context = SimpleNamespace(
+        config=SimpleNamespace(wait_between_actions=0),
+        get_session=get_session,
+        remove_highlights=remove_highlights,
+        get_state=get_state,
+    )
+    agent = CustomAgent(
+        task="fill the form",
+        llm=GenericFakeChatModel(messages=iter([AIMessage(content=RESPONSE)])),
+        browser_context=browser_context,
+        controller=RecordingController(events),
+        system_prompt_class=CustomSystemPrompt,
+        agent_prompt_class=CustomAgentMessagePrompt,
+        generate_gif=False,
+        stream_actions=True,
+    )
+    agent.llm = SlowStreamingLLM(events)
+    return agent
+
+
+def test_actions_run_while_streaming():
+    events = []
+    agent = _agent(events)
+    root = DOMElementNode(tag_name="body", xpath="html/body", attributes={}, children=[], is_visible=True, parent=None)
+    state = BrowserState(element_tree=root, selector_map={}, url="https://a.com", title="", tabs=[])
+
+    model_output, result = asyncio.run(agent._stream_next_action([HumanMessage(content="state")], state))
+
+    assert events.index("input_text") < events.index("stream finished")
+    assert [name for name in events if name != "stream finished"] == ["input_text", "input_text", "done"]
+    assert result[-1].is_done and result[-1].extracted_content == "filled"
+    assert len(model_output.action) == 3 and model_output.current_state.summary == "Fill the form"
+    assert agent.message_manager.history.messages[-1].message.content == RESPONSE
+
+
+class StalledStreamingLLM:
+    """Never sends a chunk"""
+
+    async def astream(self, messages):
+        await asyncio.Event().wait()
+        yield AIMessageChunk(content=RESPONSE)
+
+
+def test_stop_cancels_a_stalled_stream():
+    events = []
+    agent = _agent(events)
+    agent.agent_state = AgentState()
+    agent.llm = StalledStreamingLLM()
+    root = DOMElementNode(tag_name="body", xpath="html/body", attributes={}, children=[], is_visible=True, parent=None)
+    state = BrowserState(element_tree=root, selector_map={}, url="https://a.com", title="", tabs=[])
+
+    async def stop_soon():
+        await asyncio.sleep(0.01)
+        agent.agent_state.request_stop()
+
+    async def main():
+        asyncio.create_task(stop_soon())
+        await asyncio.wait_for(agent._stream_next_action([HumanMessage(content="state")], state), timeout=5)
+
+    with pytest.raises(AgentStoppedError):
+        asyncio.run(main())
+    assert events == []
+
+
+def test_failed_step_captures_the_state_again():
+    events = []
+    agent = _agent(events)
+    agent.stream_actions = False
+    agent.llm = GenericFakeChatModel(messages=iter([AIMessage(content="not json")] * 2))
+    root = DOMElementNode(tag_name="body", xpath="html/body", attributes={}, children=[], is_visible=True, parent=None)
+    captures = []
+
+    async def get_state(use_vision=True):
+        captures.append(use_vision)
+        return BrowserState(element_tree=root, selector_map={}, url="https://a.com", title="", tabs=[])
+
+    agent.browser_context.get_state = get_state
+    step_info = CustomAgentStepInfo(task="fill the form", add_infos="", step_number=1, max_steps=5,
+                                    memory="", task_progress="", future_plans="")
+
+    async def main():
+        await agent.step(step_info)
+        await agent.step(step_info)
+
+    asyncio.run(main())
+    assert agent.consecutive_failures == 2
+    assert len(captures) == 2
+
+
+def test_actions_that_ran_are_kept_when_the_response_does_not_parse():
+    events = []
+    agent = _agent(events)
+    response = json.loads(RESPONSE)
+    response["action"][2] = {"input_text": {"text": "no index"}}
+    agent.llm = SlowStreamingLLM(events, json.dumps(response))
+    root = DOMElementNode(tag_name="body", xpath="html/body", attributes={}, children=[], is_visible=True, parent=None)
+    state = BrowserState(element_tree=root, selector_map={}, url="https://a.com", title="", tabs=[])
+
+    model_output, result = asyncio.run(agent._stream_next_action([HumanMessage(content="state")], state))
+
+    assert [name for name in events if name != "stream finished"] == ["input_text", "input_text"]
+    assert len(model_output.action) == 2 and len(result) == 2
+    assert model_output.current_state.summary == "Fill the form"
@@ -0,0 +1,74 @@
+import sys
+from types import SimpleNamespace
+
+sys.path.append(".")
+
+import pytest
+
+from src.utils import token_counter
+from src.utils.token_counter import TokenCountCache, count_text_tokens
+
+
+class FakeLLM:
+    def __init__(self, model_name, fail=False):
+        self.model_name = model_name
+        self.fail = fail
+        self.calls = 0
+
+    def get_num_tokens(self, text):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("tokenizer unavailable")
+        return len(text.split())
+
+
+@pytest.fixture(autouse=True)
+def no_failed_tokenizers(monkeypatch):
+    monkeypatch.setattr(token_counter, "_failed_tokenizers", {})
+
+
+def test_token_counts_are_memoized_and_shared(monkeypatch):
+    monkeypatch.setattr(token_counter, "_tiktoken_tokenizer", lambda llm: None)
+    cache = TokenCountCache(max_entries=2)
+    first, second = FakeLLM("gpt-4o"), FakeLLM("gpt-4o")
+    assert count_text_tokens(first, "a b c", cache=cache) == 3
+    assert count_text_tokens(second, "a b c", cache=cache) == 3
+    assert first.calls == 1 and second.calls == 0
+    assert cache.hits == 1 and cache.misses == 1
+
+    # another model does not share the count
+    other = FakeLLM("gpt-4o-mini")
+    count_text_tokens(other, "a b c", cache=cache)
+    assert other.calls == 1
+
+    count_text_tokens(first, "d e", cache=cache)
+    assert len(cache) == 2
+
+
+def test_local_tokenizer_is_used_first(monkeypatch):
+    counted = []
+
+    def count(text):
+        counted.append(text)
+        return 7
+
+    monkeypatch.setattr(token_counter, "_tiktoken_tokenizer", lambda llm: ("tiktoken:fake", count))
+    llm = FakeLLM("claude-3-5-sonnet")
+    assert count_text_tokens(llm, "a b c", cache=TokenCountCache()) == 7
+    assert counted == ["a b c"] and llm.calls == 0
+
+
+def test_failing_tokenizer_is_retried_later(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(token_counter, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    monkeypatch.setattr(token_counter, "_tiktoken_tokenizer", lambda llm: None)
+    llm = FakeLLM("offline", fail=True)
+    assert count_text_tokens(llm, "x" * 30, estimated_characters_per_token=3, cache=TokenCountCache()) == 10
+    assert count_text_tokens(llm, "y" * 9, estimated_characters_per_token=3, cache=TokenCountCache()) == 3
+    assert llm.calls == 1
+
+    # the failure may have been transient
+    now[0] += token_counter.TOKENIZER_RETRY_SECONDS + 1
+    llm.fail = False
+    assert count_text_tokens(llm, "a b", cache=TokenCountCache()) == 2
+    assert llm.calls == 2
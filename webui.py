@@ -8,11 +8,15 @@ import os
 import glob
 import asyncio
 import argparse
+import secrets
 import os
 
 logger = logging.getLogger(__name__)
 
 import gradio as gr
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 
 from browser_use.agent.service import Agent
 from playwright.async_api import async_playwright
@@ -27,29 +31,96 @@ from src.utils.agent_state import AgentState
 
 from src.utils import utils
 from src.agent.custom_agent import CustomAgent
+from src.agent.history_store import bundle_compact_history
 from src.browser.custom_browser import CustomBrowser
+from src.browser.browser_pool import BrowserPool, BrowserLease
+from src.browser.live_view import MJPEG_MEDIA_TYPE, LiveViewHub, mjpeg_stream
 from src.agent.custom_prompts import CustomSystemPrompt, CustomAgentMessagePrompt
 from src.browser.custom_context import BrowserContextConfig, CustomBrowserContext
 from src.controller.custom_controller import CustomController
 from gradio.themes import Citrus, Default, Glass, Monochrome, Ocean, Origin, Soft, Base
 from src.utils.default_config_settings import default_config, load_config_from_file, save_config_to_file, save_current_config, update_ui_from_config
-from src.utils.utils import update_model_dropdown, get_latest_files, capture_screenshot
+from src.utils.utils import update_model_dropdown, get_latest_files
 
 
-# Global variables for persistence
-_global_browser = None
-_global_browser_context = None
+# Browsers shared by all UI sessions, every run leases its own isolated context
+_browser_pool = BrowserPool(
+    max_browsers=int(os.getenv("BROWSER_POOL_SIZE", "2")),
+    max_contexts_per_browser=int(os.getenv("BROWSER_POOL_CONTEXTS_PER_BROWSER", "4")),
+    idle_timeout=float(os.getenv("BROWSER_POOL_IDLE_TIMEOUT", "300")),
+    warm_contexts=int(os.getenv("BROWSER_POOL_WARM_CONTEXTS", "0")),
+    recycle_after_contexts=int(os.getenv("BROWSER_POOL_RECYCLE_AFTER", "0")),
+    max_browser_rss_mb=float(os.getenv("BROWSER_POOL_MAX_RSS_MB", "0")),
+)
 
-# Create the global agent state instance
-_global_agent_state = AgentState()
+# Screencasts of the running sessions, shared by everyone watching the same session
+_live_view = LiveViewHub(
+    max_fps=float(os.getenv("LIVE_VIEW_MAX_FPS", "10")),
+    max_width=int(os.getenv("LIVE_VIEW_MAX_WIDTH", "1280")),
+    max_height=int(os.getenv("LIVE_VIEW_MAX_HEIGHT", "1280")),
+    quality=int(os.getenv("LIVE_VIEW_QUALITY", "60")),
+)
+
+# Per UI session: stop state and task of the running agent, the leased browser context and the token
+# of the live view of the current run, only the page of that run knows it
+_agent_states: dict[str, AgentState] = {}
+_agent_runs: dict[str, asyncio.Task] = {}
+_browser_leases: dict[str, BrowserLease] = {}
+_live_view_tokens: dict[str, str] = {}
+# seconds a closed tab's agent gets to stop at its next step before it is cancelled
+AGENT_STOP_TIMEOUT = 30.0
+
+
+def get_session_id(request: gr.Request | None) -> str:
+    return request.session_hash if request is not None and request.session_hash else "default"
+
+
+def get_agent_state(session_id: str) -> AgentState:
+    if session_id not in _agent_states:
+        _agent_states[session_id] = AgentState()
+    return _agent_states[session_id]
+
+
+async def get_browser_lease(session_id, browser_config, context_config) -> BrowserLease:
+    """Reuse the context kept open for this session or lease a new one from the pool"""
+    lease = _browser_leases.get(session_id)
+    if lease is None:
+        lease = await _browser_pool.acquire(browser_config, context_config)
+        _browser_leases[session_id] = lease
+    return lease
 
-async def stop_agent():
-    """Request the agent to stop and update UI with enhanced feedback"""
-    global _global_agent_state, _global_browser_context, _global_browser
 
+async def close_session_browser(request: gr.Request = None):
+    """Return the browser context of this session to the pool"""
+    lease = _browser_leases.pop(get_session_id(request), None)
+    if lease:
+        await _browser_pool.release(lease)
+
+
+async def close_session(request: gr.Request = None):
+    """Forget a closed browser tab: stop its agent, wait until it let go of the browser and return its context"""
+    session_id = get_session_id(request)
+    _live_view_tokens.pop(session_id, None)
+    agent_state = _agent_states.pop(session_id, None)
+    if agent_state is not None:
+        agent_state.request_stop()
+    run = _agent_runs.get(session_id)
+    if run is not None and run is not asyncio.current_task():
+        _, pending = await asyncio.wait({run}, timeout=AGENT_STOP_TIMEOUT)
+        if pending:
+            logger.warning(f"Agent of closed session {session_id} did not stop, cancelling it")
+            run.cancel()
+            await asyncio.wait({run})
+    await close_session_browser(request)
+
+
+async def stop_agent(request: gr.Request = None):
+    """Request the agent to stop and update UI with enhanced feedback"""
     try:
-        # Request stop
-        _global_agent_state.request_stop()
+        # Request stop, the state only exists while an agent of this session runs
+        agent_state = _agent_states.get(get_session_id(request))
+        if agent_state is not None:
+            agent_state.request_stop()
 
         # Update UI immediately
         message = "Stop requested - the agent will halt at the next safe point"
@@ -92,10 +163,12 @@ async def run_browser_agent(
         max_steps,
         use_vision,
         max_actions_per_step,
-        tool_calling_method
+        tool_calling_method,
+        session_id="default"
 ):
-    global _global_agent_state
-    _global_agent_state.clear_stop()  # Clear any previous stop requests
+    agent_state = get_agent_state(session_id)
+    agent_state.clear_stop()  # Clear any previous stop requests
+    run = _agent_runs[session_id] = asyncio.current_task()
 
     try:
         # Disable recording if the checkbox is unchecked
@@ -138,7 +211,8 @@ async def run_browser_agent(
                 max_steps=max_steps,
                 use_vision=use_vision,
                 max_actions_per_step=max_actions_per_step,
-                tool_calling_method=tool_calling_method
+                tool_calling_method=tool_calling_method,
+                session_id=session_id
             )
         elif agent_type == "custom":
             final_result, errors, model_actions, model_thoughts, trace_file, history_file = await run_custom_agent(
@@ -157,7 +231,9 @@ async def run_browser_agent(
                 max_steps=max_steps,
                 use_vision=use_vision,
                 max_actions_per_step=max_actions_per_step,
-                tool_calling_method=tool_calling_method
+                tool_calling_method=tool_calling_method,
+                agent_state=agent_state,
+                session_id=session_id
             )
         else:
             raise ValueError(f"Invalid agent type: {agent_type}")
@@ -202,6 +278,12 @@ async def run_browser_agent(
             gr.update(value="Stop", interactive=True),  # Re-enable stop button
             gr.update(interactive=True)    # Re-enable run button
         )
+    finally:
+        # a later run of the session starts with a new state
+        if _agent_states.get(session_id) is agent_state:
+            del _agent_states[session_id]
+        if _agent_runs.get(session_id) is run:
+            del _agent_runs[session_id]
 
 
 async def run_org_agent(
@@ -219,14 +301,10 @@ async def run_org_agent(
         max_steps,
         use_vision,
         max_actions_per_step,
-        tool_calling_method
+        tool_calling_method,
+        session_id="default"
 ):
     try:
-        global _global_browser, _global_browser_context, _global_agent_state
-        
-        # Clear any previous stop request
-        _global_agent_state.clear_stop()
-
         extra_chromium_args = [f"--window-size={window_w},{window_h}"]
         if use_own_browser:
             chrome_path = os.getenv("CHROME_PATH", None)
@@ -237,35 +315,31 @@ async def run_org_agent(
                 extra_chromium_args += [f"--user-data-dir={chrome_user_data}"]
         else:
             chrome_path = None
-            
-        if _global_browser is None:
-            _global_browser = Browser(
-                config=BrowserConfig(
-                    headless=headless,
-                    disable_security=disable_security,
-                    chrome_instance_path=chrome_path,
-                    extra_chromium_args=extra_chromium_args,
-                )
-            )
 
-        if _global_browser_context is None:
-            _global_browser_context = await _global_browser.new_context(
-                config=BrowserContextConfig(
-                    trace_path=save_trace_path if save_trace_path else None,
-                    save_recording_path=save_recording_path if save_recording_path else None,
-                    no_viewport=False,
-                    browser_window_size=BrowserContextWindowSize(
-                        width=window_w, height=window_h
-                    ),
-                )
-            )
+        lease = await get_browser_lease(
+            session_id,
+            browser_config=BrowserConfig(
+                headless=headless,
+                disable_security=disable_security,
+                chrome_instance_path=chrome_path,
+                extra_chromium_args=extra_chromium_args,
+            ),
+            context_config=BrowserContextConfig(
+                trace_path=save_trace_path if save_trace_path else None,
+                save_recording_path=save_recording_path if save_recording_path else None,
+                no_viewport=False,
+                browser_window_size=BrowserContextWindowSize(
+                    width=window_w, height=window_h
+                ),
+            ),
+        )
             
         agent = Agent(
             task=task,
             llm=llm,
             use_vision=use_vision,
-            browser=_global_browser,
-            browser_context=_global_browser_context,
+            browser=lease.browser,
+            browser_context=lease.browser_context,
             max_actions_per_step=max_actions_per_step,
             tool_calling_method=tool_calling_method
         )
@@ -290,13 +364,9 @@ async def run_org_agent(
     finally:
         # Handle cleanup based on persistence configuration
         if not keep_browser_open:
-            if _global_browser_context:
-                await _global_browser_context.close()
-                _global_browser_context = None
-
-            if _global_browser:
-                await _global_browser.close()
-                _global_browser = None
+            lease = _browser_leases.pop(session_id, None)
+            if lease:
+                await _browser_pool.release(lease)
 
 async def run_custom_agent(
         llm,
@@ -314,14 +384,11 @@ async def run_custom_agent(
         max_steps,
         use_vision,
         max_actions_per_step,
-        tool_calling_method
+        tool_calling_method,
+        agent_state=None,
+        session_id="default"
 ):
     try:
-        global _global_browser, _global_browser_context, _global_agent_state
-
-        # Clear any previous stop request
-        _global_agent_state.clear_stop()
-
         extra_chromium_args = [f"--window-size={window_w},{window_h}"]
         if use_own_browser:
             chrome_path = os.getenv("CHROME_PATH", None)
@@ -335,28 +402,24 @@ async def run_custom_agent(
 
         controller = CustomController()
 
-        # Initialize global browser if needed
-        if _global_browser is None:
-            _global_browser = CustomBrowser(
-                config=BrowserConfig(
-                    headless=headless,
-                    disable_security=disable_security,
-                    chrome_instance_path=chrome_path,
-                    extra_chromium_args=extra_chromium_args,
-                )
-            )
-
-        if _global_browser_context is None:
-            _global_browser_context = await _global_browser.new_context(
-                config=BrowserContextConfig(
-                    trace_path=save_trace_path if save_trace_path else None,
-                    save_recording_path=save_recording_path if save_recording_path else None,
-                    no_viewport=False,
-                    browser_window_size=BrowserContextWindowSize(
-                        width=window_w, height=window_h
-                    ),
-                )
-            )
+        # Lease an isolated context, reusing the one kept open for this session
+        lease = await get_browser_lease(
+            session_id,
+            browser_config=BrowserConfig(
+                headless=headless,
+                disable_security=disable_security,
+                chrome_instance_path=chrome_path,
+                extra_chromium_args=extra_chromium_args,
+            ),
+            context_config=BrowserContextConfig(
+                trace_path=save_trace_path if save_trace_path else None,
+                save_recording_path=save_recording_path if save_recording_path else None,
+                no_viewport=False,
+                browser_window_size=BrowserContextWindowSize(
+                    width=window_w, height=window_h
+                ),
+            ),
+        )
             
         # Create and run agent
         agent = CustomAgent(
@@ -364,19 +427,28 @@ async def run_custom_agent(
             add_infos=add_infos,
             use_vision=use_vision,
             llm=llm,
-            browser=_global_browser,
-            browser_context=_global_browser_context,
+            browser=lease.browser,
+            browser_context=lease.browser_context,
             controller=controller,
             system_prompt_class=CustomSystemPrompt,
             agent_prompt_class=CustomAgentMessagePrompt,
             max_actions_per_step=max_actions_per_step,
-            agent_state=_global_agent_state,
-            tool_calling_method=tool_calling_method
+            agent_state=agent_state,
+            tool_calling_method=tool_calling_method,
+            # the history gif is written after the results are shown
+            background_gif=True,
+            history_compression=os.getenv("AGENT_HISTORY_COMPRESSION") or None,
         )
+        # each run writes its own gif, runs of other sessions may be writing theirs in the background
+        os.makedirs(save_agent_history_path, exist_ok=True)
+        agent.generate_gif = os.path.join(save_agent_history_path, f"{agent.agent_id}.gif")
         history = await agent.run(max_steps=max_steps)
 
-        history_file = os.path.join(save_agent_history_path, f"{agent.agent_id}.json")
+        # compact JSON Lines, the screenshots are stored once under blobs/ next to it
+        history_file = os.path.join(save_agent_history_path, f"{agent.agent_id}.jsonl")
         agent.save_history(history_file)
+        # the download holds the screenshots too
+        history_file = bundle_compact_history(history_file)
 
         final_result = history.final_result()
         errors = history.errors()
@@ -394,13 +466,9 @@ async def run_custom_agent(
     finally:
         # Handle cleanup based on persistence configuration
         if not keep_browser_open:
-            if _global_browser_context:
-                await _global_browser_context.close()
-                _global_browser_context = None
-
-            if _global_browser:
-                await _global_browser.close()
-                _global_browser = None
+            lease = _browser_leases.pop(session_id, None)
+            if lease:
+                await _browser_pool.release(lease)
 
 async def run_with_stream(
     agent_type,
@@ -424,9 +492,11 @@ async def run_with_stream(
     max_steps,
     use_vision,
     max_actions_per_step,
-    tool_calling_method
+    tool_calling_method,
+    request: gr.Request = None
 ):
-    global _global_agent_state
+    session_id = get_session_id(request)
+    agent_state = get_agent_state(session_id)
     stream_vw = 80
     stream_vh = int(80 * window_h // window_w)
     if not headless:
@@ -452,14 +522,15 @@ async def run_with_stream(
             max_steps=max_steps,
             use_vision=use_vision,
             max_actions_per_step=max_actions_per_step,
-            tool_calling_method=tool_calling_method
+            tool_calling_method=tool_calling_method,
+            session_id=session_id
         )
         # Add HTML content at the start of the result array
         html_content = f"<h1 style='width:{stream_vw}vw; height:{stream_vh}vh'>Using browser...</h1>"
         yield [html_content] + list(result)
     else:
         try:
-            _global_agent_state.clear_stop()
+            agent_state.clear_stop()
             # Run the browser agent in the background
             agent_task = asyncio.create_task(
                 run_browser_agent(
@@ -484,28 +555,44 @@ async def run_with_stream(
                     max_steps=max_steps,
                     use_vision=use_vision,
                     max_actions_per_step=max_actions_per_step,
-                    tool_calling_method=tool_calling_method
+                    tool_calling_method=tool_calling_method,
+                    session_id=session_id
                 )
             )
 
+            # The live view is an MJPEG stream of the session's screencast served next to the app, embedded once.
+            # Its url carries a token of this run, other sessions cannot watch and the stream ends with the run
+            live_view_token = _live_view_tokens[session_id] = secrets.token_urlsafe(16)
+
+            def end_live_view(_task: asyncio.Task) -> None:
+                if _live_view_tokens.get(session_id) == live_view_token:
+                    del _live_view_tokens[session_id]
+
+            agent_task.add_done_callback(end_live_view)
+
             # Initialize values for streaming
-            html_content = f"<h1 style='width:{stream_vw}vw; height:{stream_vh}vh'>Using browser...</h1>"
+            html_content = (
+                f'<img src="/live/{session_id}?token={live_view_token}" alt="Waiting for browser session..." '
+                f'style="width:{stream_vw}vw; height:{stream_vh}vh ; border:1px solid #ccc;">'
+            )
             final_result = errors = model_actions = model_thoughts = ""
             latest_videos = trace = history_file = None
+            yield [
+                html_content,
+                final_result,
+                errors,
+                model_actions,
+                model_thoughts,
+                latest_videos,
+                trace,
+                history_file,
+                gr.update(value="Stop", interactive=True),  # Re-enable stop button
+                gr.update(interactive=True)  # Re-enable run button
+            ]
 
-
-            # Periodically update the stream while the agent task is running
+            # Wait for the agent task, only a stop request changes the UI meanwhile
             while not agent_task.done():
-                try:
-                    encoded_screenshot = await capture_screenshot(_global_browser_context)
-                    if encoded_screenshot is not None:
-                        html_content = f'<img src="data:image/jpeg;base64,{encoded_screenshot}" style="width:{stream_vw}vw; height:{stream_vh}vh ; border:1px solid #ccc;">'
-                    else:
-                        html_content = f"<h1 style='width:{stream_vw}vw; height:{stream_vh}vh'>Waiting for browser session...</h1>"
-                except Exception as e:
-                    html_content = f"<h1 style='width:{stream_vw}vw; height:{stream_vh}vh'>Waiting for browser session...</h1>"
-
-                if _global_agent_state and _global_agent_state.is_stop_requested():
+                if agent_state.is_stop_requested():
                     yield [
                         html_content,
                         final_result,
@@ -519,20 +606,7 @@ async def run_with_stream(
                         gr.update(interactive=False),  # run_button
                     ]
                     break
-                else:
-                    yield [
-                        html_content,
-                        final_result,
-                        errors,
-                        model_actions,
-                        model_thoughts,
-                        latest_videos,
-                        trace,
-                        history_file,
-                        gr.update(value="Stop", interactive=True),  # Re-enable stop button
-                        gr.update(interactive=True)  # Re-enable run button
-                    ]
-                await asyncio.sleep(0.05)
+                await asyncio.wait([agent_task], timeout=0.2)
 
             # Once the agent task completes, get the results
             try:
@@ -587,17 +661,6 @@ theme_map = {
     "Base": Base()
 }
 
-async def close_global_browser():
-    global _global_browser, _global_browser_context
-
-    if _global_browser_context:
-        await _global_browser_context.close()
-        _global_browser_context = None
-
-    if _global_browser:
-        await _global_browser.close()
-        _global_browser = None
-
 def create_ui(config, theme_name="Ocean"):
     css = """
     .gradio-container {
@@ -945,11 +1008,41 @@ def create_ui(config, theme_name="Ocean"):
             outputs=save_recording_path
         )
 
-        use_own_browser.change(fn=close_global_browser)
-        keep_browser_open.change(fn=close_global_browser)
+        use_own_browser.change(fn=close_session_browser)
+        keep_browser_open.change(fn=close_session_browser)
+        demo.unload(close_session)
 
     return demo
 
+def create_live_view_app() -> FastAPI:
+    """The app the UI is mounted on, it serves the live view of each session as an MJPEG stream"""
+    app = FastAPI()
+
+    def session_browser_context(session_id: str):
+        lease = _browser_leases.get(session_id)
+        return lease.browser_context if lease else None
+
+    def live_view_active(session_id: str, token: str) -> bool:
+        return secrets.compare_digest(_live_view_tokens.get(session_id, "").encode(), token.encode())
+
+    @app.get("/live/{session_id}")
+    async def live_view(session_id: str, token: str = ""):
+        if not token or not live_view_active(session_id, token):
+            raise HTTPException(status_code=403, detail="No running agent of this session to watch")
+        return StreamingResponse(
+            mjpeg_stream(
+                _live_view,
+                session_id,
+                lambda: session_browser_context(session_id),
+                is_active=lambda: live_view_active(session_id, token),
+            ),
+            media_type=MJPEG_MEDIA_TYPE,
+            headers={"Cache-Control": "no-cache, no-store", "X-Accel-Buffering": "no"},
+        )
+
+    return app
+
+
 def main():
     parser = argparse.ArgumentParser(description="Gradio UI for Browser Agent")
     parser.add_argument("--ip", type=str, default="127.0.0.1", help="IP address to bind to")
@@ -961,7 +1054,8 @@ def main():
     config_dict = default_config()
 
     demo = create_ui(config_dict, theme_name=args.theme)
-    demo.launch(server_name=args.ip, server_port=args.port)
+    app = gr.mount_gradio_app(create_live_view_app(), demo, path="/")
+    uvicorn.run(app, host=args.ip, port=args.port)
 
 if __name__ == '__main__':
     main()